@@ -0,0 +1,167 @@
+"""
+The activity ranking: the users' points over the last active days and the most active users, kept up to date so the
+!grind and !grindaajat commands and the daily active role sync don't sum every user's days on every call. The streaks
+are kept the same way for !streak and !streakit.
+
+Usage in the stats module through bot.activity and bot.streaks.
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass, field
+import src.functions as functions
+from src.clock import day_ordinal
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from src.objects import User
+    from src.bot import Bot
+
+ACTIVE_DAYS: int = 14  # the window of the active role, excluding today
+ACTIVE_COUNT: int = 15  # how many users get the active role
+
+
+@dataclass
+class ActivityRanking:
+    """The rolling activity totals and the top active users.
+
+    Two windows are kept, like in functions.get_actives: the last ACTIVE_DAYS past days (the active role, changes only
+    at the day rollover) and the last ACTIVE_DAYS - 1 past days plus today (the threshold for tomorrow, changes with
+    every point award).
+
+    rebuild sums the windows once per UTC day; touch updates a user's live total after the user's points for today
+    have changed. Today's points only grow during the day, so the live top list only has to check whether the user
+    passed the last one of it.
+
+    Attributes:
+        past (dict[User.id, int]): points over the last ACTIVE_DAYS past days. Bots are only left out of the rankings.
+        recent (dict[User.id, int]): points over the last ACTIVE_DAYS - 1 past days.
+        ranked (list[tuple[User, int]]): all the non-bot users by past, the most active first.
+        live (list[tuple[User, int]]): the top ACTIVE_COUNT users by recent plus today's points.
+
+    Examples:
+        bot.activity.rebuild(bot.users, bot.daylist)
+        user.add_points(points)
+        bot.activity.touch(user)
+        active_users = bot.activity.actives(ACTIVE_COUNT)
+    """
+    past: dict[int, int] = field(default_factory=dict)
+    recent: dict[int, int] = field(default_factory=dict)
+    ranked: list[tuple[User, int]] = field(default_factory=list)
+    live: list[tuple[User, int]] = field(default_factory=list)
+
+    def rebuild(self, users: Bot.users, daylist: Bot.daylist):
+        """Sum the windows for every user. Call after the daylist or the past days' activity has changed."""
+        past_first, past_last = functions.get_day_range(daylist, ACTIVE_DAYS)
+        recent_first, recent_last = functions.get_day_range(daylist, ACTIVE_DAYS - 1)
+        self.past.clear()
+        self.recent.clear()
+        live: list[tuple[User, int]] = []
+        for user in users:
+            self.past[user.id] = user.stats.activity.sum(past_first, past_last)
+            self.recent[user.id] = user.stats.activity.sum(recent_first, recent_last)
+            if not user.bot:
+                live.append((user, self.recent[user.id] + user.stats.activity_points_today))
+        self.ranked = [(user, self.past[user.id]) for user in users if not user.bot]
+        self.ranked.sort(key=lambda x: -x[1])
+        live.sort(key=lambda x: -x[1])
+        self.live = live[:ACTIVE_COUNT]
+
+    def touch(self, user: User):
+        """Update the user's live total after the user's points for today have grown."""
+        if user.bot:
+            return
+        value: int = self.last_14_day_points(user)
+        for i, (live_user, _) in enumerate(self.live):
+            if live_user is user:
+                self.live[i] = (user, value)
+                break
+        else:
+            if len(self.live) < ACTIVE_COUNT:
+                self.live.append((user, value))
+            elif value > self.live[-1][1]:
+                self.live[-1] = (user, value)
+            else:
+                return
+        self.live.sort(key=lambda x: -x[1])
+
+    def actives(self, count: int = ACTIVE_COUNT) -> list[tuple[User, int]]:
+        """The most active users over the last ACTIVE_DAYS past days and their points."""
+        return self.ranked[:count]
+
+    def active_threshold(self) -> int:
+        """How many points were needed for the active role today."""
+        return self.ranked[:ACTIVE_COUNT][-1][1]
+
+    def next_activity_threshold(self) -> int:
+        """How many points are needed for the active role tomorrow."""
+        return self.live[-1][1]
+
+    def last_14_day_points(self, user: User) -> int:
+        """The user's points over the last ACTIVE_DAYS - 1 past days and today."""
+        return self.recent.get(user.id, 0) + user.stats.activity_points_today
+
+
+@dataclass
+class StreakTracker:
+    """The users' current streaks, like functions.get_user_streak: today plus the active past days of the daylist in a
+    row, counted back from yesterday.
+
+    The past days only change at the day rollover, so the run of the past days is counted once at start and advanced
+    by one day at each rollover. UserStats.longest_streak is kept up to date on the way.
+
+    Attributes:
+        runs (dict[User.id, int]): how many of the last past days in a row the user has been active.
+        days (list[int]): the day ordinals of the past days of the daylist the runs were counted for.
+
+    Examples:
+        bot.streaks.rebuild(bot.users, bot.daylist)
+        bot.streaks.advance(bot.users, bot.daylist)
+        streak = bot.streaks.streak(user)
+    """
+    runs: dict[int, int] = field(default_factory=dict)
+    days: list[int] = field(default_factory=list)
+
+    def rebuild(self, users: Bot.users, daylist: Bot.daylist):
+        """Count the runs of every user by walking back the past days."""
+        self.days = past_days(daylist)
+        self.runs.clear()
+        for user in users:
+            run: int = 0
+            for day in reversed(self.days):
+                if not user.stats.activity.points(day):
+                    break
+                run += 1
+            self.runs[user.id] = run
+            self.set_longest(user, run)
+
+    def advance(self, users: Bot.users, daylist: Bot.daylist):
+        """Add the day that became a past day at the rollover. Call after the day's activity has been added to the
+        users. Falls back to rebuild if more than that one day has changed."""
+        days: list[int] = past_days(daylist)
+        if not days or days[:-1] != self.days:
+            self.rebuild(users, daylist)
+            return
+        self.days = days
+        for user in users:
+            run: int = self.runs.get(user.id, 0) + 1 if user.stats.activity.points(days[-1]) else 0
+            self.runs[user.id] = run
+            self.set_longest(user, run)
+
+    def touch(self, user: User):
+        """Call when the user gets the first points of the day: the streak is now real."""
+        self.set_longest(user, self.streak(user))
+
+    def streak(self, user: User) -> int:
+        """The user's streak in days, including today."""
+        return self.runs.get(user.id, 0) + 1
+
+    @staticmethod
+    def set_longest(user: User, streak: int):
+        if streak > (user.stats.longest_streak or 0):
+            user.stats.longest_streak = streak
+            user.stats.mark_dirty()
+
+
+def past_days(daylist: Bot.daylist) -> list[int]:
+    """The day ordinals of the daylist without the last day, today."""
+    return [day_ordinal(day['year'], day['month'], day['day']) for day in daylist[:-1]]
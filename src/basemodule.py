@@ -1,6 +1,7 @@
 from __future__ import annotations
 from dataclasses import dataclass
 from src.events import EventHandler
+from src.inbox import EventInbox, OverflowPolicy
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
@@ -18,7 +19,15 @@ class BaseModule(EventHandler):
     Attributes:
         bot (Bot): main bot object
         enabled (bool): whether this is enabled or not. If False, the module won't be initialized.
+        inbox_size (int): if > 0, the module's events are queued into a bounded inbox of this size and handled by the
+            module's own worker task, so the module can fall behind without holding up the other modules.
+        overflow_policy (str): what happens when the inbox is full, one of src.inbox.OverflowPolicy.
         name (str): name of the module. Read from self.__class__.__module__
+        ordered_events (tuple[str, ...]): events this module must see in the order they were dispatched when the
+            events are handled concurrently (MISC.EVENT_DISPATCH_MODE = concurrent in CONFIG).
+        event_timeout (float | None): seconds this module's handlers may run in the concurrent mode. None uses
+            MISC.EVENT_TIMEOUT_SECONDS from CONFIG, 0 is no timeout.
+        inbox (EventInbox | None): the inbox if inbox_size is set. Created by the EventDispatcher.
 
     See Also:
         https://discordpy.readthedocs.io/en/stable/api.html
@@ -31,7 +40,12 @@ class BaseModule(EventHandler):
     """
     bot: Bot
     enabled: bool = True
+    inbox_size: int = 0
+    overflow_policy: str = OverflowPolicy.BLOCK
     name: str = ''
+    ordered_events: tuple[str, ...] = ()
+    event_timeout: float | None = None
+    inbox: EventInbox | None = None
 
     def __post_init__(self):
         self.name = self.__class__.__module__
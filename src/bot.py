@@ -1,7 +1,8 @@
 import os
 from datetime import datetime
-from dateutil.tz import gettz
 import importlib
+import signal
+from typing import ClassVar
 from src.config import CfgParser
 from src.events import EventDispatcher, EventHandler
 from src.objects import *
@@ -9,7 +10,18 @@ from src.basemodule import BaseModule
 from src.modules.module_list import module_list
 from src.localizations import Localization
 from src.database.database import Database
+from src.database.journal import SYNC_SECONDS as JOURNAL_SYNC_SECONDS
 from src.commands import CommandManager
+from src.users import UserRegistry
+from src.intents import IntentPlanner
+from src.perf import PerfRecorder
+from src.scheduler import Scheduler
+from src.clock import Clock, clock
+from src.activity import ActivityRanking, StreakTracker
+from src.leaderboard import Leaderboard
+
+CONFIG_WATCH_INTERVAL: int = 30  # seconds between the checks whether CONFIG has been modified
+DATABASE_FLUSH_CHECK_INTERVAL: int = 10  # seconds between the checks whether the database buffer is due
 
 
 @dataclass
@@ -30,9 +42,14 @@ class Bot(EventHandler):
         localizations (Localization): Localization Manager. The data is located in assets/localization.json.
         commands (CommandManager): The command manager that handles the core logic of application commands, including
             message commands and slash commands.
-         users (list[User]): list of User objects. Includes Users that are no longer in the server.
+         users (UserRegistry): all known Users indexed by id. Includes Users that are no longer in the server.
          daylist (list[dict[str, int]]: the daylist when the server has been active. Used by the stats module.
             This should be removed from this module and moved to the Stats module, but CBA.
+        activity (ActivityRanking): the users' points over the last active days and the most active users. Rebuilt
+            at the UTC midnight.
+        streaks (StreakTracker): the users' current streaks. Advanced at the UTC midnight.
+        leaderboards (dict[str, Leaderboard]): the users ordered by the points ('points'), the streaks ('streaks') and
+            the modules' own scores, e.g. 'balances' of the casino. Updated by points_changed.
         reactions (list[Reaction]): list of all Reactions. NOT USED.
         database (Database): the database handler. All communication with the database must be through this module.
         client (discord.Client): the discord.py's Client module. Read:
@@ -42,6 +59,9 @@ class Bot(EventHandler):
         modules (list[Module]): list of all modules in src/module_list.py that are enabled
         server (discord.Guild): the server the bot is used on. Read:
             https://discordpy.readthedocs.io/en/stable/api.html#discord.Guild
+        perf (PerfRecorder): latency of the event handlers and the commands. Shown by the /perf command.
+        clock (Clock): the shared clock, see src/clock.py. Use bot.clock.now() for the current local time.
+        scheduler (Scheduler): runs the time-driven jobs, e.g. the day changes. Started in EventDispatcher.on_ready.
         current_day (datetime): The current day's datetime. Used to track when the LOCAL day has changed.
         last_day (datetime): UTC datetime. Used to track when the UTC day has changed.
     """
@@ -51,25 +71,35 @@ class Bot(EventHandler):
     config: CfgParser = field(default_factory=lambda: CfgParser())
     localizations: Localization = field(default_factory=lambda: Localization('assets/localization.json'))
     commands: CommandManager = None
-    users: list[User] = None
+    users: UserRegistry = None
     daylist: list[dict[str, int]] = None
+    activity: ActivityRanking = field(default_factory=ActivityRanking)
+    streaks: StreakTracker = field(default_factory=StreakTracker)
+    leaderboards: dict[str, Leaderboard] = field(default_factory=dict)
     reactions: list[Reaction] = None
     database: Database = None
     client: discord.Client = None
     client_tree: discord.app_commands.CommandTree = None
     modules: list[BaseModule] = field(default_factory=list)
     server: discord.Guild = None
+    perf: PerfRecorder = field(default_factory=PerfRecorder)
+    clock: Clock = field(default_factory=lambda: clock)
+    scheduler: Scheduler = None
     current_day: datetime = None
     last_day: datetime = datetime.utcnow()
 
+    # the core needs the guild cache and the member cache (sync_users, server.get_member) even without member events
+    required_intents: ClassVar[tuple[str, ...]] = ('guilds', 'members')
+
     def __post_init__(self):
         """Initialize the bot. First create the data folder if not exists, then data/profile_images if not exists.
 
         Create the database manager object and setup the database, get reactions, active days and users. Initialize
-        the discord client and refresh the events.
+        the discord client with the gateway intents the modules need, refresh the events and schedule the day changes.
         """
         self.token = self.config.TOKEN
-        self.current_day = datetime.now(tz=gettz(self.config.TIMEZONE))
+        self.clock.set_timezone(self.config.TIMEZONE)
+        self.current_day = self.clock.now()
         if not os.path.exists(f'data'):
             os.mkdir(f'data')
         if not os.path.exists(f'data/profile_images'):
@@ -79,14 +109,42 @@ class Bot(EventHandler):
         self.database.setup_database()
         self.reactions = self.database.get_reactions()
         self.daylist = self.database.get_daylist()
-        self.users = self.database.get_users()
-        self.client = discord.Client(guild_subscriptions=True, intents=discord.Intents.all())
+        self.users = UserRegistry.from_users(self.database.get_users())
+        self.activity.rebuild(self.users, self.daylist)
+        self.leaderboards['points'] = Leaderboard(lambda user: user.stats.points, lambda user: not user.bot)
+        self.leaderboards['points'].extend(self.users)
+        self.streaks.rebuild(self.users, self.daylist)
+        self.leaderboards['streaks'] = Leaderboard(self.streaks.streak, lambda user: not user.bot)
+        self.leaderboards['streaks'].extend(self.users)
+        intent_planner: IntentPlanner = IntentPlanner(
+            [self.__class__, CommandManager, *[module for module in module_list if module.enabled]],
+            self.config.EXTRA_INTENTS)
+        intent_planner.print_report()
+        self.client = discord.Client(intents=intent_planner.intents(),
+                                     member_cache_flags=intent_planner.member_cache_flags())
         self.client_tree = discord.app_commands.CommandTree(self.client)
         self.events = EventDispatcher(self)
         self.events.link_events()
+        self.scheduler = Scheduler()
+        self.scheduler.cron('bot.new_local_day', self.new_local_day, hour=0, minute=0, timezone=self.config.TIMEZONE)
+        self.scheduler.cron('bot.new_utc_day', self.new_utc_day, hour=0, minute=0, timezone='UTC', catch_up=True)
+        self.scheduler.every('bot.reload_config', CONFIG_WATCH_INTERVAL, self.reload_config)
+        self.scheduler.every('database.flush', DATABASE_FLUSH_CHECK_INTERVAL, self.database.flush_if_due)
+        self.scheduler.every('database.journal', JOURNAL_SYNC_SECONDS, self.database.sync_journal)
 
     def start(self):
-        self.client.run(self.token)
+        """Run the bot until it's stopped (client.close(), Ctrl+C or SIGTERM), then save the database and the
+        warm-start snapshot."""
+        signal.signal(signal.SIGTERM, self.on_sigterm)
+        try:
+            self.client.run(self.token)
+        finally:
+            self.database.close()
+
+    @staticmethod
+    def on_sigterm(signum: int, frame):
+        """Stop like on Ctrl+C, so start saves the database before exiting."""
+        raise KeyboardInterrupt
 
     def refresh_modules(self):
         if not self.commands:
@@ -116,11 +174,15 @@ class Bot(EventHandler):
             await self.commands.error(self.localizations.MODULE_NOT_FOUND.format(module_name), message, interaction)
             return
         self.modules[:] = [x for x in self.modules if x != found_module]
+        if found_module.inbox:
+            found_module.inbox.close()
         i = importlib.import_module(found_module.__class__.__module__)
         plugin = importlib.reload(i)
         self.localizations.load()
         self.config.load_config()
+        self.clock.set_timezone(self.config.TIMEZONE)
         self.modules.append(plugin.Plugin(self))
+        self.events.link_events()
         await self.modules[-1].on_ready()
         await self.commands.message(self.localizations.MODULE_RELOADED.format(found_module.__class__.__module__),
                                     message, interaction)
@@ -151,14 +213,15 @@ class Bot(EventHandler):
                 stats=Stats(member.id), is_in_guild=user_is_in_guild)
             if isinstance(member, discord.Member):
                 new_user.set_roles(member.roles)
-            self.users.append(new_user)
+            self.users.add(new_user)
+            self.update_leaderboards(new_user)
             self.database.add_user(new_user)
         else:
             user = self.get_user_by_id(member.id)
             if isinstance(member, discord.Member):
-                user.set_roles(member.roles)
+                self.users.set_roles(user, member.roles)
             if not is_message:
-                user.is_in_guild = True
+                self.users.set_in_guild(user, True)
             if user.name != member.name or user.identifier != member.discriminator:
                 user.name = member.name
                 user.identifier = member.discriminator
@@ -178,12 +241,7 @@ class Bot(EventHandler):
         Returns:
             User or None.
         """
-        member: User | None = None
-        for user in self.users:
-            if user.id == id:
-                member = user
-                break
-        return member
+        return self.users.get(id)
 
     @staticmethod
     async def get_user_file(member: discord.Member) -> str:
@@ -208,17 +266,34 @@ class Bot(EventHandler):
         return filepath
 
     async def on_new_day(self, date_now: datetime):
-        self.current_day = datetime.now(tz=gettz(self.config.TIMEZONE))
+        self.current_day = self.clock.now()
+
+    def points_changed(self, user: User):
+        """Call after the user has got points, updates the activity ranking and the leaderboards."""
+        self.activity.touch(user)
+        self.update_leaderboards(user)
+
+    def update_leaderboards(self, user: User):
+        for leaderboard in self.leaderboards.values():
+            leaderboard.update(user)
+
+    async def reload_config(self):
+        """Scheduled. Swaps in the new config if CONFIG has been modified."""
+        if self.config.reload_if_changed():
+            self.clock.set_timezone(self.config.TIMEZONE)
 
-    async def on_message(self, message: discord.Message):
-        # default timezone midnight
-        if datetime.now(tz=gettz(self.config.TIMEZONE)).date() != self.current_day.date() and not self.launching:
-            await self.events.on_new_day(datetime.now(tz=gettz(self.config.TIMEZONE)))
+    async def new_local_day(self):
+        """Scheduled at the default timezone midnight."""
+        await self.events.on_new_day(self.clock.now())
 
-        # UTC midnight
-        if message.created_at.date() != self.last_day.date() and not self.launching:
-            self.last_day = message.created_at
-            self.database.new_utc_day()
+    async def new_utc_day(self):
+        """Scheduled at the UTC midnight. Caught up on start if the bot was down at midnight."""
+        self.last_day = datetime.utcnow()
+        await self.database.new_utc_day()
+        self.activity.rebuild(self.users, self.daylist)
+        self.streaks.advance(self.users, self.daylist)
+        self.leaderboards['streaks'].clear()
+        self.leaderboards['streaks'].extend(self.users)
 
     async def on_ready(self):
         self.launching = False
@@ -227,29 +302,30 @@ class Bot(EventHandler):
 
     async def on_member_join(self, member: discord.Member):
         user: User = self.get_user_by_id(member.id)
-        user.is_in_guild = True
         if user is not None:
-            user.set_roles(None)
+            self.users.set_roles(user, None)
+            self.users.set_in_guild(user, True)
             return
         filepath: str = await self.get_user_file(member)
         user = User(id=member.id, name=member.name, bot=int(member.bot), profile_filename=filepath,
                     identifier=member.discriminator, stats=Stats(member.id), is_in_guild=True)
-        self.users.append(user)
+        self.users.add(user)
+        self.update_leaderboards(user)
         self.database.add_user(user)
 
     async def on_member_ban(self, guild: discord.Guild, user: discord.User):
         user: User = self.get_user_by_id(user.id)
         if user is None:
             return
-        user.set_roles(None)
-        user.is_in_guild = False
+        self.users.set_roles(user, None)
+        self.users.set_in_guild(user, False)
 
     async def on_member_remove(self, member: discord.Member):
         user: User = self.get_user_by_id(member.id)
         if user is None:
             return
-        user.set_roles(None)
-        user.is_in_guild = False
+        self.users.set_roles(user, None)
+        self.users.set_in_guild(user, False)
 
     async def send_dm(self, user: discord.User | discord.Member | User, message: str):
         """Sends DM to a User.
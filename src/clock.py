@@ -0,0 +1,103 @@
+"""
+Clock service. Caches the timezone objects and keeps the current and the next local and UTC midnights as epoch
+seconds, so the day change checks are integer comparisons instead of building timezone aware datetimes per message.
+
+The functions in src.functions use the shared `clock`; the bot sets its timezone from MISC.TIMEZONE in CONFIG.
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone, tzinfo
+from dateutil.tz import gettz
+from functools import lru_cache
+import time
+
+DISCORD_EPOCH_MS: int = 1420070400000  # the first millisecond of 2015, the epoch of the Discord snowflakes
+SECONDS_PER_DAY: int = 24 * 60 * 60
+
+
+@lru_cache(maxsize=None)
+def get_tz(name: str) -> tzinfo:
+    """The tzinfo of the timezone name, e.g. 'Europe/Helsinki'. Built only once per name."""
+    return gettz(name)
+
+
+@lru_cache(maxsize=4096)
+def day_ordinal(year: int, month: int, day: int) -> int:
+    """The proleptic Gregorian ordinal of the date (date.toordinal), e.g. the day index of the ActivityLog."""
+    return date(year, month, day).toordinal()
+
+
+def snowflake_timestamp(snowflake: int) -> int:
+    """The UTC timestamp (in seconds) a Discord id was created at, e.g. message.id. Same as message.created_at."""
+    return ((snowflake >> 22) + DISCORD_EPOCH_MS) // 1000
+
+
+@dataclass
+class Clock:
+    """The current time and the day boundaries in the bot's timezone and in UTC.
+
+    Attributes:
+        timezone (str): the bot's timezone name, MISC.TIMEZONE in CONFIG.
+        tz (tzinfo): the cached tzinfo of the timezone.
+        local_midnight (int): timestamp of the last local midnight.
+        next_local_midnight (int): timestamp of the next local midnight.
+        utc_midnight (int): timestamp of the last UTC midnight.
+        next_utc_midnight (int): timestamp of the next UTC midnight.
+
+    Examples:
+        clock.set_timezone(config.TIMEZONE)
+        if snowflake_timestamp(message.id) >= clock.next_utc_midnight:
+            ...
+    """
+    timezone: str = 'Europe/Helsinki'
+    tz: tzinfo = None
+    local_midnight: int = 0
+    next_local_midnight: int = 0
+    utc_midnight: int = 0
+    next_utc_midnight: int = 0
+
+    def __post_init__(self):
+        self.set_timezone(self.timezone)
+
+    def set_timezone(self, name: str):
+        self.timezone = name
+        self.tz = get_tz(name)
+        self.refresh()
+
+    def refresh(self, timestamp: float | None = None):
+        """Recalculate the midnights around the timestamp, the current time by default."""
+        timestamp = time.time() if timestamp is None else timestamp
+        self.utc_midnight = int(timestamp) // SECONDS_PER_DAY * SECONDS_PER_DAY
+        self.next_utc_midnight = self.utc_midnight + SECONDS_PER_DAY
+        today: datetime = datetime.fromtimestamp(timestamp, self.tz).replace(hour=0, minute=0, second=0,
+                                                                             microsecond=0)
+        self.local_midnight = int(today.timestamp())
+        # through the date, as the local day isn't always 24 hours long
+        tomorrow: datetime = datetime.combine(today.date() + timedelta(days=1), today.time(), self.tz)
+        self.next_local_midnight = int(tomorrow.timestamp())
+
+    def timestamp(self) -> int:
+        """The current UTC timestamp. Rolls the midnights over if a day has changed."""
+        now: int = int(time.time())
+        if now >= self.next_utc_midnight or now >= self.next_local_midnight:
+            self.refresh(now)
+        return now
+
+    def now(self) -> datetime:
+        """The current timezone aware datetime in the bot's timezone."""
+        return datetime.now(self.tz)
+
+    def to_local(self, dt: datetime, name: str | None = None) -> datetime:
+        """Convert a UTC datetime (naive is considered UTC) to the timezone, the bot's timezone by default."""
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.astimezone(get_tz(name) if name else self.tz)
+
+    def utc_midnight_datetime(self) -> datetime:
+        """The last UTC midnight as a naive datetime."""
+        self.timestamp()
+        return datetime.fromtimestamp(self.utc_midnight, timezone.utc).replace(tzinfo=None)
+
+
+clock: Clock = Clock()
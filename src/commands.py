@@ -146,7 +146,7 @@ class Command:
                       interaction: discord.Interaction | None = None,
                       target_user: discord.User = None,
                       **kwargs):
-        """Execute the command.
+        """Execute the command and record its latency to bot.perf.
 
         Args:
             user (User): The user who has used the command.
@@ -154,6 +154,17 @@ class Command:
             interaction (discord.Interaction | None): the interaction which called the command.
             target_user (discord.User | None): the target user of the command.
         """
+        start: int = time.perf_counter_ns()
+        try:
+            await self.run(user, message, interaction, target_user, **kwargs)
+        finally:
+            self.manager.bot.perf.record_command(self.command_name, time.perf_counter_ns() - start)
+
+    async def run(self, user: User, message: discord.Message | None = None,
+                  interaction: discord.Interaction | None = None,
+                  target_user: discord.User = None,
+                  **kwargs):
+        """Check the permissions and call the command's function. See execute."""
         has_permissions, reason = self.user_has_permissions(user, message, interaction)
         if not has_permissions:
             if reason:
@@ -192,7 +203,7 @@ class CommandManager(BaseModule):
         self.clear_thresholds()
 
     def register(self, command_name: str, function: Callable, description: str = '', timeout: int = 15,
-                 commands_per_day: int = 15, level_required: int = 0):
+                 commands_per_day: int = 15, level_required: int = 0, requires_fulladmin: bool = False):
         """Register a command to the Command Manager.
 
         USE THIS AS A DECORATOR!
@@ -204,6 +215,7 @@ class CommandManager(BaseModule):
             timeout (int): How many seconds the user must wait to use the command.
             commands_per_day (int): The times the user can use the command per day.
             level_required (int): the level the user must have to use this command.
+            requires_fulladmin (bool): only the users with the FULL_ADMINISTRATOR role can use this command.
 
         Examples:
             @self.bot.commands.register(command_name='rakkaus', function=self.love,
@@ -230,7 +242,8 @@ class CommandManager(BaseModule):
         def decorator(fnc: Callable):
             """Decorates the executable function and adds it to the Bot's Command Tree."""
             self.commands[command_name] = Command(self, command_name, description, function, commands_per_day=commands_per_day,
-                                                  timeout=timeout, level_required=level_required)
+                                                  timeout=timeout, level_required=level_required,
+                                                  requires_fulladmin=requires_fulladmin)
             if command_name != 'ban':
                 self.point_commands[f'!{command_name}'] = command_name
             else:
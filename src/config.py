@@ -1,12 +1,162 @@
+from __future__ import annotations
+from bisect import bisect_right
 from dataclasses import dataclass
+from operator import attrgetter
 import os
 from typing import Any
 import configobj
 
 
+def _int(value: Any) -> int | None:
+    return int(value) if value is not None else None
+
+
+@dataclass(frozen=True, slots=True)
+class ConfigSnapshot:
+    """CONFIG compiled once into plain values, so reading a setting is an attribute lookup instead of walking the
+    configobj dicts and parsing ints. The id collections that are used for `in` checks are frozensets.
+
+    A snapshot is never modified: CfgParser compiles a new one and swaps it in when CONFIG is (re)loaded, so a reader
+    always sees either the old or the new config as a whole.
+
+    The missing settings are None, so they only fail where they're used, like before.
+
+    Attributes:
+        LEVEL_ROLE_LADDER (tuple[tuple[int, int], ...]): (level, role id) of the LEVEL_<level> roles, sorted by level.
+    """
+    TOKEN: str | None
+    SERVER_ID: int | None
+    TIMEZONE: str
+    DEFAULT_BAN_LENGTH_HOURS: int
+    PURGE_CHANNELS_INTERVAL_HOURS: int
+    MIN_CHANNEL_CREATE_LEVEL: int | None
+    DELETE_CHANNEL_AFTER_INACTIVITY_HOURS: int | None
+    IGNORE_LEVEL_USERS: frozenset[int]
+    EVENT_DISPATCH_MODE: str
+    EVENT_TIMEOUT_SECONDS: float
+    MAX_CONCURRENT_HANDLERS: int
+    PERF_DUMP_INTERVAL_MINUTES: int
+    EXTRA_INTENTS: tuple[str, ...]
+
+    DATABASE_JOURNAL_MODE: str
+    DATABASE_SYNCHRONOUS: str
+    DATABASE_CACHE_SIZE_KB: int
+    DATABASE_MMAP_SIZE_MB: int
+    DATABASE_TEMP_STORE: str
+    DATABASE_READERS: int
+    DATABASE_FLUSH_ROWS: int
+    DATABASE_FLUSH_SECONDS: float
+
+    ROLE_LEVEL_20: int | None
+    ROLE_LEVEL_10: int | None
+    ROLE_MUTED: int | None
+    ROLE_ACTIVE: int | None
+    ROLE_ACTIVE_SQUAD: int | None
+    ROLE_SQUAD: int | None
+    ROLE_BIRTHDAY: int | None
+    ROLE_FULL_ADMINISTRATOR: int | None
+    ROLE_OWNER: int | None
+    ROLE_ADMIN: int | None
+    ROLE_MOD: int | None
+    ROLE_EVERYONE: int | None
+    ROLE_CAT: int | None
+    PREVENT_CHANNEL_CREATION_ROLE: int | None
+    BAN_ROLES: frozenset[int]
+    IMMUNE_TO_BAN: frozenset[int]
+    LEVEL_ROLE_LADDER: tuple[tuple[int, int], ...]
+    ALL_LEVEL_ROLES: frozenset[int]
+
+    CHANNEL_GENERAL: int | None
+    CHANNEL_GENERAL2: int | None
+    CHANNEL_BOTCOMMANDS: int | None
+    CHANNEL_CASINO_HIDE_CHANNEL: int | None
+    CHANNEL_MEDIA: int | None
+    CHANNEL_AFK_VOICE_CHANNEL: int | None
+    USER_CHANNEL_CATEGORY: int | None
+    PURGE_CHANNELS: frozenset[int]
+    LEVEL_CHANNELS: frozenset[int]
+
+    @classmethod
+    def compile(cls, config: configobj.ConfigObj) -> ConfigSnapshot:
+        misc: dict[str, Any] = config.get('MISC') or {}
+        roles: dict[str, Any] = config.get('ROLES') or {}
+        channels: dict[str, Any] = config.get('CHANNELS') or {}
+        database: dict[str, Any] = config.get('DATABASE') or {}
+        level_role_ladder: tuple[tuple[int, int], ...] = tuple(sorted(
+            (int(role.split('_')[1]), int(roles[role])) for role in roles if 'LEVEL_' in role
+        ))
+        return cls(
+            TOKEN=misc.get('TOKEN'),
+            SERVER_ID=_int(misc.get('SERVER_ID')),
+            TIMEZONE=misc.get('TIMEZONE', 'Europe/Helsinki'),
+            DEFAULT_BAN_LENGTH_HOURS=int(misc.get('DEFAULT_BAN_LENGTH_HOURS', 18)),
+            PURGE_CHANNELS_INTERVAL_HOURS=int(misc.get('PURGE_CHANNELS_INTERVAL_HOURS', 3)),
+            MIN_CHANNEL_CREATE_LEVEL=_int(misc.get('MIN_CHANNEL_CREATE_LEVEL')),
+            DELETE_CHANNEL_AFTER_INACTIVITY_HOURS=_int(misc.get('DELETE_CHANNEL_AFTER_INACTIVITY_HOURS')),
+            IGNORE_LEVEL_USERS=frozenset(int(x) for x in misc.get('IGNORE_LEVEL_USERS', [])),
+            EVENT_DISPATCH_MODE=misc.get('EVENT_DISPATCH_MODE', 'sequential'),
+            EVENT_TIMEOUT_SECONDS=float(misc.get('EVENT_TIMEOUT_SECONDS', 60)),
+            MAX_CONCURRENT_HANDLERS=int(misc.get('MAX_CONCURRENT_HANDLERS', 32)),
+            PERF_DUMP_INTERVAL_MINUTES=int(misc.get('PERF_DUMP_INTERVAL_MINUTES', 15)),
+            EXTRA_INTENTS=tuple(misc.get('EXTRA_INTENTS', [])),
+            DATABASE_JOURNAL_MODE=database.get('JOURNAL_MODE', 'WAL'),
+            DATABASE_SYNCHRONOUS=database.get('SYNCHRONOUS', 'NORMAL'),
+            DATABASE_CACHE_SIZE_KB=int(database.get('CACHE_SIZE_KB', 65536)),
+            DATABASE_MMAP_SIZE_MB=int(database.get('MMAP_SIZE_MB', 256)),
+            DATABASE_TEMP_STORE=database.get('TEMP_STORE', 'MEMORY'),
+            DATABASE_READERS=int(database.get('READERS', 2)),
+            DATABASE_FLUSH_ROWS=int(database.get('FLUSH_ROWS', 5000)),
+            DATABASE_FLUSH_SECONDS=float(database.get('FLUSH_SECONDS', 300)),
+            ROLE_LEVEL_20=_int(roles.get('LEVEL_20')),
+            ROLE_LEVEL_10=_int(roles.get('LEVEL_10')),
+            ROLE_MUTED=_int(roles.get('MUTED')),
+            ROLE_ACTIVE=_int(roles.get('ACTIVE')),
+            ROLE_ACTIVE_SQUAD=_int(roles.get('ACTIVE_SQUAD')),
+            ROLE_SQUAD=_int(roles.get('SQUAD')),
+            ROLE_BIRTHDAY=_int(roles.get('BIRTHDAY')),
+            ROLE_FULL_ADMINISTRATOR=_int(roles.get('FULL_ADMINISTRATOR')),
+            ROLE_OWNER=_int(roles.get('OWNER')),
+            ROLE_ADMIN=_int(roles.get('ADMIN')),
+            ROLE_MOD=_int(roles.get('MOD')),
+            ROLE_EVERYONE=_int(roles.get('EVERYONE')),
+            ROLE_CAT=_int(roles.get('CAT')),
+            PREVENT_CHANNEL_CREATION_ROLE=_int(roles.get('PREVENT_CHANNEL_CREATION_ROLE')),
+            BAN_ROLES=frozenset(int(roles[x]) for x in roles.get('BAN_ROLES', [])),
+            IMMUNE_TO_BAN=frozenset(int(roles[x]) for x in roles.get('IMMUNE_TO_BAN', [])),
+            LEVEL_ROLE_LADDER=level_role_ladder,
+            ALL_LEVEL_ROLES=frozenset(role for _, role in level_role_ladder),
+            CHANNEL_GENERAL=_int(channels.get('GENERAL')),
+            CHANNEL_GENERAL2=_int(channels.get('GENERAL2')),
+            CHANNEL_BOTCOMMANDS=_int(channels.get('BOTCOMMANDS')),
+            CHANNEL_CASINO_HIDE_CHANNEL=_int(channels.get('CASINO_HIDE_CHANNEL')),
+            CHANNEL_MEDIA=_int(channels.get('MEDIA')),
+            CHANNEL_AFK_VOICE_CHANNEL=_int(channels.get('AFK_VOICE_CHANNEL')),
+            USER_CHANNEL_CATEGORY=_int(channels.get('USER_CHANNEL_CATEGORY')),
+            PURGE_CHANNELS=frozenset(int(channels[x]) for x in channels.get('PURGE_CHANNELS', [])),
+            LEVEL_CHANNELS=frozenset(int(channels[x]) for x in channels.get('LEVEL_CHANNELS', []))
+        )
+
+    def get_level_roles(self, level: int) -> list[int]:
+        """The role ids of the LEVEL_<level> roles up to the level."""
+        return [role for _, role in
+                self.LEVEL_ROLE_LADDER[:bisect_right(self.LEVEL_ROLE_LADDER, (level, float('inf')))]]
+
+
 @dataclass
 class CfgParser:
+    """Loads CONFIG and compiles it into a ConfigSnapshot.
+
+    The settings are read from the current snapshot, e.g. config.CHANNEL_GENERAL. Reloading compiles a new snapshot
+    and swaps it in with one assignment, and a CONFIG that doesn't compile leaves the old snapshot in use.
+
+    Attributes:
+        config (configobj.ConfigObj): the raw CONFIG, for set_config and the settings without a snapshot field.
+        snapshot (ConfigSnapshot): the compiled settings.
+        mtime (float): modification time of CONFIG when it was loaded, used by reload_if_changed.
+    """
     config: configobj.ConfigObj = None
+    snapshot: ConfigSnapshot = None
+    mtime: float = 0.0
 
     def __post_init__(self):
         self.load_config()
@@ -14,7 +164,22 @@ class CfgParser:
     def load_config(self):
         if not os.path.exists('CONFIG'):
             raise Exception('CONFIG file not found! Check DEFAULT_CONFIG and rename it')
-        self.config = configobj.ConfigObj(open('CONFIG'))
+        mtime: float = os.path.getmtime('CONFIG')
+        config: configobj.ConfigObj = configobj.ConfigObj(open('CONFIG'))
+        snapshot: ConfigSnapshot = ConfigSnapshot.compile(config)
+        self.config, self.snapshot, self.mtime = config, snapshot, mtime
+
+    def reload_if_changed(self) -> bool:
+        """Reload CONFIG if the file has been modified. Returns whether a new snapshot was swapped in."""
+        try:
+            if os.path.getmtime('CONFIG') == self.mtime:
+                return False
+            self.load_config()
+        except Exception as e:
+            print(f"Error! Could not reload CONFIG, keeping the old config: {e}")
+            return False
+        print("CONFIG reloaded")
+        return True
 
     def get_config(self, category: str, config_name: str, default_value: Any = None) -> Any:
         return self.config.get(category).get(config_name, default_value)
@@ -31,6 +196,8 @@ class CfgParser:
             return
         self.config[category][config_name] = new_value
         self.config.write()
+        self.snapshot = ConfigSnapshot.compile(self.config)
+        self.mtime = os.path.getmtime('CONFIG')
 
     def get_channel(self, channel_name: str) -> int:
         return int(self.get_config('CHANNELS', channel_name))
@@ -39,158 +206,9 @@ class CfgParser:
         return int(self.get_config('ROLES', role_name))
 
     def get_level_roles(self, level: int) -> list[int]:
-        level_roles: dict[int, int] = {}
-        for role in self.get_category('ROLES'):
-            if 'LEVEL_' not in role:
-                continue
-            role_lvl: int = int(role.split('_')[1])
-            level_roles[role_lvl] = int(self.get_config('ROLES', role))
-
-        roles: list[int] = []
-        for role_level in level_roles:
-            if role_level > level:
-                continue
-            roles.append(level_roles[role_level])
-
-        return roles
-
-    @property
-    def ALL_LEVEL_ROLES(self) -> list[int]:
-        level_roles: list[int] = []
-        for role in self.get_category('ROLES'):
-            if 'LEVEL_' not in role:
-                continue
-            level_roles.append(int(self.get_config('ROLES', role)))
-        return level_roles
-
-    @property
-    def ROLE_LEVEL_20(self) -> int:
-        return self.get_role('LEVEL_20')
-
-    @property
-    def ROLE_LEVEL_10(self) -> int:
-        return self.get_role('LEVEL_10')
-
-    @property
-    def ROLE_MUTED(self) -> int:
-        return self.get_role('MUTED')
-
-    @property
-    def ROLE_ACTIVE(self) -> int:
-        return self.get_role('ACTIVE')
-
-    @property
-    def ROLE_ACTIVE_SQUAD(self) -> int:
-        return self.get_role('ACTIVE_SQUAD')
-
-    @property
-    def ROLE_SQUAD(self) -> int:
-        return self.get_role('SQUAD')
-
-    @property
-    def ROLE_BIRTHDAY(self) -> int:
-        return self.get_role('BIRTHDAY')
-
-    @property
-    def ROLE_FULL_ADMINISTRATOR(self) -> int:
-        return self.get_role('FULL_ADMINISTRATOR')
-
-    @property
-    def ROLE_OWNER(self) -> int:
-        return self.get_role('OWNER')
-
-    @property
-    def ROLE_ADMIN(self) -> int:
-        return self.get_role('ADMIN')
-
-    @property
-    def ROLE_MOD(self) -> int:
-        return self.get_role('MOD')
-
-    @property
-    def ROLE_EVERYONE(self) -> int:
-        return self.get_role('EVERYONE')
-
-    @property
-    def ROLE_CAT(self) -> int:
-        return self.get_role('CAT')
-
-    @property
-    def PREVENT_CHANNEL_CREATION_ROLE(self) -> int:
-        return self.get_role('PREVENT_CHANNEL_CREATION_ROLE')
-
-    @property
-    def BAN_ROLES(self) -> list[int]:
-        return [int(self.get_role(x)) for x in self.get_config('ROLES', 'BAN_ROLES', [])]
-
-    @property
-    def IMMUNE_TO_BAN(self) -> list[int]:
-        return [int(self.get_role(x)) for x in self.get_config('ROLES', 'IMMUNE_TO_BAN', [])]
-
-    @property
-    def CHANNEL_GENERAL(self) -> int:
-        return self.get_channel('GENERAL')
-
-    @property
-    def CHANNEL_GENERAL2(self) -> int:
-        return self.get_channel('GENERAL2')
-
-    @property
-    def CHANNEL_BOTCOMMANDS(self) -> int:
-        return self.get_channel('BOTCOMMANDS')
-
-    @property
-    def CHANNEL_CASINO_HIDE_CHANNEL(self) -> int:
-        return self.get_channel('CASINO_HIDE_CHANNEL')
-
-    @property
-    def CHANNEL_MEDIA(self) -> int:
-        return self.get_channel('MEDIA')
-
-    @property
-    def CHANNEL_AFK_VOICE_CHANNEL(self) -> int:
-        return self.get_channel('AFK_VOICE_CHANNEL')
-
-    @property
-    def USER_CHANNEL_CATEGORY(self) -> int:
-        return self.get_channel('USER_CHANNEL_CATEGORY')
-
-    @property
-    def PURGE_CHANNELS(self) -> list[int]:
-        return [self.get_channel(x) for x in self.get_config('CHANNELS', 'PURGE_CHANNELS', [])]
-
-    @property
-    def LEVEL_CHANNELS(self) -> list[int]:
-        return [self.get_channel(x) for x in self.get_config('CHANNELS', 'LEVEL_CHANNELS', [])]
-
-    @property
-    def DEFAULT_BAN_LENGTH_HOURS(self) -> int:
-        return int(self.get_config('MISC', 'DEFAULT_BAN_LENGTH_HOURS', 18))
-
-    @property
-    def TIMEZONE(self) -> str:
-        return self.get_config('MISC', 'TIMEZONE', 'Europe/Helsinki')
-
-    @property
-    def PURGE_CHANNELS_INTERVAL_HOURS(self) -> int:
-        return int(self.get_config('MISC', 'PURGE_CHANNELS_INTERVAL_HOURS', 3))
-
-    @property
-    def IGNORE_LEVEL_USERS(self) -> list[int]:
-        return [int(x) for x in self.get_config('MISC', 'IGNORE_LEVEL_USERS', [])]
-
-    @property
-    def SERVER_ID(self) -> int:
-        return int(self.get_config('MISC', 'SERVER_ID'))
-
-    @property
-    def TOKEN(self) -> str:
-        return self.get_config('MISC', 'TOKEN')
+        return self.snapshot.get_level_roles(level)
 
-    @property
-    def MIN_CHANNEL_CREATE_LEVEL(self) -> int:
-        return int(self.get_config('MISC', 'MIN_CHANNEL_CREATE_LEVEL'))
 
-    @property
-    def DELETE_CHANNEL_AFTER_INACTIVITY_HOURS(self) -> int:
-        return int(self.get_config('MISC', 'DELETE_CHANNEL_AFTER_INACTIVITY_HOURS'))
+# the settings are read-only properties reading the current snapshot, e.g. config.CHANNEL_GENERAL
+for _setting in ConfigSnapshot.__dataclass_fields__:
+    setattr(CfgParser, _setting, property(attrgetter(f'snapshot.{_setting}')))
@@ -0,0 +1,68 @@
+"""
+Runs the blocking sqlite3 calls outside the asyncio event loop, so a database flush or the daily rollup doesn't stall
+the gateway heartbeat.
+
+Usage in Database (Database.io). Only Database should use this one.
+"""
+
+from __future__ import annotations
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, TypeVar
+import asyncio
+import threading
+from .sqlite_database import SqliteDatabase
+
+READER_COUNT: int = 2  # how many threads (and connections) serve the reads by default, DATABASE.READERS in CONFIG
+
+T = TypeVar('T')
+
+
+@dataclass
+class AsyncDatabase:
+    """Awaitable access to the database: one writer thread and a small pool of reader threads.
+
+    All writes go through the single writer thread in the order they were submitted, so a write always sees the
+    earlier writes, e.g. the day's ActivityDates are calculated after the last messages of the day are saved. The
+    writer thread owns the write connection (Database.db) once the bot is running.
+
+    The readers have a read-only connection each, opened lazily in the reader thread with the same pragmas as the
+    write connection. They see the committed data, and in the WAL mode they never wait for the writer.
+
+    Args:
+        db (SqliteDatabase): the write connection.
+        reader_count (int): how many reader threads.
+
+    Examples:
+        await database.io.write(database.execute_writes, planned, journal_segment)
+        rows = await database.io.read(lambda db: db.select('Messages', 'MAX(id)', fetchall=False))
+    """
+    db: SqliteDatabase
+    reader_count: int = READER_COUNT
+    writer: ThreadPoolExecutor = None
+    readers: ThreadPoolExecutor = None
+    local: threading.local = field(default_factory=threading.local)
+
+    def __post_init__(self):
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+        self.readers = ThreadPoolExecutor(max_workers=self.reader_count, thread_name_prefix='db-reader')
+
+    async def write(self, function: Callable[..., T], *args: Any) -> T:
+        """Run the function in the writer thread after the writes submitted before it."""
+        return await asyncio.get_running_loop().run_in_executor(self.writer, function, *args)
+
+    async def read(self, function: Callable[..., T], *args: Any) -> T:
+        """Run function(reader connection, *args) in a reader thread."""
+        return await asyncio.get_running_loop().run_in_executor(self.readers, self.run_read, function, args)
+
+    def run_read(self, function: Callable[..., T], args: tuple) -> T:
+        db: SqliteDatabase | None = getattr(self.local, 'db', None)
+        if db is None:
+            db = self.local.db = SqliteDatabase(self.db.settings, readonly=True)
+        return function(db, *args)
+
+    def close(self):
+        """Wait for the queued writes and stop the threads."""
+        self.writer.shutdown(wait=True)
+        self.readers.shutdown(wait=True)
@@ -1,51 +1,126 @@
 from __future__ import annotations
 from .database_model import database_model
+from .migrations import SchemaMigrator, migrations
+from src.clock import day_ordinal
 from src.objects import *
 import src.functions as functions
-from .sqlite_database import SqliteDatabase
+from .sqlite_database import ConnectionSettings, SqliteDatabase
+from .async_database import AsyncDatabase
+from .snapshot import LoadedSnapshot, Snapshot
+from .write_buffer import WriteBuffer
+from .journal import Journal, replay_query
 from datetime import datetime, timedelta
+from contextlib import contextmanager
 from dataclasses import dataclass, field
-from typing import TYPE_CHECKING
+import asyncio
+from typing import Any, BinaryIO, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from src.bot import Bot
 
+# the previous day's message and voice points per user in one statement: the two sides are summed separately and
+# combined with UNION ALL, so a user with only messages or only voice still gets a row (a FULL OUTER JOIN)
+ROLLUP_QUERY: str = """
+    INSERT INTO ActivityDates (user_id, year, month, day, message_points, voice_points)
+    SELECT user_id, :year, :month, :day, SUM(message_points), SUM(voice_points) FROM (
+        SELECT user_id, COALESCE(SUM(activity_points), 0) AS message_points, 0 AS voice_points FROM Messages
+            WHERE created_at >= :start AND created_at < :end GROUP BY user_id
+        UNION ALL
+        SELECT user_id, 0, COALESCE(SUM(activity_points), 0) FROM VoiceDates
+            WHERE end_time >= :start AND end_time < :end GROUP BY user_id
+    ) GROUP BY user_id HAVING SUM(message_points) != 0 OR SUM(voice_points) != 0
+"""
+
 
 @dataclass
 class Database:
     """
     Database object handling the database connection and logic. All database interactions should occur through
-    this class. Database is updated every 5 minutes (at minimum, the bot tracks time by messages).
+    this class. The changes are buffered and written when DATABASE.FLUSH_ROWS are pending or the
+    oldest has waited DATABASE.FLUSH_SECONDS (5 minutes by default), and on a clean shutdown.
+
+    Once the bot is running, the SQL runs in the threads of AsyncDatabase (self.io) and the coroutine methods await
+    it: the writes in one writer thread in order, the reads in a reader pool. The changes are planned on the event
+    loop, so the objects aren't read and flagged from two threads.
 
     Args:
         bot (Bot): The main Bot object.
 
     Attributes:
         bot (Bot): The main Bot object.
-        unsaved_changes (dict[str, list]): this object tracks the unsaved changes that are to be updated to the database
-            {tablename: [object1, object2, ...]}.
-        db (SqliteDatabase): Handles the communication with sqlite3 and the database file.
+        buffer (WriteBuffer): the unsaved changes that are to be updated to the database, coalesced by the primary
+            key. Flushed when it's full or due (flush_if_due), and on close.
+        flush_task (asyncio.Task | None): the flush started because the buffer got full.
+        flushes_held (bool): whether the flushes by size and age are held off, see hold_flushes.
+        journal (Journal): the changes in the buffer on the disk, replayed on start after a crash.
+        db (SqliteDatabase): Handles the communication with sqlite3 and the database file. The write connection.
+        io (AsyncDatabase): the writer thread and the reader pool.
+        snapshot (Snapshot): the warm-start snapshot of the users, written after every flush.
+        write_generation (int): how many times the changes have been flushed, stored in the Meta table. The snapshot
+            is only used if it was written at the same generation.
+        activity_rowid (int): the largest ActivityDates rowid that is in the users' activity dates.
     """
     bot: Bot
-    unsaved_changes: dict[str, list] = field(default_factory=dict)
-    db: SqliteDatabase = field(default_factory=lambda: SqliteDatabase())
+    buffer: WriteBuffer = None
+    flush_task: asyncio.Task | None = None
+    flushes_held: bool = False
+    journal: Journal = field(default_factory=Journal)
+    db: SqliteDatabase = None
+    io: AsyncDatabase = None
+    snapshot: Snapshot = field(default_factory=Snapshot)
+    write_generation: int = 0
+    activity_rowid: int = 0
+
+    def __post_init__(self):
+        config = self.bot.config
+        self.db = SqliteDatabase(ConnectionSettings(
+            journal_mode=config.DATABASE_JOURNAL_MODE,
+            synchronous=config.DATABASE_SYNCHRONOUS,
+            cache_size_kb=config.DATABASE_CACHE_SIZE_KB,
+            mmap_size_mb=config.DATABASE_MMAP_SIZE_MB,
+            temp_store=config.DATABASE_TEMP_STORE
+        ))
+        self.io = AsyncDatabase(self.db, config.DATABASE_READERS)
+        self.buffer = WriteBuffer(config.DATABASE_FLUSH_ROWS, config.DATABASE_FLUSH_SECONDS)
 
     def setup_database(self):
         """Setup the database according to database_model.database_model.
 
-        Note: this doesn't allow updating tables yet... If you update existing tables on database_model, you need to
-        update them manually. Quite ugly sh*t at the moment, could/should be made more beautiful.
-
-        Check the database_model for the database model.
+        The missing tables, columns and indexes are created and the versioned migrations are run, see
+        src/database/migrations.py. Check the database_model for the database model.
         """
         print("Setupping database")
         for table in database_model:
-            self.unsaved_changes[table.name] = []  # init the table names to unsaved_changes
-            self.db.create_table(table.name, table.columns)
-
-        self.db.save()
+            self.buffer.add_table(table.name)  # the changes are flushed in the order of the tables
+        SchemaMigrator(self.db, database_model, migrations).migrate()
+        self.replay_journal()
+        self.write_generation = self.db.select('Meta', 'value', {'key =': 'write_generation'}, fetchall=False)[0]
         print("Database setupped!")
 
+    def replay_journal(self):
+        """Apply the journal segments the last flush didn't include (a crash) and start a new segment.
+
+        The replayed changes bump the write generation, so the warm-start snapshot written before them isn't used.
+        """
+        flushed: int = self.db.select('Meta', 'value', {'key =': 'journal_segment'}, fetchall=False)[0]
+        segments: list[int] = self.journal.segments()
+        replayed: int = 0
+        with self.db.transaction():
+            for segment in segments:
+                if segment <= flushed:
+                    continue
+                for table, row in self.journal.read(segment):
+                    self.db.cursor.execute(replay_query(table, tuple(row)), row)
+                    replayed += 1
+            last: int = max([flushed, *segments])
+            if replayed:
+                self.db.cursor.execute("UPDATE Meta SET value=value+1 WHERE key='write_generation'")
+            self.db.update('Meta', {'value': last}, {'key =': 'journal_segment'})
+        if replayed:
+            print(f"Replayed {replayed} changes from the journal")
+        self.journal.remove_through(last)
+        self.journal.open(last + 1)
+
     def get_reactions(self) -> list[Reaction]:
         """Get reactions from the database.
 
@@ -58,15 +133,51 @@ class Database:
         print("Reactions fetched")
         return reacts
 
-    def get_last_post_id(self) -> int:
+    async def get_last_post_id(self) -> int:
         """Fetch the max id from the Messages table.
 
         Returns:
             0 if no last post id found from Messages else MAX(id) from Messages table.
         """
-        return self.db.select(table_name='Messages', values='MAX(id)', fetchall=False)[0] or 0
+        row = await self.io.read(lambda db: db.select(table_name='Messages', values='MAX(id)', fetchall=False))
+        return row[0] or 0
 
     def get_users(self) -> list[User]:
+        """Get users from the warm-start snapshot, or rebuild them from the database if the snapshot is missing or
+        stale.
+
+        Returns:
+            A list of User objects that have their stats and activity dates initialized.
+        """
+        try:
+            loaded: LoadedSnapshot | None = self.snapshot.load()
+        except Exception as e:
+            print(f"Error! Could not read the snapshot: {e}")
+            loaded = None
+        if loaded is None or loaded.write_generation != self.write_generation:
+            print("No up to date snapshot found")
+            return self.rebuild_users()
+        print("Getting users from the snapshot...")
+        self.activity_rowid = loaded.activity_rowid
+        users: dict[int, User] = {user.id: user for user in loaded.users}
+        rows: list = self.db.select('ActivityDates', ['rowid', '*'], {'rowid >': self.activity_rowid},
+                                    order_by='rowid')
+        added: list[ActivityDate] = []
+        for row in rows:
+            user: User | None = users.get(row['user_id'])
+            self.activity_rowid = row['rowid']
+            if user is None or user.bot:
+                continue
+            ad = ActivityDate(
+                user_id=row['user_id'], year=row['year'], month=row['month'], day=row['day'],
+                message_points=row['message_points'], voice_points=row['voice_points'])
+            user.stats.add_activitydate(ad)
+            added.append(ad)
+        self.snapshot.add_activity(added)
+        print(f"Users gotten, {len(rows)} new activity dates applied")
+        return list(users.values())
+
+    def rebuild_users(self) -> list[User]:
         """Get users from the database.
 
         Also update the Activity Dates and User Stats to the Users while looping through the users.
@@ -75,6 +186,7 @@ class Database:
             A list of User objects from the database that have their stats and activity dates initialized.
         """
         print("Getting users from db...")
+        self.activity_rowid = self.db.select('ActivityDates', 'MAX(rowid)', fetchall=False)[0] or 0
         db_users: list = self.db.select(
             table_name='User', values='*',
             join_query='JOIN UserStats ON User.id=UserStats.user_id ' +
@@ -110,14 +222,10 @@ class Database:
                 users[user_id] = usr
             if users[user_id].bot:
                 continue
-            ad = ActivityDate(
-                user_id=user['user_id'],
-                year=user['year'],
-                month=user['month'],
-                day=user['day'],
-                message_points=user['message_points'],
-                voice_points=user['voice_points'])
-            users[user_id].stats.add_activitydate(ad)
+            if user['year'] is not None:
+                users[user_id].stats.activity.add(day_ordinal(user['year'], user['month'], user['day']),
+                                                  user['message_points'], user['voice_points'])
+        self.snapshot.set_activity(users.values())
         print("Users gotten...")
         return [value for value in users.values()]
 
@@ -127,10 +235,10 @@ class Database:
         Args:
             user (User): A User object to be added to or updated in the database.
         """
-        self.unsaved_changes['User'].append(user)
-        self.unsaved_changes['UserStats'].append(user.stats)
+        self.queue('User', user.id, user)
+        user.stats.mark_dirty()
 
-    def get_messages_by_user(self, user_id: int | list[int]) -> list[dict[str, int | str]]:
+    async def get_messages_by_user(self, user_id: int | list[int]) -> list[dict[str, int | str]]:
         """(NOT REALLY USED) Get messages from Messages table by user ID or a list of user ID's.
 
         Args:
@@ -141,7 +249,9 @@ class Database:
         """
         user_id: list[int] = [user_id] if isinstance(user_id, int) else user_id
         messages: list[dict[str, int | str]] = []
-        for msg in self.db.select(table_name='Messages', values=['id', 'attachments'], where={'user_id IN': user_id}):
+        rows: list = await self.io.read(lambda db: db.select(table_name='Messages', values=['id', 'attachments'],
+                                                             where={'user_id IN': user_id}))
+        for msg in rows:
             messages.append({
                 'id': msg['id'],
                 'attachments': msg['attachments']
@@ -173,16 +283,43 @@ class Database:
             daylist.append({'year': curr_day['year'], 'month': curr_day['month'], 'day': curr_day['day']})
         return daylist
 
-    def db_save(self):
-        """Check the user stats to be updated, and then save database."""
+    async def db_save(self):
+        """Save database now, whether the buffer is due or not."""
+        await self.save_database()
+
+    async def sync_journal(self):
+        """Scheduled every journal.SYNC_SECONDS. Write the changes queued since the last sync to the journal and
+        fsync it in the writer thread."""
         self.update_userstats()
-        self.save_database()
+        if not self.journal.pending:
+            return
+        self.journal.write([(table, self.row_values(table, elem)) for table, elem in self.journal.take()])
+        await self.io.write(self.journal.sync, self.journal.file)
 
-    def new_utc_day(self):
+    async def flush_if_due(self):
+        """Scheduled. Save database if the buffer is full or its oldest change has waited long enough."""
+        self.update_userstats()
+        if self.buffer.is_due() and not self.flushes_held:
+            await self.save_database()
+
+    @contextmanager
+    def hold_flushes(self):
+        """Hold off the flushes by size and age, e.g. during a backfill that saves its changes in bulk with db_save.
+        A flush is started on exit if the buffer is full."""
+        self.flushes_held = True
+        try:
+            yield
+        finally:
+            self.flushes_held = False
+            if self.buffer.is_full():
+                self.request_flush()
+
+    async def new_utc_day(self):
         """Called when a new day in UTC. Calculates the message points and voice points for the previous day.
 
         The calculated points are added to the ActivityDates table and the points are added to the users' stats.
-        These stats are used to calculate streaks and the activity.
+        These stats are used to calculate streaks and the activity. The unsaved messages are saved first, so the
+        last minutes of the day are included.
         """
         midnight_timestamp: int = functions.dt2ts(functions.get_midnight())
         previous_midnight_timestamp: int = functions.dt2ts(functions.get_midnight() - timedelta(days=1))
@@ -198,172 +335,266 @@ class Database:
         if not found:
             self.bot.daylist.append({'year': midnight.year, 'month': midnight.month, 'day': midnight.day})
 
-        # get message points for the previous day
-        messages: list = self.db.select(
-            table_name='Messages',
-            values=['user_id', 'SUM(activity_points) as act_points'],
-            where={
-                'created_at >=': previous_midnight_timestamp,
-                'created_at <': midnight_timestamp
-            },
-            group_by='user_id'
-        )
-        users: dict[str, Points] = {}
-        for msg in messages:
-            user_id: str = str(msg['user_id'])
-            if user_id not in users:
-                users[user_id] = Points(0, 0)
-            users[user_id].message_points += msg['act_points'] or 0
-
-        # get voice points for the previous day
-        voice_dates: list = self.db.select(
-            table_name='VoiceDates',
-            values=['user_id', 'SUM(activity_points) as act_points'],
-            where={
-                'end_time >=': previous_midnight_timestamp,
-                'end_time <': midnight_timestamp
-            },
-            group_by='user_id'
-        )
-        for vd in voice_dates:
-            user_id: str = str(vd['user_id'])
-            if user_id not in users:
-                users[user_id] = Points(0, 0)
-            users[user_id].voice_points += vd['act_points']
-
-        # update ActivityDates table with the calculated message points and voice points for the previous day
-        activity_dates: list[ActivityDate] = []
-        print("Inserting activitydates...")
-        for user in users:
-            if not users[user].message_points and not users[user].voice_points:
-                continue
-            activity_dates.append(ActivityDate(user_id=int(user),
-                                               year=previous_midnight.year,
-                                               month=previous_midnight.month,
-                                               day=previous_midnight.day,
-                                               message_points=users[user].message_points,
-                                               voice_points=users[user].voice_points))
-            self.db.insert(
-                'ActivityDates',
-                {
-                    'user_id': int(user), 'year': previous_midnight.year, 'month': previous_midnight.month,
-                    'day': previous_midnight.day, 'message_points': users[user].message_points,
-                    'voice_points': users[user].voice_points
-                })
-        self.db.save()  # update the database
+        await self.db_save()
+        activity_dates, activity_rowid = await self.io.write(
+            self.insert_activitydates, previous_midnight_timestamp, midnight_timestamp, previous_midnight)
 
-        # add new previous day's activity date to the users
+        # add new previous day's activity date to the users, a day without points for the rest
         print("Adding user activitydates...")
-        usrs: list[User.id] = [x.user_id for x in activity_dates]
+        by_user: dict[User.id, ActivityDate] = {ad.user_id: ad for ad in activity_dates}
+        # add_activitydate doesn't read the user_id, so the users without points can share the empty day
+        no_points: ActivityDate = ActivityDate(
+            0, 0, 0, previous_midnight.year, previous_midnight.month, previous_midnight.day)
         for user in self.bot.users:
-            if user.id not in usrs:
-                user.stats.add_activitydate(ActivityDate(
-                    0, 0, user.id, previous_midnight.year, previous_midnight.month, previous_midnight.day))
-            else:
-                for ad in activity_dates:
-                    if ad.user_id == user.id:
-                        user.stats.add_activitydate(ad)
-                        break
+            user.stats.add_activitydate(by_user.get(user.id, no_points))
+        self.activity_rowid = max(self.activity_rowid, activity_rowid)
+        self.snapshot.add_activity(activity_dates)
 
-    def update_userstats(self):
-        """Add User.stats to the self.unsaved_changes if they should be updated in the database."""
-        user_id_list = [x.user_id for x in self.unsaved_changes['UserStats']]
-        for user in self.bot.users:
-            if user.stats.should_update and user.id not in user_id_list:
-                self.unsaved_changes['UserStats'].append(user.stats)
+    def insert_activitydates(self, previous_midnight_timestamp: int, midnight_timestamp: int,
+                             previous_midnight: datetime) -> tuple[list[ActivityDate], int]:
+        """Sum the previous day's message and voice points per user into the ActivityDates table. Runs in the
+        writer thread.
 
-    def add_message(self, message: Message):
-        self.unsaved_changes['Messages'].append(message)
+        Returns:
+            The inserted ActivityDates and the largest ActivityDates rowid after them.
+        """
+        previous_rowid: int = self.db.select('ActivityDates', 'MAX(rowid)', fetchall=False)[0] or 0
+        print("Inserting activitydates...")
+        self.db.cursor.execute(ROLLUP_QUERY, {
+            'year': previous_midnight.year, 'month': previous_midnight.month, 'day': previous_midnight.day,
+            'start': previous_midnight_timestamp, 'end': midnight_timestamp
+        })
+        self.db.save()  # update the database
+        rows: list = self.db.select('ActivityDates', ['rowid', 'user_id', 'message_points', 'voice_points'],
+                                    {'rowid >': previous_rowid})
+        activity_dates: list[ActivityDate] = [
+            ActivityDate(user_id=row['user_id'], year=previous_midnight.year, month=previous_midnight.month,
+                         day=previous_midnight.day, message_points=row['message_points'],
+                         voice_points=row['voice_points'])
+            for row in rows]
+        return activity_dates, max([row['rowid'] for row in rows], default=previous_rowid)
 
-    def add_reaction(self, reaction: Reaction):
-        self.unsaved_changes['Reactions'].append(reaction)
+    def update_userstats(self):
+        """Move the stats changed since the last flush (UserRegistry.dirty_stats) to the buffer."""
+        dirty_stats: dict[int, Stats] = self.bot.users.dirty_stats
+        for stats in dirty_stats.values():
+            self.queue('UserStats', stats.user_id, stats)
+        dirty_stats.clear()
+
+    def queue(self, table: str, key: Any, elem: object, replace: bool = True, journal: bool = True):
+        """Queue a change to the buffer, see WriteBuffer.add, and to the journal unless journal is False (e.g. the
+        backfilled messages, which can be fetched again). Starts a flush if the buffer got full."""
+        if journal and (replace or not self.buffer.is_pending(table, key)):
+            self.journal.add(table, elem)
+        if self.buffer.add(table, key, elem, replace):
+            self.request_flush()
+
+    def request_flush(self):
+        """Start a flush in the background unless one is already running. Outside the event loop (while starting)
+        the flush is left to the next flush_if_due."""
+        if self.flushes_held or (self.flush_task is not None and not self.flush_task.done()):
+            return
+        try:
+            self.flush_task = asyncio.get_running_loop().create_task(self.flush_while_full())
+        except RuntimeError:
+            pass
+
+    async def flush_while_full(self):
+        """Save database until the buffer is no longer full, the changes may keep coming during a backfill."""
+        while self.buffer.is_full():
+            await self.save_database()
+
+    def add_message(self, message: Message, journal: bool = True):
+        self.queue('Messages', message.id, message, journal=journal)
+
+    def add_reaction(self, reaction: Reaction, journal: bool = True):
+        self.queue('Reactions', (reaction.message_id, reaction.emoji_id), reaction, journal=journal)
 
     def add_voicedate(self, voicedate: VoiceDate):
-        self.unsaved_changes['VoiceDates'].append(voicedate)
+        # VoiceDates has no primary key, every session is its own row
+        self.queue('VoiceDates', id(voicedate), voicedate)
 
     def add_raw_reaction(self, reaction: Reaction):
-        found: bool = False
-        for react in self.unsaved_changes['Reactions']:
-            if react.message_id == reaction.message_id and react.emoji_id == reaction.emoji_id:
-                found = True
-                break
-        if not found:
-            self.unsaved_changes['Reactions'].append(reaction)
+        self.queue('Reactions', (reaction.message_id, reaction.emoji_id), reaction, replace=False)
 
-    def update_database(self, table: str, elem: User | Reaction | Message | VoiceDate | Stats):
-        """Insert an element to the database or update the element in the database.
+    @staticmethod
+    def row_values(table: str, elem: User | Reaction | Message | VoiceDate | Stats) -> dict[str, Any]:
+        """The columns of the element's row, as they're inserted."""
+        if table == 'User':
+            return {'id': elem.id, 'name': elem.name, 'bot': elem.bot, 'profile_filename': elem.profile_filename,
+                    'identifier': elem.identifier}
+        if table == 'Reactions':
+            return {'message_id': elem.message_id, 'emoji_id': elem.emoji_id, 'count': elem.count}
+        if table == 'Messages':
+            return {
+                'id': elem.id, 'attachments': elem.attachments, 'user_id': elem.user_id,
+                'jump_url': elem.jump_url, 'reference': elem.reference,
+                'created_at': elem.created_at.timestamp(), 'mentions_everyone': elem.mentions_everyone,
+                'length': elem.length, 'is_gif': elem.is_gif, 'has_emoji': elem.has_emoji,
+                'is_bot_command': elem.is_bot_command, 'activity_points': elem.activity_points
+            }
+        if table == 'VoiceDates':
+            return {'user_id': elem.user_id, 'start_time': elem.start_time, 'end_time': elem.end_time,
+                    'activity_points': elem.activity_points}
+        if table == 'UserStats':
+            return {
+                'user_id': elem.user_id, 'time_in_voice': elem.time_in_voice, 'points': elem.points,
+                'first_post_time': elem.first_post_time, 'gif_count': elem.gif_count,
+                'emoji_count': elem.emoji_count, 'bot_command_count': elem.bot_command_count,
+                'total_post_length': elem.total_post_length, 'mentioned_times': elem.mentioned_times,
+                'files_sent': elem.files_sent, 'longest_streak': elem.longest_streak,
+                'last_post_time': elem.last_post_time
+            }
+        raise ValueError(f"No row for the table {table}")
+
+    @staticmethod
+    def plan_writes(table: str, elems: list[User | Reaction | Message | VoiceDate | Stats]) \
+            -> tuple[list[tuple[object, dict[str, Any]]], list[tuple[dict[str, Any], dict[str, Any]]]]:
+        """Split the elements of a table into the inserts and the updates.
+
+        The elements are marked as in the database as they're planned, so an element that is queued again while the
+        flush is being written is updated by the next flush, not inserted again. If the flush fails, restore_save
+        unmarks them.
 
-        Args:
-            table (str): The name of the table.
-            elem (User | Reaction | Message | VoiceDate | Stats): Element to be updated or inserted into the databse.
+        Returns:
+            The inserts as (element, {column: value}) and the updates as ({column: new value}, {key column: value}).
         """
-        if table == 'User':
-            if not elem.is_in_database:
-                if self.db.insert(table, {'id': elem.id, 'name': elem.name, 'bot': elem.bot,
-                                          'profile_filename': elem.profile_filename, 'identifier': elem.identifier}):
-                    elem.is_in_database = True
-            else:
-                self.db.update(table,
-                               set_values={'name': elem.name, 'profile_filename': elem.profile_filename,
-                                           'identifier': elem.identifier},
-                               where={'id=': elem.id})
-
-        elif table == 'Reactions':
-            if not elem.is_in_database:
-                self.db.insert(table, {'message_id': elem.message_id, 'emoji_id': elem.emoji_id, 'count': elem.count})
-            else:
-                self.db.update(table, {'count': elem.count},
-                               {'message_id=': elem.message_id, 'emoji_id=': elem.emoji_id})
-            elem.is_in_database = True
-
-        elif table == 'Messages':
-            self.db.insert(table,
-                           {'id': elem.id, 'attachments': elem.attachments, 'user_id': elem.user_id,
-                            'jump_url': elem.jump_url, 'reference': elem.reference,
-                            'created_at': elem.created_at.timestamp(), 'mentions_everyone': elem.mentions_everyone,
-                            'length': elem.length, 'is_gif': elem.is_gif, 'has_emoji': elem.has_emoji,
-                            'is_bot_command': elem.is_bot_command, 'activity_points': elem.activity_points})
-
-        elif table == 'VoiceDates':
-            self.db.insert(table, {'user_id': elem.user_id, 'start_time': elem.start_time, 'end_time': elem.end_time,
-                                   'activity_points': elem.activity_points})
-
-        elif table == 'UserStats':
-            if not elem.is_in_database:
-                if self.db.insert(table, {
-                    'user_id': elem.user_id, 'time_in_voice': elem.time_in_voice, 'points': elem.points,
-                    'first_post_time': elem.first_post_time, 'gif_count': elem.gif_count,
-                    'emoji_count': elem.emoji_count, 'bot_command_count': elem.bot_command_count,
-                    'total_post_length': elem.total_post_length, 'mentioned_times': elem.mentioned_times,
-                    'files_sent': elem.files_sent, 'longest_streak': elem.longest_streak,
-                    'last_post_time': elem.last_post_time
-                }):
+        inserts: list[tuple[object, dict[str, Any]]] = []
+        updates: list[tuple[dict[str, Any], dict[str, Any]]] = []
+        for elem in elems:
+            values: dict[str, Any] = Database.row_values(table, elem)
+            if table == 'User':
+                if not elem.is_in_database:
+                    inserts.append((elem, values))
                     elem.is_in_database = True
-            elif elem.should_update:
-                self.db.update(table, set_values={
-                    'time_in_voice': elem.time_in_voice, 'points': elem.points,
-                    'first_post_time': elem.first_post_time, 'gif_count': elem.gif_count,
-                    'emoji_count': elem.emoji_count, 'bot_command_count': elem.bot_command_count,
-                    'total_post_length': elem.total_post_length, 'mentioned_times': elem.mentioned_times,
-                    'files_sent': elem.files_sent, 'longest_streak': elem.longest_streak,
-                    'last_post_time': elem.last_post_time
-                }, where={'user_id=': elem.user_id})
+                else:
+                    updates.append(({'name': elem.name, 'profile_filename': elem.profile_filename,
+                                     'identifier': elem.identifier}, {'id': elem.id}))
+
+            elif table == 'Reactions':
+                if not elem.is_in_database:
+                    inserts.append((elem, values))
+                else:
+                    updates.append(({'count': elem.count}, {'message_id': elem.message_id, 'emoji_id': elem.emoji_id}))
                 elem.is_in_database = True
-            elem.should_update = False
 
-    def save_database(self):
-        """Save the database. Called every 5 minute (at minimum by Bot object).
+            elif table in ('Messages', 'VoiceDates'):
+                inserts.append((elem, values))
 
-        Copy the self.unsaved_changes to copied_changes variable so the self.unsaved_changes changing while
-        updating the database won't cause any errors.
+            elif table == 'UserStats':
+                if not elem.is_in_database:
+                    inserts.append((elem, values))
+                    elem.is_in_database = True
+                elif elem.should_update:
+                    del values['user_id']
+                    updates.append((values, {'user_id': elem.user_id}))
+                elem.should_update = False
+        return inserts, updates
+
+    def execute_writes(self, planned: list[tuple[str, list, list]], journal_segment: int) -> int:
+        """Write the planned changes (see plan_save) with one executemany per table and operation, in one
+        transaction. Runs in the writer thread once the bot is running. The inserts are INSERT OR IGNORE, so a row
+        that is already in the database is skipped; the objects were flagged in plan_writes, on the event loop.
+
+        Args:
+            planned (list[tuple[str, list, list]]): the planned changes.
+            journal_segment (int): the last journal segment the changes were queued in. Stored in the same
+                transaction, so the segment is never replayed over the changes.
+
+        Returns:
+            The new write generation, bumped in the same transaction.
         """
-        copied_changes: dict[str, list] = {}
-        for table in self.unsaved_changes:
-            copied_changes[table] = self.unsaved_changes[table].copy()
-            self.unsaved_changes[table][:] = []
-        for table in copied_changes:
-            if len(copied_changes[table]) == 0:
-                continue
-            for elem in copied_changes[table]:
-                self.update_database(table, elem)
-        self.db.save()
+        with self.db.transaction():
+            self.db.cursor.execute("UPDATE Meta SET value=value+1 WHERE key='write_generation'")
+            self.db.update('Meta', {'value': journal_segment}, {'key =': 'journal_segment'})
+            for table, inserts, updates in planned:
+                if inserts:
+                    self.db.insert_many(table, list(inserts[0][1]), [tuple(values.values()) for _, values in inserts])
+                if updates:
+                    self.db.update_many(table, list(updates[0][0]), list(updates[0][1]),
+                                        [(*set_values.values(), *where.values()) for set_values, where in updates])
+            return self.db.select('Meta', 'value', {'key =': 'write_generation'}, fetchall=False)[0]
+
+    def flush(self, planned: list[tuple[str, list, list]], journal_segment: tuple[int, BinaryIO],
+              state: tuple[bytes, ...], activity_rowid: int):
+        """Write the planned changes, remove the journal segments they were queued in and then write the snapshot
+        of the state they were planned from. Runs in the writer thread. A failed snapshot is only printed, the next
+        flush writes a new one."""
+        segment, segment_file = journal_segment
+        try:
+            self.write_generation = self.execute_writes(planned, segment)
+        finally:
+            # a failed flush leaves the segment on the disk, its changes are put back in the buffer (restore_save)
+            segment_file.close()
+        self.journal.remove_through(segment)
+        try:
+            self.snapshot.write(state, self.write_generation, activity_rowid)
+        except OSError as e:
+            print(f"Error! Could not write the snapshot: {e}")
+
+    def plan_save(self) -> tuple[dict[str, list], list[tuple[str, list, list]]]:
+        """Take the unsaved changes from the buffer and plan them into (table, inserts, updates), see plan_writes.
+
+        The buffer is emptied, so the changes queued while updating the database go to the next flush. Rotate the
+        journal right after this, so they also go to the next journal segment.
+
+        Returns:
+            The changes taken by table, for restore_save, and the planned writes.
+        """
+        self.update_userstats()
+        changes: dict[str, list] = self.buffer.take()
+        return changes, [(table, *self.plan_writes(table, elems)) for table, elems in changes.items()]
+
+    def restore_save(self, changes: dict[str, list], planned: list[tuple[str, list, list]]):
+        """Put the changes of a failed flush back in the buffer, so the next flush writes them. A change of the same
+        row queued after the failed flush is kept. The failed flush's journal segment stays on the disk until then,
+        so the changes are also replayed if the bot crashes before it.
+
+        The elements plan_writes marked as in the database are unmarked, so they're inserted, not updated."""
+        for table, inserts, _ in planned:
+            if table in ('User', 'Reactions', 'UserStats'):
+                for elem, _ in inserts:
+                    elem.is_in_database = False
+        for table, elems in changes.items():
+            for elem in elems:
+                if table == 'UserStats':
+                    elem.should_update = True
+                self.buffer.add(table, self.buffer_key(table, elem), elem, replace=False)
+
+    @staticmethod
+    def buffer_key(table: str, elem: User | Reaction | Message | VoiceDate | Stats) -> Any:
+        """The key the element is queued with in the buffer, see the add_ methods."""
+        if table == 'User':
+            return elem.id
+        if table == 'UserStats':
+            return elem.user_id
+        if table == 'Messages':
+            return elem.id
+        if table == 'Reactions':
+            return elem.message_id, elem.emoji_id
+        return id(elem)
+
+    async def save_database(self):
+        """Save the database. Called when the buffer is full or due, and by db_save.
+
+        The changes are planned and the snapshot is encoded here on the event loop, and written in the writer thread,
+        after the earlier writes. If the write fails, the changes are put back in the buffer and the error is raised.
+        """
+        changes, planned = self.plan_save()
+        try:
+            await self.io.write(self.flush, planned, self.journal.rotate(), self.snapshot.encode(self.bot.users),
+                                self.activity_rowid)
+        except Exception:
+            self.restore_save(changes, planned)
+            raise
+
+    def close(self):
+        """Flush the unsaved changes, write the snapshot and stop the database threads. Called on a clean shutdown,
+        after the event loop has stopped."""
+        print("Saving the database...")
+        _, planned = self.plan_save()
+        self.io.writer.submit(self.flush, planned, self.journal.rotate(), self.snapshot.encode(self.bot.users),
+                              self.activity_rowid).result()
+        self.io.close()
+        self.journal.close()
+        print("Database saved!")
@@ -1,10 +1,12 @@
 """
 The database model used by Database class.
 
-Usage in Database.setup_database.
+Usage in Database.setup_database, which migrates the database file to this model (see src/database/migrations.py).
+New columns and indexes can be added here; anything else, like renaming a column or changing the data, needs a
+Migration.
 """
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 
 @dataclass
@@ -14,10 +16,23 @@ class Column:
     default: str | None = None
 
 
+@dataclass
+class Index:
+    """An index of a table. The name is derived from the table and the columns, e.g. idx_Messages_user_id_created_at.
+
+    Attributes:
+        columns (list[str]): the indexed columns, in order.
+        unique (bool): whether the indexed columns are a unique constraint.
+    """
+    columns: list[str]
+    unique: bool = False
+
+
 @dataclass
 class Table:
     name: str
     columns: list[Column]
+    indexes: list[Index] = field(default_factory=list)
 
 
 database_model: list[Table] = [
@@ -33,6 +48,8 @@ database_model: list[Table] = [
         Column('message_id', 'INTEGER NOT NULL'),
         Column('emoji_id', 'INTEGER'),
         Column('count', 'INTEGER')
+    ], [
+        Index(['message_id', 'emoji_id'], unique=True)
     ]),
 
     Table('Messages', [
@@ -49,6 +66,9 @@ database_model: list[Table] = [
         Column('has_emoji', 'INTEGER', '0'),
         Column('is_bot_command', 'INTEGER', '0'),
         Column('activity_points', 'INTEGER', '0')
+    ], [
+        Index(['created_at']),
+        Index(['user_id', 'created_at'])
     ]),
 
     Table('VoiceDates', [
@@ -56,6 +76,8 @@ database_model: list[Table] = [
         Column('start_time', 'INTEGER'),
         Column('end_time', 'INTEGER'),
         Column('activity_points', 'INTEGER', '0')
+    ], [
+        Index(['end_time'])
     ]),
 
     Table('UserStats', [
@@ -86,5 +108,12 @@ database_model: list[Table] = [
         Column('day', 'INTEGER NOT NULL'),
         Column('message_points', 'INTEGER', '0'),
         Column('voice_points', 'INTEGER', '0')
+    ], [
+        Index(['user_id', 'year', 'month', 'day'])
+    ]),
+
+    Table('Meta', [
+        Column('key', 'VARCHAR(32) PRIMARY KEY NOT NULL'),
+        Column('value', 'INTEGER')
     ])
 ]
@@ -0,0 +1,139 @@
+"""
+Crash-safe journal of the changes waiting in the write buffer, so a crash between two flushes doesn't lose them.
+
+The queued changes are appended to the current journal segment (data/journal/) as JSON lines and fsynced in batches,
+every SYNC_SECONDS. A flush starts a new segment; once the flush has been committed, the segments up to the
+flushed one are no longer needed and are removed. The number of the last flushed segment is stored in the Meta table
+in the flush's transaction, so a segment left behind by a crash right after a flush isn't replayed over newer data.
+
+On start the segments newer than that are replayed into the database idempotently: the Messages, VoiceDates and
+Reactions are only inserted if missing and the Users and UserStats are upserted with the journaled values.
+
+Usage in Database (Database.journal).
+"""
+
+from __future__ import annotations
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, BinaryIO
+import json
+import os
+
+JOURNAL_DIRECTORY: str = 'data/journal'
+SYNC_SECONDS: int = 1  # how often the queued changes are written and fsynced, at most this much is lost in a crash
+
+# the key columns the replay matches the rows by
+REPLAY_KEYS: dict[str, tuple[str, ...]] = {
+    'User': ('id',),
+    'UserStats': ('user_id',),
+    'Messages': ('id',),
+    'Reactions': ('message_id', 'emoji_id'),
+    'VoiceDates': ('user_id', 'start_time')
+}
+UPSERT_TABLES: frozenset[str] = frozenset({'User', 'UserStats', 'Reactions'})  # the others are insert only
+
+
+@lru_cache(maxsize=None)
+def replay_query(table: str, columns: tuple[str, ...]) -> str:
+    """The idempotent statement that applies a journaled row of the table, with named parameters."""
+    keys: tuple[str, ...] = REPLAY_KEYS[table]
+    values: str = ', '.join(f':{column}' for column in columns)
+    if table in UPSERT_TABLES:
+        updates: str = ', '.join(f'{column}=excluded.{column}' for column in columns if column not in keys)
+        return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({values}) "
+                f"ON CONFLICT({', '.join(keys)}) DO UPDATE SET {updates}")
+    return (f"INSERT INTO {table} ({', '.join(columns)}) SELECT {values} WHERE NOT EXISTS "
+            f"(SELECT 1 FROM {table} WHERE {' AND '.join(f'{key} IS :{key}' for key in keys)})")
+
+
+@dataclass
+class Journal:
+    """The journal segments: data/journal/<segment>.journal, one JSON line [table, {column: value}] per change.
+
+    Queuing a change only keeps a reference to it (add), so the message path stays cheap; the row values are read
+    and written in write, called every SYNC_SECONDS.
+
+    Attributes:
+        directory (str): where the segments are.
+        segment (int): the number of the current segment.
+        file (BinaryIO | None): the current segment, opened for appending.
+        pending (list[tuple[str, object]]): the changes queued since the last write, as (table, element).
+        written (int): how many rows have been written to the journal.
+
+    Examples:
+        journal.add('Messages', message)
+        journal.write(rows)
+        segment, file = journal.rotate()
+    """
+    directory: str = JOURNAL_DIRECTORY
+    segment: int = 0
+    file: BinaryIO | None = None
+    pending: list[tuple[str, object]] = field(default_factory=list)
+    written: int = 0
+
+    def path(self, segment: int) -> str:
+        return os.path.join(self.directory, f'{segment:010d}.journal')
+
+    def open(self, segment: int):
+        """Start appending to the segment."""
+        os.makedirs(self.directory, exist_ok=True)
+        self.segment = segment
+        self.file = open(self.path(segment), 'ab')
+
+    def add(self, table: str, elem: object):
+        self.pending.append((table, elem))
+
+    def take(self) -> list[tuple[str, object]]:
+        pending: list[tuple[str, object]] = self.pending
+        self.pending = []
+        return pending
+
+    def write(self, rows: list[tuple[str, dict[str, Any]]]):
+        """Append the rows to the current segment. The data reaches the disk when the file is fsynced (sync)."""
+        self.file.write(b''.join(json.dumps([table, row], separators=(',', ':')).encode() + b'\n'
+                                 for table, row in rows))
+        self.file.flush()
+        self.written += len(rows)
+
+    @staticmethod
+    def sync(file: BinaryIO):
+        """fsync a segment. Run outside the event loop, in the writer thread."""
+        if not file.closed:
+            os.fsync(file.fileno())
+
+    def rotate(self) -> tuple[int, BinaryIO]:
+        """Start a new segment for the changes queued after this. Called when the pending changes are taken for a
+        flush, so the changes not yet written don't need to be. Returns the previous segment and its file, which
+        the flush closes."""
+        self.pending.clear()
+        segment, file = self.segment, self.file
+        self.open(segment + 1)
+        return segment, file
+
+    def segments(self) -> list[int]:
+        """The numbers of the segments on the disk, oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(int(name.split('.')[0]) for name in os.listdir(self.directory) if name.endswith('.journal'))
+
+    def read(self, segment: int) -> Iterator[tuple[str, dict[str, Any]]]:
+        """The rows of a segment. A torn last line (a crash while writing) ends the segment."""
+        with open(self.path(segment), 'rb') as file:
+            for line in file:
+                try:
+                    table, row = json.loads(line)
+                except ValueError:
+                    print(f"Journal segment {segment} ends in a partial row, skipped it")
+                    return
+                yield table, row
+
+    def remove_through(self, segment: int):
+        """Remove the segments up to the segment, except the current one."""
+        for old_segment in self.segments():
+            if old_segment <= segment and old_segment != self.segment:
+                os.remove(self.path(old_segment))
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
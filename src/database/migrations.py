@@ -0,0 +1,116 @@
+"""
+Schema migrations. Brings the database file up to date with database_model on every start:
+
+1. creates the missing tables,
+2. adds the missing columns,
+3. runs the versioned Migrations newer than the database's version (PRAGMA user_version), in order,
+4. creates the missing indexes.
+
+All in one transaction, so a failed migration leaves the database as it was.
+
+To change the data or anything the model can't express (e.g. deduplicating rows before a unique index), add a
+Migration with the next version to the end of `migrations`.
+
+Usage in Database.setup_database.
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass, field
+import re
+from .database_model import Index, Table
+from .sqlite_database import SqliteDatabase
+
+NUMBER: re.Pattern = re.compile(r'-?\d+(\.\d+)?')  # a Column.default that is written as a numeric literal
+
+
+@dataclass
+class Migration:
+    """A versioned change of the database that database_model can't express.
+
+    Attributes:
+        version (int): the schema version after this migration. Must be the previous migration's version + 1.
+        description (str): printed when the migration is run.
+        statements (list[str]): SQL statements run in order.
+    """
+    version: int
+    description: str
+    statements: list[str] = field(default_factory=list)
+
+
+migrations: list[Migration] = [
+    Migration(1, 'Remove the duplicate reactions before Reactions(message_id, emoji_id) becomes unique', [
+        'DELETE FROM Reactions WHERE rowid NOT IN (SELECT MAX(rowid) FROM Reactions GROUP BY message_id, emoji_id)'
+    ]),
+    Migration(2, 'Count the flushes, so a warm-start snapshot older than the database is not used', [
+        "INSERT OR IGNORE INTO Meta (key, value) VALUES ('write_generation', 0)"
+    ]),
+    Migration(3, 'Remember the last flushed journal segment, so it is not replayed over newer data', [
+        "INSERT OR IGNORE INTO Meta (key, value) VALUES ('journal_segment', 0)"
+    ])
+]
+
+
+@dataclass
+class SchemaMigrator:
+    """Migrates the database to the model.
+
+    Args:
+        db (SqliteDatabase): the write connection.
+        model (list[Table]): usually database_model.
+        migrations (list[Migration]): the versioned migrations, oldest first.
+
+    Examples:
+        SchemaMigrator(self.db, database_model, migrations).migrate()
+    """
+    db: SqliteDatabase
+    model: list[Table]
+    migrations: list[Migration] = field(default_factory=list)
+
+    def migrate(self):
+        version: int = self.db.cursor.execute("PRAGMA user_version").fetchone()[0]
+        target: int = self.migrations[-1].version if self.migrations else 0
+        with self.db.transaction():
+            for table in self.model:
+                self.db.create_table(table.name, table.columns, save=False)
+                self.add_missing_columns(table)
+            for migration in self.migrations:
+                if migration.version <= version:
+                    continue
+                print(f"Migrating database to version {migration.version}: {migration.description}")
+                for statement in migration.statements:
+                    self.db.cursor.execute(statement)
+            for table in self.model:
+                for index in table.indexes:
+                    self.create_index(table, index)
+            if target > version:
+                # PRAGMA doesn't take parameters
+                self.db.cursor.execute(f"PRAGMA user_version={int(target)}")
+
+    def add_missing_columns(self, table: Table):
+        existing: set[str] = {row['name'] for row in self.db.cursor.execute(f"PRAGMA table_info({table.name})")}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if 'PRIMARY KEY' in column.type.upper() or 'UNIQUE' in column.type.upper():
+                raise ValueError(f"Can't add the column {table.name}.{column.name} {column.type}: SQLite can't add a "
+                                 f"PRIMARY KEY or UNIQUE column to an existing table, write a Migration instead")
+            print(f"Adding column {table.name}.{column.name}")
+            default: str = f" DEFAULT {default_literal(column.default)}" if column.default is not None else ''
+            self.db.cursor.execute(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type}{default}")
+
+    def create_index(self, table: Table, index: Index):
+        name: str = f"idx_{table.name}_{'_'.join(index.columns)}"
+        exists: bool = self.db.cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='index' AND name=?", (name,)).fetchone() is not None
+        if exists:
+            return
+        print(f"Creating index {name}")
+        self.db.cursor.execute(f"CREATE {'UNIQUE ' if index.unique else ''}INDEX {name} "
+                               f"ON {table.name} ({', '.join(index.columns)})")
+
+
+def default_literal(default: str) -> str:
+    """The SQL literal of a Column.default: a number as it is, anything else as a string with the quotes escaped."""
+    if NUMBER.fullmatch(default):
+        return default
+    return "'" + default.replace("'", "''") + "'"
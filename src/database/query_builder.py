@@ -0,0 +1,98 @@
+"""
+Compiled SQL for SqliteDatabase. The SQL of a query only depends on its shape (the table, the columns and the keys of
+the where dict, and the length of the IN lists), so each shape is built once and cached. Reusing the exact same SQL
+string also makes sqlite3's own prepared statement cache hit.
+
+Usage in SqliteDatabase.
+"""
+
+from __future__ import annotations
+from collections.abc import Iterator
+from functools import lru_cache
+from typing import Any
+
+WhereShape = tuple[tuple[str, ...], tuple[int, ...]]  # the where keys and the lengths of their IN lists
+NO_WHERE: WhereShape = ((), ())
+
+
+def is_in(key: str) -> bool:
+    return key.split(' ')[-1] == 'IN'
+
+
+@lru_cache(maxsize=None)
+def in_key_flags(keys: tuple[str, ...]) -> tuple[bool, ...] | None:
+    """Which of the where keys are IN comparisons, None if none of them."""
+    flags: tuple[bool, ...] = tuple(is_in(key) for key in keys)
+    return flags if any(flags) else None
+
+
+def compile_where_dict(where: dict[str, Any] | None) -> tuple[WhereShape, tuple]:
+    """The hashable shape of a where dict and its parameters in the order of the compiled SQL. Doesn't modify the
+    dict, a single IN value is treated as a list of one.
+
+    Examples:
+        compile_where_dict({'user_id IN': [1, 2], 'created_at >=': 5})
+            -> ((('user_id IN', 'created_at >='), (2,)), (1, 2, 5))
+    """
+    if not where:
+        return NO_WHERE, ()
+    keys: tuple[str, ...] = tuple(where)
+    flags: tuple[bool, ...] | None = in_key_flags(keys)
+    if flags is None:
+        return (keys, ()), tuple(where.values())
+    lengths: list[int] = []
+    params: list = []
+    for value, flag in zip(where.values(), flags):
+        if flag and isinstance(value, (list, tuple)):
+            lengths.append(len(value))
+            params.extend(value)
+        else:
+            if flag:
+                lengths.append(1)
+            params.append(value)
+    return (keys, tuple(lengths)), tuple(params)
+
+
+@lru_cache(maxsize=None)
+def compile_where(shape: WhereShape) -> str:
+    keys, lengths = shape
+    if not keys:
+        return ''
+    in_lengths: Iterator[int] = iter(lengths)
+    conditions: list[str] = [f"{key} ({','.join(['?'] * next(in_lengths))})" if is_in(key) else f"{key}?"
+                             for key in keys]
+    return f" WHERE {' AND '.join(conditions)}"
+
+
+@lru_cache(maxsize=None)
+def compile_select(table_name: str, values: str | tuple[str, ...], shape: WhereShape,
+                   group_by: str | tuple[str, ...] | None, order_by: str | tuple[str, ...] | None,
+                   join_query: str, desc: bool, limit: int | None) -> str:
+    query: str = f"SELECT {values if isinstance(values, str) else ', '.join(values)} FROM {table_name}"
+    if join_query:
+        query += f" {join_query.strip()}"
+    query += compile_where(shape)
+    if group_by:
+        query += f" GROUP BY {group_by if isinstance(group_by, str) else ', '.join(group_by)}"
+    if order_by:
+        query += f" ORDER BY {order_by if isinstance(order_by, str) else ', '.join(order_by)}"
+        if desc:
+            query += " DESC"
+    if limit:
+        query += f" LIMIT {int(limit)}"
+    return query
+
+
+@lru_cache(maxsize=None)
+def compile_insert(table_name: str, columns: tuple[str, ...]) -> str:
+    return f"INSERT or IGNORE INTO {table_name} ({', '.join(columns)}) VALUES ({','.join(['?'] * len(columns))})"
+
+
+@lru_cache(maxsize=None)
+def compile_update(table_name: str, set_columns: tuple[str, ...], shape: WhereShape) -> str:
+    return f"UPDATE {table_name} SET {', '.join(f'{column}=?' for column in set_columns)}{compile_where(shape)}"
+
+
+def as_key(value: str | list[str] | tuple[str, ...] | None) -> str | tuple[str, ...] | None:
+    """Lists aren't hashable, so the column lists are cached as tuples."""
+    return tuple(value) if isinstance(value, list) else value
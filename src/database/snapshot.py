@@ -0,0 +1,202 @@
+"""
+Warm-start snapshot of the users, their stats and their activity dates, so the bot doesn't have to rebuild them from
+the User JOIN UserStats LEFT JOIN ActivityDates rows (one row per user per active day) on every boot.
+
+The snapshot is written after every flush of Database.save_database and on a clean shutdown. It's only used if it was
+written after the last flush (the write generation in the Meta table matches); the ActivityDates rows inserted after
+it (a higher rowid) are applied on top of it. Otherwise Database falls back to the full rebuild.
+
+File format (little-endian):
+    header: magic, format version, write generation, ActivityDates rowid, CRC32 and length of the payload
+    payload (zlib): the users section followed by the activity section up to the end of the payload. The activity
+        section is blocks of (user id, first day ordinal, day count) followed by the message points and the voice
+        points columns of the user's ActivityLog.
+
+Usage in Database.
+"""
+
+from __future__ import annotations
+from array import array
+from collections.abc import Collection, Iterable
+from dataclasses import dataclass, field
+import os
+import struct
+import zlib
+from src.clock import day_ordinal
+from src.objects import ActivityDate, ActivityLog, Stats, User
+
+SNAPSHOT_PATH: str = 'data/state.snapshot'
+MAGIC: bytes = b'KRSS'
+FORMAT_VERSION: int = 2
+NULL: int = -2 ** 63  # None of the integer fields
+
+HEADER: struct.Struct = struct.Struct('<4sHqqIQ')
+COUNT: struct.Struct = struct.Struct('<I')
+STRING_LENGTH: struct.Struct = struct.Struct('<H')
+NULL_STRING: int = 0xFFFF
+# id, bot, User.is_in_database, Stats.is_in_database and the STATS_FIELDS
+USER: struct.Struct = struct.Struct('<qqBB11q')
+STATS_FIELDS: tuple[str, ...] = ('time_in_voice', 'points', 'total_post_length', 'mentioned_times', 'files_sent',
+                                 'longest_streak', 'first_post_time', 'last_post_time', 'gif_count', 'emoji_count',
+                                 'bot_command_count')
+ACTIVITY_BLOCK: struct.Struct = struct.Struct('<qqI')  # user id, first day ordinal, day count
+POINTS_SIZE: int = array('i').itemsize
+
+
+@dataclass
+class LoadedSnapshot:
+    """A snapshot read by Snapshot.load.
+
+    Attributes:
+        users (list[User]): the users with their stats and activity dates.
+        write_generation (int): Database.write_generation when the snapshot was written.
+        activity_rowid (int): the largest ActivityDates rowid in the activity dates.
+    """
+    users: list[User]
+    write_generation: int
+    activity_rowid: int
+
+
+def _int(value: int | None) -> int:
+    return NULL if value is None else value
+
+
+def _value(value: int) -> int | None:
+    return None if value == NULL else value
+
+
+def _pack_string(value: str | int | None, out: list[bytes]):
+    if value is None:
+        out.append(STRING_LENGTH.pack(NULL_STRING))
+        return
+    encoded: bytes = str(value).encode()
+    out.append(STRING_LENGTH.pack(len(encoded)))
+    out.append(encoded)
+
+
+def _unpack_string(data: bytes, offset: int) -> tuple[str | None, int]:
+    length: int = STRING_LENGTH.unpack_from(data, offset)[0]
+    offset += STRING_LENGTH.size
+    if length == NULL_STRING:
+        return None, offset
+    return data[offset:offset + length].decode(), offset + length
+
+
+@dataclass
+class Snapshot:
+    """Encodes, writes and loads the snapshot file.
+
+    The users section reads the live User objects, so it's encoded on the event loop; compressing and writing the
+    file is done in the writer thread. The activity dates only change once a day, so their section is kept encoded
+    and the new activity dates are appended to it as they're added to the users.
+
+    Attributes:
+        path (str): the snapshot file.
+        activity_chunks (list[bytes]): the encoded activity section.
+
+    Examples:
+        snapshot.add_activity(activity_dates)
+        state = snapshot.encode(bot.users)
+        snapshot.write(state, write_generation, activity_rowid)
+        loaded = snapshot.load()
+    """
+    path: str = SNAPSHOT_PATH
+    activity_chunks: list[bytes] = field(default_factory=list)
+
+    def set_activity(self, users: Iterable[User]):
+        """Encode the activity logs of the users, replacing the activity section."""
+        out: list[bytes] = []
+        for user in users:
+            activity: ActivityLog = user.stats.activity
+            if activity:
+                out.append(ACTIVITY_BLOCK.pack(user.id, activity.first_day, len(activity)))
+                out.append(activity.message_points.tobytes())
+                out.append(activity.voice_points.tobytes())
+        self.activity_chunks = [b''.join(out)]
+
+    def add_activity(self, activity_dates: Iterable[ActivityDate]):
+        """Append the activity dates that were added to the users, as one day blocks."""
+        out: list[bytes] = []
+        for ad in activity_dates:
+            if ad.message_points or ad.voice_points:
+                out.append(ACTIVITY_BLOCK.pack(ad.user_id, day_ordinal(ad.year, ad.month, ad.day), 1))
+                out.append(array('i', (ad.message_points or 0, ad.voice_points or 0)).tobytes())
+        self.activity_chunks.append(b''.join(out))
+
+    def encode(self, users: Collection[User]) -> tuple[bytes, ...]:
+        """Encode the users and their stats, followed by the activity section. Call on the event loop."""
+        out: list[bytes] = [COUNT.pack(len(users))]
+        for user in users:
+            stats: Stats = user.stats
+            out.append(USER.pack(user.id, user.bot, user.is_in_database, stats.is_in_database,
+                                 *[_int(getattr(stats, name)) for name in STATS_FIELDS]))
+            _pack_string(user.name, out)
+            _pack_string(user.profile_filename, out)
+            _pack_string(user.identifier, out)
+        return b''.join(out), *self.activity_chunks
+
+    def write(self, state: tuple[bytes, ...], write_generation: int, activity_rowid: int):
+        """Compress and write the encoded state. The file is replaced atomically, so a crash while writing leaves the
+        previous snapshot."""
+        payload: bytes = zlib.compress(b''.join(state), 1)
+        header: bytes = HEADER.pack(MAGIC, FORMAT_VERSION, write_generation, activity_rowid, zlib.crc32(payload),
+                                    len(payload))
+        tmp_path: str = f'{self.path}.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(header)
+            file.write(payload)
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> LoadedSnapshot | None:
+        """Read the snapshot and take its activity section into use. None if it's missing, of another format version
+        or corrupted."""
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, 'rb') as file:
+            data: bytes = file.read()
+        if len(data) < HEADER.size:
+            return None
+        magic, version, write_generation, activity_rowid, checksum, length = HEADER.unpack_from(data)
+        payload: bytes = data[HEADER.size:]
+        if magic != MAGIC or version != FORMAT_VERSION or len(payload) != length or zlib.crc32(payload) != checksum:
+            return None
+        users, activity_section = self.decode(zlib.decompress(payload))
+        self.activity_chunks = [activity_section]
+        return LoadedSnapshot(users, write_generation, activity_rowid)
+
+    @staticmethod
+    def decode(data: bytes) -> tuple[list[User], bytes]:
+        """Decode the payload into the users. Returns the users and the activity section."""
+        users: dict[int, User] = {}
+        offset: int = COUNT.size
+        for _ in range(COUNT.unpack_from(data)[0]):
+            user_id, bot, user_in_database, stats_in_database, *values = USER.unpack_from(data, offset)
+            offset += USER.size
+            name, offset = _unpack_string(data, offset)
+            profile_filename, offset = _unpack_string(data, offset)
+            identifier, offset = _unpack_string(data, offset)
+            stats: Stats = Stats(user_id=user_id, is_in_database=bool(stats_in_database),
+                                 **{stat: _value(value) for stat, value in zip(STATS_FIELDS, values)})
+            users[user_id] = User(id=user_id, name=name, bot=bot, profile_filename=profile_filename,
+                                  identifier=identifier, stats=stats, is_in_database=bool(user_in_database))
+
+        activity_section: bytes = data[offset:]
+        offset = 0
+        while offset < len(activity_section):
+            user_id, first_day, count = ACTIVITY_BLOCK.unpack_from(activity_section, offset)
+            offset += ACTIVITY_BLOCK.size
+            column_size: int = count * POINTS_SIZE
+            message_points: array = array('i', activity_section[offset:offset + column_size])
+            voice_points: array = array('i', activity_section[offset + column_size:offset + 2 * column_size])
+            offset += 2 * column_size
+            user: User | None = users.get(user_id)
+            if user is None:
+                continue
+            activity: ActivityLog = user.stats.activity
+            if not activity:
+                activity.first_day, activity.message_points, activity.voice_points = \
+                    first_day, message_points, voice_points
+                continue
+            for index, (message, voice) in enumerate(zip(message_points, voice_points)):
+                activity.add(first_day + index, message, voice)
+        return list(users.values()), activity_section
@@ -1,9 +1,47 @@
 from .database_model import Column
+from .query_builder import WhereShape, as_key, compile_insert, compile_select, compile_update, compile_where, \
+    compile_where_dict
+from collections.abc import Iterator
+from contextlib import contextmanager
 from typing import Any
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import sqlite3
 
 DATABASE_NAME: str = "data/kristitty.db"
+STATEMENT_CACHE_SIZE: int = 256  # prepared statements kept per connection, keyed by the (compiled) SQL string
+
+
+@dataclass(frozen=True)
+class ConnectionSettings:
+    """The pragmas every connection is opened with. Set in the [DATABASE] category of CONFIG.
+
+    With WAL the readers don't block behind a write and the writer doesn't block behind the readers, and
+    synchronous=NORMAL only syncs at the checkpoints (a power loss can lose the last commits, but not corrupt the
+    database).
+
+    Attributes:
+        journal_mode (str): e.g. WAL or DELETE. Persistent in the database file, so only set by the write connection.
+        synchronous (str): OFF, NORMAL, FULL or EXTRA.
+        cache_size_kb (int): page cache size per connection in KiB.
+        mmap_size_mb (int): how much of the database file is memory mapped, in MiB. 0 disables.
+        temp_store (str): DEFAULT, FILE or MEMORY, where the temporary tables and indices (e.g. of GROUP BY) are kept.
+        busy_timeout_ms (int): how long a connection waits for a lock before giving up.
+    """
+    journal_mode: str = 'WAL'
+    synchronous: str = 'NORMAL'
+    cache_size_kb: int = 65536
+    mmap_size_mb: int = 256
+    temp_store: str = 'MEMORY'
+    busy_timeout_ms: int = 5000
+
+    def apply(self, connection: sqlite3.Connection, readonly: bool = False):
+        if not readonly:
+            connection.execute(f"PRAGMA journal_mode={self.journal_mode}")
+        connection.execute(f"PRAGMA synchronous={self.synchronous}")
+        connection.execute(f"PRAGMA cache_size={-self.cache_size_kb}")
+        connection.execute(f"PRAGMA mmap_size={self.mmap_size_mb * 1024 * 1024}")
+        connection.execute(f"PRAGMA temp_store={self.temp_store}")
+        connection.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
 
 
 @dataclass
@@ -18,15 +56,29 @@ class SqliteDatabase:
         values = sqlite3db.select('Messages', ['id', 'attachments'], {'user_id IN': [323232, 502323})
 
     Attributes:
+        settings (ConnectionSettings): the pragmas of the connection.
+        readonly (bool): open a read-only connection, used by the reader threads of AsyncDatabase.
         connection (sqlite3.Connection): sqlite3 database connection.
         cursor (sqlite3.Cursor): sqlite3 database cursor.
     """
+    settings: ConnectionSettings = field(default_factory=ConnectionSettings)
+    readonly: bool = False
     connection: sqlite3.Connection = None
     cursor: sqlite3.Cursor = None
 
     def __post_init__(self):
-        """Establish the database connection."""
-        self.connection = sqlite3.connect(DATABASE_NAME)
+        """Establish the database connection.
+
+        The write connection is opened on the main thread for the startup and then handed over to the writer thread
+        of AsyncDatabase, hence check_same_thread=False. It's never used from two threads at the same time.
+        """
+        if self.readonly:
+            self.connection = sqlite3.connect(f'file:{DATABASE_NAME}?mode=ro', uri=True,
+                                              cached_statements=STATEMENT_CACHE_SIZE)
+        else:
+            self.connection = sqlite3.connect(DATABASE_NAME, check_same_thread=False,
+                                              cached_statements=STATEMENT_CACHE_SIZE)
+        self.settings.apply(self.connection, self.readonly)
         self.connection.row_factory = sqlite3.Row
         self.cursor = self.connection.cursor()
 
@@ -34,14 +86,31 @@ class SqliteDatabase:
         """Save the database."""
         self.connection.commit()
 
-    def create_table(self, table_name: str, columns: list[Column]):
-        """Create table.
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Run the statements in one explicit transaction. Committed at the end, rolled back on an exception.
 
-        TODO: Allow update table if exists. At the moment you need to manually update a column in an existing database
+        Examples:
+            with sqlite3db.transaction():
+                sqlite3db.insert_many('Messages', ['id', 'user_id'], [(1, 5), (2, 5)])
+                sqlite3db.update_many('Reactions', ['count'], ['message_id', 'emoji_id'], [(3, 1, 100)])
+        """
+        if not self.connection.in_transaction:
+            self.cursor.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self.connection.rollback()
+            raise
+        self.connection.commit()
+
+    def create_table(self, table_name: str, columns: list[Column], save: bool = True):
+        """Create table if it doesn't exist. The existing tables are updated by SchemaMigrator.
 
         Args:
             table_name (str): name of the table.
             columns (list[Column]): list of Column objects that are to be inserted.
+            save (bool): whether to commit, False inside a transaction.
         """
         columns_and_types: str = ""
         for i in range(len(columns)):
@@ -49,14 +118,14 @@ class SqliteDatabase:
                 columns_and_types += ', '
             columns_and_types += columns[i].name + " " + columns[i].type
         self.cursor.execute(f"CREATE TABLE IF NOT EXISTS {table_name} ({columns_and_types});")
-        self.cursor.execute(f"PRAGMA table_info({table_name})")
-        a = self.cursor.fetchall()
-        self.save()
+        if save:
+            self.save()
 
     def select(self, table_name: str, values: list[str] | str, where: dict[str, Any] | None = None,
                group_by: str | list[str] = None, order_by: str | list[str] = None,
                join_query: str = "", fetchall: bool = True, desc: bool = False, limit: int = None) -> list:
-        """Select query.
+        """Select query. The SQL is compiled once per call shape (see query_builder), in the order
+        SELECT … FROM table join WHERE … GROUP BY … ORDER BY … DESC LIMIT n.
 
         Args:
             table_name (str): name of the table.
@@ -81,16 +150,10 @@ class SqliteDatabase:
             select('ActivityDates', ['year', 'month', 'day'], group_by=['year', 'month', 'day'],
                 order_by=['year', 'month', 'day'])
         """
-        query: str = f"SELECT {', '.join(values) if isinstance(values, list) else values} FROM {table_name} "
-        where_query, extra_values = self.construct_where_query(where)
-        query += f"{where_query}{join_query}"
-        if group_by:
-            query += f"GROUP BY {', '.join(group_by) if isinstance(group_by, list) else group_by} "
-        if order_by:
-            query += f"ORDER BY {', '.join(order_by) if isinstance(order_by, list) else order_by} "
-        query += f"{'DESC ' if desc else ''};"
-        query += f"{'LIMIT ' + str(limit) if limit else ''}"
-        self.cursor.execute(query, extra_values)
+        shape, params = compile_where_dict(where)
+        query: str = compile_select(table_name, as_key(values), shape, as_key(group_by), as_key(order_by), join_query,
+                                    desc, limit)
+        self.cursor.execute(query, params)
         return self.cursor.fetchall() if fetchall else self.cursor.fetchone()
 
     def insert(self, table_name: str, values: dict[str, Any]) -> bool:
@@ -109,13 +172,40 @@ class SqliteDatabase:
             insert('User', {'id': 100, 'name': 'Test Guy', 'bot': 0, 'profile_filename': 'ad.jpg', 'identifier': 0})
         """
         try:
-            self.cursor.execute(f"INSERT or IGNORE INTO {table_name} ({', '.join(values.keys())}) " +
-                                f"VALUES ({','.join(['?'] * len(values))})", tuple(values.values()))
+            self.cursor.execute(compile_insert(table_name, tuple(values)), tuple(values.values()))
             return True
         except sqlite3.IntegrityError as e:
             print(f"Error at inserting into {table_name} values {tuple(values.values())}: {e}")
         return False
 
+    def insert_many(self, table_name: str, columns: list[str], rows: list[tuple]):
+        """Insert rows into a table with one prepared statement (executemany).
+
+        Args:
+            table_name (str): table name into which is inserted
+            columns (list[str]): the column names, in the order of the values in the rows.
+            rows (list[tuple]): the values of each row.
+
+        Raises:
+            sqlite3.IntegrityError: if any of the rows violates a constraint that INSERT OR IGNORE doesn't ignore.
+        """
+        self.cursor.executemany(compile_insert(table_name, tuple(columns)), rows)
+
+    def update_many(self, table_name: str, set_columns: list[str], where_columns: list[str], rows: list[tuple]):
+        """Update rows in a table with one prepared statement (executemany).
+
+        Args:
+            table_name (str): Table which is updated
+            set_columns (list[str]): the updated columns.
+            where_columns (list[str]): the columns that identify the row, compared with =.
+            rows (list[tuple]): the new values followed by the where values of each row.
+
+        Examples:
+            update_many('UserStats', ['points', 'gif_count'], ['user_id'], [(1000, 5, 100), (20, 0, 101)])
+        """
+        shape: WhereShape = (tuple(f'{column} =' for column in where_columns), ())
+        self.cursor.executemany(compile_update(table_name, tuple(set_columns), shape), rows)
+
     def update(self, table_name: str, set_values: dict[str, Any], where: dict[str, Any] = None):
         """Update rows in a table.
 
@@ -128,37 +218,11 @@ class SqliteDatabase:
             update('User', {'name': 'Test', 'profile_filename': 'asd.jpg'}, {'id': 100})
             update('Reactions', {'count': 100}, {'message_id': 1000, 'emoji_id': 1000})
         """
-        query: str = f"UPDATE {table_name} SET "
-        values: tuple = tuple()
-        i: int = 0
-        for key in set_values:
-            query += f"{key}=?" if i == 0 else f", {key}=?"
-            values += set_values[key],
-            i += 1
-        where_query, extra_values = self.construct_where_query(where)
-        query += where_query
-        values += extra_values
-
-        self.cursor.execute(query, values)
+        shape, params = compile_where_dict(where)
+        self.cursor.execute(compile_update(table_name, tuple(set_values), shape), tuple(set_values.values()) + params)
 
     @staticmethod
-    def construct_where_query(where: dict[str, Any]) -> tuple[str, tuple[Any]]:
-        query: str = ''
-        extra_values: tuple = tuple()
-        if not where:
-            return query, extra_values
-        query += ' WHERE '
-        i: int = 0
-        for key in where:
-            if i > 0:
-                query += 'AND '
-            i += 1
-            if key.split(' ')[-1] == 'IN':
-                if not isinstance(where[key], list) and not isinstance(where[key], tuple):
-                    where[key] = [where[key]]
-                query += f"{key} ({','.join(['?'] * len(where[key]))}) "
-            else:
-                query += f"{key}? "
-            extra_values = extra_values + (where[key],) if not isinstance(where[key], list) and \
-                                                           not isinstance(where[key], tuple) else tuple(where[key])
-        return query, extra_values
+    def construct_where_query(where: dict[str, Any] | None) -> tuple[str, tuple[Any, ...]]:
+        """The WHERE clause of the where dict and its parameters. The where dict isn't modified."""
+        shape, params = compile_where_dict(where)
+        return compile_where(shape), params
@@ -0,0 +1,109 @@
+"""
+Write-behind buffer of the changes waiting to be flushed to the database. The changes are coalesced by the primary key
+of their table, so an object queued many times between flushes is written once, and the buffer tells when it's time
+to flush: when FLUSH_ROWS rows are pending or the oldest pending row is FLUSH_SECONDS old, whichever comes first.
+
+Usage in Database (Database.buffer).
+"""
+
+from __future__ import annotations
+from collections.abc import Hashable
+from dataclasses import dataclass, field
+import time
+
+FLUSH_ROWS: int = 5000  # flush when this many rows are pending, DATABASE.FLUSH_ROWS in CONFIG
+FLUSH_SECONDS: float = 300.0  # flush when the oldest pending row is this old, DATABASE.FLUSH_SECONDS in CONFIG
+
+
+@dataclass
+class WriteBuffer:
+    """The pending rows by table, keyed by the primary key, in the order of the tables.
+
+    A row queued again replaces the queued one, or is dropped if the queued one should be kept (replace=False). The
+    tables without a primary key (VoiceDates) are keyed by id() of the object, so only the same object coalesces.
+
+    Args:
+        flush_rows (int): how many pending rows make the buffer full.
+        flush_seconds (float): how old the oldest pending row may get before the buffer is due.
+
+    Attributes:
+        tables (dict[str, dict[Hashable, object]]): the pending rows by table and key.
+        pending (int): how many rows are pending.
+        first_pending (float | None): time.monotonic() of the oldest pending row, None if none.
+        queued (int): how many rows have been queued in total.
+        coalesced (int): how many of them replaced or were dropped for an already pending row.
+        flushed (int): how many rows have been taken for flushing.
+        flushes (int): how many times rows have been taken for flushing.
+
+    Examples:
+        buffer.add('Messages', message.id, message)
+        if buffer.is_due():
+            changes = buffer.take()
+    """
+    flush_rows: int = FLUSH_ROWS
+    flush_seconds: float = FLUSH_SECONDS
+    tables: dict[str, dict[Hashable, object]] = field(default_factory=dict)
+    pending: int = 0
+    first_pending: float | None = None
+    queued: int = 0
+    coalesced: int = 0
+    flushed: int = 0
+    flushes: int = 0
+
+    def __len__(self) -> int:
+        return self.pending
+
+    def add_table(self, table: str):
+        """Add a table, the tables are flushed in the order they were added."""
+        self.tables.setdefault(table, {})
+
+    def add(self, table: str, key: Hashable, elem: object, replace: bool = True) -> bool:
+        """Queue a row. Returns whether the buffer is full now."""
+        rows: dict[Hashable, object] = self.tables[table]
+        self.queued += 1
+        if key in rows:
+            self.coalesced += 1
+            if replace:
+                rows[key] = elem
+            return self.is_full()
+        rows[key] = elem
+        self.pending += 1
+        if self.first_pending is None:
+            self.first_pending = time.monotonic()
+        return self.is_full()
+
+    def is_pending(self, table: str, key: Hashable) -> bool:
+        return key in self.tables[table]
+
+    def is_full(self) -> bool:
+        return self.pending >= self.flush_rows
+
+    def age(self) -> float:
+        """How many seconds the oldest pending row has waited."""
+        return time.monotonic() - self.first_pending if self.first_pending is not None else 0.0
+
+    def is_due(self) -> bool:
+        return self.is_full() or (self.pending > 0 and self.age() >= self.flush_seconds)
+
+    def take(self) -> dict[str, list]:
+        """Take the pending rows of every table for flushing and empty the buffer."""
+        changes: dict[str, list] = {}
+        for table, rows in self.tables.items():
+            if rows:
+                changes[table] = list(rows.values())
+                rows.clear()
+        self.flushed += self.pending
+        self.flushes += 1
+        self.pending = 0
+        self.first_pending = None
+        return changes
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            'pending': self.pending,
+            'age': self.age(),
+            'queued': self.queued,
+            'coalesced': self.coalesced,
+            'flushed': self.flushed,
+            'flushes': self.flushes
+        }
@@ -1,12 +1,17 @@
 from __future__ import annotations
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from collections.abc import Callable
+import asyncio
+import time
 import discord
 import discord.abc
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, ClassVar
+from src.inbox import EventInbox
 from datetime import datetime
 
 if TYPE_CHECKING:
     from src.bot import Bot
+    from src.basemodule import BaseModule
 
 
 @dataclass
@@ -20,8 +25,22 @@ class EventDispatcher:
     3. Add the same function to src/basemodule.py BaseModule class
     4. Make sure this module's function calls both the bot.py's function AND each module's function in bot.modules
 
+    Only the modules that override an event are called for it, and events that no module overrides are not
+    registered to the discord client at all. Call link_events again whenever bot.modules changes.
+
     Attributes:
         bot (Bot): the main bot object
+        subscribers (dict[str, list[Callable]]): the event handlers by the event name, e.g.
+            {'on_message': [bot.on_message, commands.on_message, ...]}. Built by link_events.
+        concurrent (bool): whether the modules' handlers are run concurrently (MISC.EVENT_DISPATCH_MODE = concurrent
+            in CONFIG) or one after another.
+        timeout (float): seconds a module's handler may run in the concurrent mode before it's cancelled. 0 is no
+            timeout. BaseModule.event_timeout overrides this.
+        semaphore (asyncio.Semaphore): caps how many module handlers run at the same time in the concurrent mode.
+            Kept over the relinks, so the handlers still running count against the same cap.
+        semaphore_limit (int): MAX_CONCURRENT_HANDLERS the semaphore was created with.
+        turns (dict[tuple[str, str], asyncio.Future]): the last reserved turn by (module name, event name), used to
+            keep the order of the BaseModule.ordered_events.
 
     Examples:
         events = EventDispatcher(self)
@@ -29,38 +48,160 @@ class EventDispatcher:
     """
 
     bot: Bot
+    subscribers: dict[str, list[Callable]] = field(default_factory=dict)
+    concurrent: bool = False
+    timeout: float = 60.0
+    semaphore: asyncio.Semaphore = None
+    semaphore_limit: int = 0
+    turns: dict[tuple[str, str], asyncio.Future] = field(default_factory=dict)
+
+    # following events are non discord events, and thus don't need to be registered to the discord client
+    non_discord_events: ClassVar[list[str]] = [
+        'on_new_day'
+    ]
+
+    # following events are always handled by one module after another and never queued, e.g. the commands must be
+    # registered in on_ready before the command tree is synced
+    sequential_events: ClassVar[list[str]] = [
+        'on_ready'
+    ]
 
     def link_events(self):
-        """Remember to have the same events in EventHandler as in EventDispatcher.
+        """Build the subscription table and register the subscribed events to the discord client.
+
+        Remember to have the same events in EventHandler as in EventDispatcher.
 
         See Also:
             https://discordpy.readthedocs.io/en/stable/api.html#event-reference
         """
-
-        # following events are non discord events, and thus don't need to be registered to the discord client
-        non_discord_events: list[str] = [
-            'on_new_day'
-        ]
-
+        self.concurrent = self.bot.config.EVENT_DISPATCH_MODE == 'concurrent'
+        self.timeout = self.bot.config.EVENT_TIMEOUT_SECONDS
+        if self.semaphore is None or self.semaphore_limit != self.bot.config.MAX_CONCURRENT_HANDLERS:
+            self.semaphore_limit = self.bot.config.MAX_CONCURRENT_HANDLERS
+            self.semaphore = asyncio.Semaphore(self.semaphore_limit)
+        self.refresh_subscribers()
         for attribute in dir(self):
-            if not attribute.startswith('on_') or attribute in non_discord_events:
+            if not attribute.startswith('on_') or attribute in self.non_discord_events:
                 continue
             if attribute not in dir(EventHandler):
                 print(f"Warning! {attribute} is not found in src.events.EventHandler! Might cause an error runtime.")
-            self.bot.client.event(getattr(self, attribute))
+            if attribute in self.subscribers:
+                self.bot.client.event(getattr(self, attribute))
+            elif attribute in vars(self.bot.client):
+                # no module handles the event anymore (e.g. after reload_module), fall back to discord.py's default
+                delattr(self.bot.client, attribute)
 
-    async def handle_event(self, event_name: str, *args):
-        await getattr(self.bot, event_name)(*args)
+    def refresh_subscribers(self):
+        """Map each event to the bot's and modules' handlers that override the EventHandler's no-op.
+
+        Also create the inboxes of the modules that have BaseModule.inbox_size set.
+        """
         for module in self.bot.modules:
+            if module.inbox_size and module.inbox is None:
+                module.inbox = EventInbox(module, module.inbox_size, module.overflow_policy, self.run_handler)
+        self.subscribers = {}
+        for attribute in dir(EventHandler):
+            if not attribute.startswith('on_'):
+                continue
+            handlers: list[Callable] = [getattr(handler, attribute) for handler in [self.bot, *self.bot.modules]
+                                        if handler.handles_event(attribute)]
+            if handlers:
+                self.subscribers[attribute] = handlers
+
+    async def handle_event(self, event_name: str, *args):
+        sequential: bool = event_name in self.sequential_events
+        if self.concurrent and not sequential:
+            await self.handle_event_concurrently(event_name, *args)
+            return
+        for handler in self.subscribers.get(event_name, []):
+            if handler.__self__ is self.bot:
+                await self.call_handler(handler, event_name, args)
+                continue
+            if handler.__self__.inbox and not sequential:
+                await handler.__self__.inbox.put(event_name, handler, args)
+                continue
             try:
-                await getattr(module, event_name)(*args)
+                await self.call_handler(handler, event_name, args)
             except Exception as e:
-                print(f"Module {module.__class__.__module__} failed {event_name}: {e}")
+                self.print_exception(handler.__self__, event_name, e)
 
-                traceback = e.__traceback__
-                while traceback:
-                    print("{}: {}".format(traceback.tb_frame.f_code.co_filename, traceback.tb_lineno))
-                    traceback = traceback.tb_next
+    async def handle_event_concurrently(self, event_name: str, *args):
+        """Run each module's handler as its own task, so a slow module doesn't hold up the other modules.
+
+        The bot's own handler is still awaited first, and the events of the modules with an inbox are queued next.
+        The turns of the modules that have the event in BaseModule.ordered_events are reserved here before anything
+        is awaited, so those see the events in the order they were dispatched.
+        """
+        handlers: list[Callable] = [handler for handler in self.subscribers.get(event_name, [])
+                                    if handler.__self__ is self.bot or not handler.__self__.inbox]
+        queued: list[Callable] = [handler for handler in self.subscribers.get(event_name, [])
+                                  if handler.__self__ is not self.bot and handler.__self__.inbox]
+        turns: list[tuple[asyncio.Future | None, asyncio.Future] | None] = [
+            self.reserve_turn(handler.__self__, event_name)
+            if handler.__self__ is not self.bot and event_name in handler.__self__.ordered_events else None
+            for handler in handlers
+        ]
+        for handler in handlers:
+            if handler.__self__ is self.bot:
+                await self.call_handler(handler, event_name, args)
+        for handler in queued:
+            await handler.__self__.inbox.put(event_name, handler, args)
+        async with asyncio.TaskGroup() as task_group:
+            for handler, turn in zip(handlers, turns):
+                if handler.__self__ is self.bot:
+                    continue
+                task_group.create_task(self.run_handler(handler, event_name, args, turn))
+
+    def reserve_turn(self, module: BaseModule, event_name: str) -> tuple[asyncio.Future | None, asyncio.Future]:
+        """Returns the future of the module's previous event of the same type and the future of this event."""
+        key: tuple[str, str] = (module.__class__.__module__, event_name)
+        previous: asyncio.Future | None = self.turns.get(key)
+        current: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.turns[key] = current
+        return previous, current
+
+    async def run_handler(self, handler: Callable, event_name: str, args: tuple,
+                          turn: tuple[asyncio.Future | None, asyncio.Future] | None = None):
+        """Run one module's handler with the timeout and the concurrency cap. Never raises."""
+        module: BaseModule = handler.__self__
+        timeout: float | None = module.event_timeout if module.event_timeout is not None else self.timeout
+        try:
+            if turn and turn[0]:
+                await turn[0]
+            async with self.semaphore:
+                async with asyncio.timeout(timeout or None):
+                    await self.call_handler(handler, event_name, args)
+        except TimeoutError:
+            print(f"Module {module.__class__.__module__} timed out {event_name} after {timeout} seconds")
+        except Exception as e:
+            self.print_exception(module, event_name, e)
+        finally:
+            if turn:
+                turn[1].set_result(None)
+                if self.turns.get((module.__class__.__module__, event_name)) is turn[1]:
+                    del self.turns[(module.__class__.__module__, event_name)]
+
+    async def call_handler(self, handler: Callable, event_name: str, args: tuple):
+        """Await the handler and record its latency to bot.perf."""
+        start: int = time.perf_counter_ns()
+        try:
+            await handler(*args)
+        finally:
+            self.bot.perf.record_event(handler.__self__.__class__.__module__, event_name,
+                                       time.perf_counter_ns() - start)
+
+    def inbox_stats(self) -> dict[str, dict[str, int | float]]:
+        """Queue depth, drops and lag of each module that has an inbox, by the module name."""
+        return {module.__class__.__module__: module.inbox.stats() for module in self.bot.modules if module.inbox}
+
+    @staticmethod
+    def print_exception(module: BaseModule, event_name: str, e: Exception):
+        print(f"Module {module.__class__.__module__} failed {event_name}: {e}")
+
+        traceback = e.__traceback__
+        while traceback:
+            print("{}: {}".format(traceback.tb_frame.f_code.co_filename, traceback.tb_lineno))
+            traceback = traceback.tb_next
 
     async def on_audit_log_entry_create(self, entry: discord.AuditLogEntry):
         await self.handle_event('on_audit_log_entry_create', entry)
@@ -235,7 +376,7 @@ class EventDispatcher:
     async def on_ready(self):
         await self.handle_event('on_ready')
 
-        self.bot.database.save_database()
+        await self.bot.database.save_database()
 
         @self.bot.commands.register(command_name='reload_module', function=self.bot.reload_module,
                                     description='Reload module', commands_per_day=200, timeout=5)
@@ -249,6 +390,9 @@ class EventDispatcher:
         self.bot.client_tree.copy_global_to(guild=self.bot.server)
         await self.bot.client_tree.sync(guild=self.bot.server)
 
+        # the modules have scheduled their jobs and caught up with the missed messages by now
+        self.bot.scheduler.start()
+
     async def on_reaction_add(self, reaction: discord.Reaction, user: discord.User):
         await self.handle_event('on_reaction_add', reaction, user)
 
@@ -354,6 +498,14 @@ class EventHandler:
         https://discordpy.readthedocs.io/en/stable/api.html
     """
 
+    # gateway intents needed regardless of the overridden events, e.g. for server.get_member. See src/intents.py
+    required_intents: ClassVar[tuple[str, ...]] = ()
+
+    @classmethod
+    def handles_event(cls, event_name: str) -> bool:
+        """Whether this class overrides the event, i.e. it is not the EventHandler's no-op."""
+        return getattr(cls, event_name, None) is not getattr(EventHandler, event_name)
+
     async def on_audit_log_entry_create(self, entry: discord.AuditLogEntry):
         pass
 
@@ -1,14 +1,19 @@
 from __future__ import annotations
+from bisect import bisect_right
 import calendar
+from collections.abc import Collection
 import datetime
 import discord
-import pytz
+from src.clock import clock, day_ordinal
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
     from src.objects import User, Stats
     from src.bot import Bot
 
+# LEVEL_THRESHOLDS[level] is the total points needed for the level, extended as higher points are seen
+LEVEL_THRESHOLDS: list[int] = [0]
+
 
 def utc_to_local(utc_dt: datetime.datetime, timezone: str) -> datetime.datetime:
     """UTC datetime to default timezone datetime.
@@ -20,9 +25,7 @@ def utc_to_local(utc_dt: datetime.datetime, timezone: str) -> datetime.datetime:
     Returns:
         Localized datetime object.
     """
-    local_tz = pytz.timezone(timezone)
-    local_dt = utc_dt.replace(tzinfo=pytz.utc).astimezone(local_tz)
-    return local_tz.normalize(local_dt)
+    return clock.to_local(utc_dt.replace(tzinfo=None), timezone)
 
 
 def dt2ts(dt: datetime.datetime) -> int:
@@ -54,7 +57,7 @@ def get_current_timestamp() -> int:
     Returns:
         A UTC native timestamp.
     """
-    return dt2ts(datetime.datetime.now())
+    return clock.timestamp()
 
 
 def get_midnight() -> datetime.datetime:
@@ -62,7 +65,7 @@ def get_midnight() -> datetime.datetime:
     Returns:
         The UTC midnight datetime.
     """
-    return datetime.datetime.combine(datetime.datetime.today(), datetime.time.min)
+    return clock.utc_midnight_datetime()
 
 
 def get_points_till_next_level(level: int) -> int:
@@ -86,14 +89,10 @@ def get_level(points: int) -> int:
     Returns:
         The level converted from the points.
     """
-    level: int = 0
-    while True:
-        points -= get_points_till_next_level(level)
-        if points >= 0:
-            level += 1
-        else:
-            break
-    return level
+    if points < 0:
+        return 0
+    extend_level_thresholds(points)
+    return bisect_right(LEVEL_THRESHOLDS, points) - 1
 
 
 def get_user_streak(user: User, daylist: Bot.daylist) -> int:
@@ -109,8 +108,7 @@ def get_user_streak(user: User, daylist: Bot.daylist) -> int:
     reversed_days = daylist[::-1][1:]
     i: int = 1
     for day in reversed_days:
-        activity_points = user.stats.get_activity_by_date(day)
-        if not activity_points.message_points and not activity_points.voice_points:
+        if not user.stats.activity.points(day_ordinal(day['year'], day['month'], day['day'])):
             break
         i += 1
     return i
@@ -126,17 +124,21 @@ def get_xp_over(points: int) -> tuple[int, int]:
         A tuple where the first attribute is the current XP of the current level, and the second attribute is
         the needed XP for the next level.
     """
-    current_xp: int = 0
-    level: int = 0
-    while True:
-        points -= get_points_till_next_level(level)
-        needed_xp = get_points_till_next_level(level)
-        if points >= 0:
-            current_xp = points
-            level += 1
-        else:
-            break
-    return current_xp, needed_xp
+    level: int = get_level(points)
+    # below the first level the XP of the level has always been shown as 0
+    current_xp: int = points - LEVEL_THRESHOLDS[level] if level else 0
+    return current_xp, get_points_till_next_level(level)
+
+
+def extend_level_thresholds(points: int):
+    """Add the levels to LEVEL_THRESHOLDS until the last one is above the points. Uses get_points_till_next_level,
+    so the levels are the same as when counting the levels up one by one.
+
+    Args:
+        points (int): User points.
+    """
+    while LEVEL_THRESHOLDS[-1] <= points:
+        LEVEL_THRESHOLDS.append(LEVEL_THRESHOLDS[-1] + get_points_till_next_level(len(LEVEL_THRESHOLDS) - 1))
 
 
 def get_actives(users: Bot.users, daylist: Bot.daylist, day_count: int = 14,
@@ -153,14 +155,12 @@ def get_actives(users: Bot.users, daylist: Bot.daylist, day_count: int = 14,
     Returns:
         A list of Users and their points from the past days.
     """
-    days: list[dict[str, int]] = daylist[::-1][1:day_count + 1]
+    first_day, last_day = get_day_range(daylist, day_count)
     points: list[tuple[User, Stats.points]] = []
     for user in users:
         if user.bot:
             continue
-        activity_points: int = 0
-        for day in days:
-            activity_points += user.stats.get_activity_by_date(day).points
+        activity_points: int = user.stats.activity.sum(first_day, last_day)
         if get_current:
             activity_points += user.stats.activity_points_today
         points.append((user, activity_points))
@@ -211,12 +211,20 @@ def get_last_14_day_points(user: User, daylist: Bot.daylist) -> int:
         Points from the past 14 days for the user.
     """
     day_count: int = 13
-    days = daylist[::-1][1:day_count + 1]
-    activity_points: int = 0
-    for day in days:
-        activity_points += user.stats.get_activity_by_date(day).points
-    activity_points += user.stats.activity_points_today
-    return activity_points
+    first_day, last_day = get_day_range(daylist, day_count)
+    return user.stats.activity.sum(first_day, last_day) + user.stats.activity_points_today
+
+
+def get_day_range(daylist: Bot.daylist, day_count: int) -> tuple[int, int]:
+    """The first and the last day ordinal of the day_count active days before today (the last day of the daylist).
+    The days in between that aren't in the daylist had no activity, so summing the whole range is the same as summing
+    the days. An empty range (first > last) if there are no such days.
+    """
+    days: list[dict[str, int]] = daylist[::-1][1:day_count + 1]
+    if not days:
+        return 1, 0
+    return (day_ordinal(days[-1]['year'], days[-1]['month'], days[-1]['day']),
+            day_ordinal(days[0]['year'], days[0]['month'], days[0]['day']))
 
 
 def check_if_administrator(member: discord.Member, role_full_admin: int = 0) -> bool:
@@ -230,7 +238,7 @@ def check_if_administrator(member: discord.Member, role_full_admin: int = 0) ->
     return False
 
 
-def check_if_can_ban(member: discord.Member, ban_roles: list[int]) -> bool:
+def check_if_can_ban(member: discord.Member, ban_roles: Collection[int]) -> bool:
     """Check whether the user is allowed to ban people."""
     for role in member.roles:
         if role.id in ban_roles:
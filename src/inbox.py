@@ -0,0 +1,181 @@
+"""
+Bounded per-module event queues. A module with BaseModule.inbox_size > 0 gets its events through an EventInbox that
+is served by the module's own worker task, so a module that falls behind only delays itself.
+"""
+
+from __future__ import annotations
+from collections import deque
+from collections.abc import Callable, Coroutine
+from dataclasses import dataclass, field
+import asyncio
+import time
+from typing import Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from src.basemodule import BaseModule
+
+
+class OverflowPolicy:
+    """What to do when a module's inbox is full.
+
+    BLOCK: the dispatcher waits until there's room (backpressure; nothing is lost). The blocked events are queued
+        in the order they arrived.
+    DROP_OLDEST: the oldest queued event is dropped.
+    COALESCE: a queued event of the same type about the same object (e.g. the same member) is replaced by the new
+        one, see COALESCE_KEYS. If there's none, or the event has no key, the oldest queued event is dropped.
+    """
+    BLOCK: str = 'block'
+    DROP_OLDEST: str = 'drop_oldest'
+    COALESCE: str = 'coalesce'
+
+
+# what the events are coalesced by, from the event's args. The events not listed are never coalesced.
+COALESCE_KEYS: dict[str, Callable[..., Any]] = {
+    'on_message': lambda message: message.author.id,
+    'on_voice_state_update': lambda member, before, after: member.id,
+    'on_member_update': lambda before, after: after.id,
+    'on_presence_update': lambda before, after: after.id,
+    'on_user_update': lambda before, after: after.id
+}
+
+
+@dataclass
+class QueuedEvent:
+    event_name: str
+    handler: Callable
+    args: tuple
+    enqueued_at: float
+
+    @property
+    def key(self) -> tuple[str, Any] | None:
+        """Events with the same key can be coalesced, e.g. ('on_voice_state_update', member.id). None if the event
+        isn't in COALESCE_KEYS."""
+        key_of: Callable[..., Any] | None = COALESCE_KEYS.get(self.event_name)
+        return (self.event_name, key_of(*self.args)) if key_of else None
+
+
+@dataclass
+class EventInbox:
+    """A bounded queue of events for one module, and the worker task that serves it.
+
+    Args:
+        module (BaseModule): the module whose events are queued.
+        maxsize (int): how many events can be queued at most.
+        policy (str): one of OverflowPolicy.
+        run_handler (Callable): runs one handler, see EventDispatcher.run_handler. Must not raise.
+
+    Attributes:
+        events (deque[QueuedEvent]): the queued events.
+        blocked (deque[tuple[asyncio.Future, QueuedEvent]]): the events waiting for room with the BLOCK policy, and
+            the futures their producers wait on. The worker moves them to events in this order as room is made.
+        processed (int): how many events the worker has handled.
+        dropped (int): how many events were dropped because the inbox was full.
+        coalesced (int): how many queued events were replaced by a newer one.
+        lag (float): how many seconds the last handled event waited in the queue.
+        max_lag (float): the longest wait in seconds.
+        worker (asyncio.Task | None): the worker task. Started when the first event is queued.
+    """
+    module: BaseModule
+    maxsize: int
+    policy: str
+    run_handler: Callable[[Callable, str, tuple], Coroutine]
+    events: deque[QueuedEvent] = field(default_factory=deque)
+    processed: int = 0
+    dropped: int = 0
+    coalesced: int = 0
+    lag: float = 0.0
+    max_lag: float = 0.0
+    worker: asyncio.Task | None = None
+    blocked: deque[tuple[asyncio.Future, QueuedEvent]] = field(default_factory=deque)
+    not_empty: asyncio.Event = field(default_factory=asyncio.Event)
+
+    @property
+    def depth(self) -> int:
+        return len(self.events)
+
+    async def put(self, event_name: str, handler: Callable, args: tuple):
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.create_task(self.run())
+        event: QueuedEvent = QueuedEvent(event_name, handler, args, time.perf_counter())
+        if self.policy == OverflowPolicy.BLOCK and (self.blocked or len(self.events) >= self.maxsize):
+            await self.wait_for_room(event)
+            return
+        while len(self.events) >= self.maxsize:
+            if self.policy == OverflowPolicy.COALESCE and self.coalesce(event):
+                return
+            self.events.popleft()
+            self.dropped += 1
+        self.events.append(event)
+        self.not_empty.set()
+
+    async def wait_for_room(self, event: QueuedEvent):
+        """Wait behind the earlier blocked events until the worker has queued the event. The worker queues it, not
+        the producer when it resumes, so a new event can't take the room first."""
+        waiter: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.blocked.append((waiter, event))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if not waiter.done() or waiter.cancelled():
+                # not queued yet, give up the place in the line
+                self.blocked = deque(entry for entry in self.blocked if entry[0] is not waiter)
+            raise
+
+    def admit_blocked(self):
+        """Move the blocked events to the queue in their order while there's room."""
+        while self.blocked and len(self.events) < self.maxsize:
+            waiter, event = self.blocked.popleft()
+            if waiter.done():
+                continue
+            self.events.append(event)
+            waiter.set_result(None)
+            self.not_empty.set()
+
+    def coalesce(self, event: QueuedEvent) -> bool:
+        """Replace the newest queued event with the same key. Returns False if there was none or the event has no
+        key."""
+        key: tuple[str, Any] | None = event.key
+        if key is None:
+            return False
+        for i in range(len(self.events) - 1, -1, -1):
+            if self.events[i].key != key:
+                continue
+            # keep the original enqueue time so the lag stays honest
+            event.enqueued_at = self.events[i].enqueued_at
+            self.events[i] = event
+            self.coalesced += 1
+            return True
+        return False
+
+    async def run(self):
+        while True:
+            if not self.events:
+                self.not_empty.clear()
+                await self.not_empty.wait()
+                continue
+            event: QueuedEvent = self.events.popleft()
+            self.admit_blocked()
+            self.lag = time.perf_counter() - event.enqueued_at
+            self.max_lag = max(self.max_lag, self.lag)
+            await self.run_handler(event.handler, event.event_name, event.args)
+            self.processed += 1
+
+    def close(self):
+        """Stop the worker. The events still in the queue are discarded and the blocked producers released."""
+        if self.worker:
+            self.worker.cancel()
+        self.events.clear()
+        for waiter, _ in self.blocked:
+            if not waiter.done():
+                waiter.set_result(None)
+        self.blocked.clear()
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            'depth': self.depth,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'lag': self.lag,
+            'max_lag': self.max_lag
+        }
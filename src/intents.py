@@ -0,0 +1,161 @@
+"""
+Gateway intent planner. Computes the minimal discord.Intents and discord.MemberCacheFlags from the events the bot and
+the enabled modules actually override, so the bot isn't subscribed to e.g. presence and typing floods it throws away.
+
+Usage in Bot.__post_init__.
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass, field
+import discord
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from src.events import EventHandler
+
+# the intents each event needs, see https://discordpy.readthedocs.io/en/stable/api.html#event-reference
+# events not listed here (on_ready, on_connect, on_interaction, ...) are always received
+MESSAGE_INTENTS: tuple[str, ...] = ('guild_messages', 'dm_messages')
+EVENT_INTENTS: dict[str, tuple[str, ...]] = {
+    'on_audit_log_entry_create': ('moderation',),
+    'on_automod_action': ('auto_moderation_execution',),
+    'on_automod_rule_create': ('auto_moderation_configuration',),
+    'on_automod_rule_delete': ('auto_moderation_configuration',),
+    'on_automod_rule_update': ('auto_moderation_configuration',),
+    'on_bulk_message_delete': MESSAGE_INTENTS,
+    'on_guild_available': ('guilds',),
+    'on_guild_channel_create': ('guilds',),
+    'on_guild_channel_delete': ('guilds',),
+    'on_guild_channel_pins_update': ('guilds',),
+    'on_guild_channel_update': ('guilds',),
+    'on_guild_emojis_update': ('emojis_and_stickers',),
+    'on_guild_integrations_update': ('integrations',),
+    'on_guild_join': ('guilds',),
+    'on_guild_remove': ('guilds',),
+    'on_guild_role_create': ('guilds',),
+    'on_guild_role_delete': ('guilds',),
+    'on_guild_role_update': ('guilds',),
+    'on_guild_stickers_update': ('emojis_and_stickers',),
+    'on_guild_unavailable': ('guilds',),
+    'on_guild_update': ('guilds',),
+    'on_integration_create': ('integrations',),
+    'on_integration_update': ('integrations',),
+    'on_invite_create': ('invites',),
+    'on_invite_delete': ('invites',),
+    'on_member_ban': ('moderation',),
+    'on_member_join': ('members',),
+    'on_member_remove': ('members',),
+    'on_member_unban': ('moderation',),
+    'on_member_update': ('members',),
+    'on_message': MESSAGE_INTENTS + ('message_content',),
+    'on_message_delete': MESSAGE_INTENTS,
+    'on_message_edit': MESSAGE_INTENTS + ('message_content',),
+    'on_presence_update': ('presences',),
+    'on_private_channel_pins_update': ('dm_messages',),
+    'on_raw_bulk_message_delete': MESSAGE_INTENTS,
+    'on_raw_integration_delete': ('integrations',),
+    'on_raw_member_remove': ('members',),
+    'on_raw_message_delete': MESSAGE_INTENTS,
+    'on_raw_message_edit': MESSAGE_INTENTS + ('message_content',),
+    'on_raw_reaction_add': ('guild_reactions', 'dm_reactions'),
+    'on_raw_reaction_clear': ('guild_reactions', 'dm_reactions'),
+    'on_raw_reaction_clear_emoji': ('guild_reactions', 'dm_reactions'),
+    'on_raw_reaction_remove': ('guild_reactions', 'dm_reactions'),
+    'on_raw_thread_delete': ('guilds',),
+    'on_raw_thread_member_remove': ('members',),
+    'on_raw_thread_update': ('guilds',),
+    'on_raw_typing': ('guild_typing', 'dm_typing'),
+    'on_reaction_add': ('guild_reactions', 'dm_reactions'),
+    'on_reaction_clear': ('guild_reactions', 'dm_reactions'),
+    'on_reaction_clear_emoji': ('guild_reactions', 'dm_reactions'),
+    'on_reaction_remove': ('guild_reactions', 'dm_reactions'),
+    'on_scheduled_event_create': ('guild_scheduled_events',),
+    'on_scheduled_event_delete': ('guild_scheduled_events',),
+    'on_scheduled_event_update': ('guild_scheduled_events',),
+    'on_scheduled_event_user_add': ('guild_scheduled_events',),
+    'on_scheduled_event_user_remove': ('guild_scheduled_events',),
+    'on_stage_instance_create': ('guilds',),
+    'on_stage_instance_delete': ('guilds',),
+    'on_stage_instance_update': ('guilds',),
+    'on_thread_create': ('guilds',),
+    'on_thread_delete': ('guilds',),
+    'on_thread_join': ('guilds',),
+    'on_thread_member_join': ('members',),
+    'on_thread_member_remove': ('members',),
+    'on_thread_remove': ('guilds',),
+    'on_thread_update': ('guilds',),
+    'on_typing': ('guild_typing', 'dm_typing'),
+    'on_user_update': ('members',),
+    'on_voice_state_update': ('voice_states',),
+    'on_webhooks_update': ('webhooks',)
+}
+
+# what turning off an intent saves, printed by IntentPlanner.print_report
+INTENT_SAVINGS: dict[str, str] = {
+    'presences': 'PRESENCE_UPDATE events (usually the bulk of the gateway traffic on big guilds) and the activity '
+                 'and status cache of every online member',
+    'guild_typing': 'TYPING_START events on every channel',
+    'dm_typing': 'TYPING_START events in DMs',
+    'invites': 'INVITE_CREATE and INVITE_DELETE events',
+    'webhooks': 'WEBHOOKS_UPDATE events',
+    'integrations': 'INTEGRATION_* events',
+    'emojis_and_stickers': 'GUILD_EMOJIS_UPDATE and GUILD_STICKERS_UPDATE events',
+    'expressions': 'GUILD_EMOJIS_UPDATE and GUILD_STICKERS_UPDATE events',
+    'guild_scheduled_events': 'GUILD_SCHEDULED_EVENT_* events',
+    'auto_moderation_configuration': 'AUTO_MODERATION_RULE_* events',
+    'auto_moderation_execution': 'AUTO_MODERATION_ACTION_EXECUTION events',
+    'voice_states': 'VOICE_STATE_UPDATE events and the voice state cache of the members',
+    'guild_reactions': 'MESSAGE_REACTION_* events',
+    'dm_reactions': 'MESSAGE_REACTION_* events in DMs',
+    'moderation': 'GUILD_BAN_* and GUILD_AUDIT_LOG_ENTRY_CREATE events'
+}
+
+
+@dataclass
+class IntentPlanner:
+    """Plans the gateway intents from the event handlers.
+
+    Args:
+        handlers (list[type[EventHandler]]): the bot class and the enabled module classes.
+        extra_intents (list[str]): intents to enable even if no handler needs them (MISC.EXTRA_INTENTS in CONFIG).
+
+    Attributes:
+        reasons (dict[str, list[str]]): the needed intents and the reasons for them, e.g.
+            {'voice_states': ['src.modules.stats.stats.on_voice_state_update']}
+
+    Examples:
+        planner = IntentPlanner([Bot, CommandManager, *[x for x in module_list if x.enabled]])
+        client = discord.Client(intents=planner.intents(), member_cache_flags=planner.member_cache_flags())
+    """
+    handlers: list[type[EventHandler]]
+    extra_intents: list[str] = field(default_factory=list)
+    reasons: dict[str, list[str]] = field(default_factory=dict)
+
+    def __post_init__(self):
+        for handler in self.handlers:
+            for intent in handler.required_intents:
+                self.reasons.setdefault(intent, []).append(handler.__module__)
+            for event_name, intents in EVENT_INTENTS.items():
+                if not handler.handles_event(event_name):
+                    continue
+                for intent in intents:
+                    self.reasons.setdefault(intent, []).append(f'{handler.__module__}.{event_name}')
+        for intent in self.extra_intents:
+            self.reasons.setdefault(intent, []).append('CONFIG')
+
+    def intents(self) -> discord.Intents:
+        return discord.Intents(**{intent: True for intent in self.reasons})
+
+    def member_cache_flags(self) -> discord.MemberCacheFlags:
+        return discord.MemberCacheFlags.from_intents(self.intents())
+
+    def print_report(self):
+        """Print the chosen intents and what the disabled ones save compared to discord.Intents.all()."""
+        enabled: list[str] = [name for name, value in self.intents() if value]
+        disabled: list[str] = [name for name, value in discord.Intents.all() if value and name not in enabled]
+        print(f"Gateway intents: {', '.join(enabled)}")
+        for intent in disabled:
+            print(f"  - not subscribed to {intent}: saves {INTENT_SAVINGS.get(intent, 'its gateway events')}")
+        cache_flags: discord.MemberCacheFlags = self.member_cache_flags()
+        if not cache_flags.online:
+            print("  - member cache: no status and activity data kept for the online members")
@@ -0,0 +1,180 @@
+"""
+Leaderboards: the users ordered by a score (e.g. the points or the casino balance), kept sorted as the scores change,
+so the rank of a user and the top and bottom rows don't need sorting every user.
+
+Usage in the stats module (bot.leaderboards['points']) and the casino module (bot.leaderboards['balances']).
+"""
+
+from __future__ import annotations
+from bisect import bisect_left, insort
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from src.objects import User
+
+BUCKET_SIZE: int = 512  # a bucket is split in two when it grows to twice this
+
+Key = tuple[int, int]  # (-score, user id), so the highest score sorts first and the ties by the user id
+
+
+@dataclass
+class Leaderboard:
+    """An order-statistic index of the users by score.
+
+    The keys are kept in sorted buckets (a list of short sorted lists) with a Fenwick tree of the bucket sizes, so a
+    rank is two bisects and a prefix sum: O(log n). An update moves one key between the buckets, and the top and the
+    bottom k are read from the ends: O(k).
+
+    The index doesn't notice the score changes by itself: call update(user) after a user's score may have changed.
+    Bot.points_changed does that for the leaderboards in bot.leaderboards when a user gets points.
+
+    Args:
+        score (Callable[[User], int]): the score of a user.
+        include (Callable[[User], bool]): whether the user is on the leaderboard at all, e.g. not a bot.
+
+    Attributes:
+        keys (dict[User.id, Key]): the current key of each user on the leaderboard.
+        users (dict[User.id, User]): the users on the leaderboard.
+        buckets (list[list[Key]]): the sorted keys in buckets.
+        maxes (list[Key]): the last key of each bucket.
+        sizes (list[int]): Fenwick tree of the bucket sizes.
+
+    Examples:
+        leaderboard = Leaderboard(lambda user: user.stats.points, lambda user: not user.bot)
+        leaderboard.extend(bot.users)
+        leaderboard.update(user)
+        rank = leaderboard.rank(user)
+        for user, points in leaderboard.top(15):
+            ...
+    """
+    score: Callable[[User], int]
+    include: Callable[[User], bool] = lambda user: True
+    keys: dict[int, Key] = field(default_factory=dict)
+    users: dict[int, User] = field(default_factory=dict)
+    buckets: list[list[Key]] = field(default_factory=list)
+    maxes: list[Key] = field(default_factory=list)
+    sizes: list[int] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, user: User) -> bool:
+        return user.id in self.keys
+
+    def extend(self, users: Iterable[User]):
+        """Add the users, e.g. when building the leaderboard."""
+        for user in users:
+            if self.include(user):
+                self.keys[user.id] = (-self.score(user), user.id)
+                self.users[user.id] = user
+        ordered: list[Key] = sorted(self.keys.values())
+        self.buckets = [ordered[i:i + BUCKET_SIZE] for i in range(0, len(ordered), BUCKET_SIZE)]
+        self.maxes = [bucket[-1] for bucket in self.buckets]
+        self._rebuild_sizes()
+
+    def clear(self):
+        """Remove every user, e.g. before extending with the recounted scores."""
+        self.keys.clear()
+        self.users.clear()
+        self.buckets, self.maxes, self.sizes = [], [], []
+
+    def update(self, user: User):
+        """Move the user to the current score, or remove the user if no longer included."""
+        if not self.include(user):
+            self.remove(user)
+            return
+        key: Key = (-self.score(user), user.id)
+        old_key: Key | None = self.keys.get(user.id)
+        if old_key == key:
+            return
+        if old_key is not None:
+            self._discard(old_key)
+        self.keys[user.id] = key
+        self.users[user.id] = user
+        self._insert(key)
+
+    def remove(self, user: User):
+        key: Key | None = self.keys.pop(user.id, None)
+        if key is None:
+            return
+        self.users.pop(user.id, None)
+        self._discard(key)
+
+    def rank(self, user: User) -> int | None:
+        """The 1-based position of the user, highest score first. None if not on the leaderboard."""
+        key: Key | None = self.keys.get(user.id)
+        if key is None:
+            return None
+        i: int = bisect_left(self.maxes, key)
+        return self._prefix(i) + bisect_left(self.buckets[i], key) + 1
+
+    def top(self, count: int) -> list[tuple[User, int]]:
+        """The users with the highest scores and their scores, highest first."""
+        return self._take(count, (key for bucket in self.buckets for key in bucket))
+
+    def bottom(self, count: int, where: Callable[[User], bool] | None = None) -> list[tuple[User, int]]:
+        """The users with the lowest scores and their scores, lowest first. Only the users that match where, if
+        given."""
+        return self._take(count, (key for bucket in reversed(self.buckets) for key in reversed(bucket)), where)
+
+    def _take(self, count: int, keys: Iterator[Key],
+              where: Callable[[User], bool] | None = None) -> list[tuple[User, int]]:
+        rows: list[tuple[User, int]] = []
+        for negative_score, user_id in keys:
+            if len(rows) >= count:
+                break
+            user: User = self.users[user_id]
+            if where is None or where(user):
+                rows.append((user, -negative_score))
+        return rows
+
+    def _insert(self, key: Key):
+        if not self.buckets:
+            self.buckets, self.maxes = [[key]], [key]
+            self._rebuild_sizes()
+            return
+        i: int = min(bisect_left(self.maxes, key), len(self.buckets) - 1)
+        bucket: list[Key] = self.buckets[i]
+        insort(bucket, key)
+        self.maxes[i] = bucket[-1]
+        if len(bucket) >= 2 * BUCKET_SIZE:
+            self.buckets[i:i + 1] = [bucket[:BUCKET_SIZE], bucket[BUCKET_SIZE:]]
+            self.maxes[i:i + 1] = [bucket[BUCKET_SIZE - 1], bucket[-1]]
+            self._rebuild_sizes()
+        else:
+            self._add_size(i, 1)
+
+    def _discard(self, key: Key):
+        i: int = bisect_left(self.maxes, key)
+        bucket: list[Key] = self.buckets[i]
+        del bucket[bisect_left(bucket, key)]
+        if not bucket:
+            del self.buckets[i]
+            del self.maxes[i]
+            self._rebuild_sizes()
+            return
+        self.maxes[i] = bucket[-1]
+        self._add_size(i, -1)
+
+    def _rebuild_sizes(self):
+        self.sizes = [len(bucket) for bucket in self.buckets]
+        for i in range(len(self.sizes)):
+            parent: int = i | (i + 1)
+            if parent < len(self.sizes):
+                self.sizes[parent] += self.sizes[i]
+
+    def _add_size(self, i: int, delta: int):
+        while i < len(self.sizes):
+            self.sizes[i] += delta
+            i |= i + 1
+
+    def _prefix(self, i: int) -> int:
+        """How many keys are in the buckets before the bucket i."""
+        total: int = 0
+        i -= 1
+        while i >= 0:
+            total += self.sizes[i]
+            i = (i & (i + 1)) - 1
+        return total
@@ -158,7 +158,7 @@ class Plugin(BaseModule):
         self.anttu_messages.append(Msg(message.id, message.content, attachments))
 
     async def refresh_anttumessages(self):
-        messages: list[dict[str, int | str]] = self.bot.database.get_messages_by_user(ANTTU_IDS)
+        messages: list[dict[str, int | str]] = await self.bot.database.get_messages_by_user(ANTTU_IDS)
         saved_messages: list[int] = [x.id for x in self.anttu_messages]
         message_ids: list[int] = [x['id'] for x in messages]
         i: int = 0
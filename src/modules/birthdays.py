@@ -10,7 +10,6 @@ from __future__ import annotations
 import discord
 import json
 from datetime import datetime, date
-from dateutil.tz import gettz
 from dataclasses import field, dataclass, asdict
 from src.objects import User
 import src.functions as functions
@@ -82,7 +81,7 @@ class Plugin(BaseModule):
                 interaction=interaction
             )
 
-        await self.sync_birthdays(datetime.now(tz=gettz(self.bot.config.TIMEZONE)))
+        await self.sync_birthdays(self.bot.clock.now())
 
     async def birthday(self, user: User, message: discord.Message | None = None,
                        interaction: discord.Interaction | None = None,
@@ -91,7 +90,7 @@ class Plugin(BaseModule):
         if not target_user:
             await self.bot.commands.error(self.bot.localizations.USER_NOT_FOUND, message, interaction)
             return
-        date_now: datetime = datetime.now(tz=gettz(self.bot.config.TIMEZONE))
+        date_now: datetime = self.bot.clock.now()
         try:
             birthday = message.content.split()[1] if (message and '.' in message.content.split()[1]) else birthday
         except IndexError:
@@ -157,9 +156,7 @@ class Plugin(BaseModule):
     async def sync_birthdays(self, date_now: datetime):
         birthday_role: discord.Role = self.bot.server.get_role(self.bot.config.ROLE_BIRTHDAY)
 
-        for usr in self.bot.users:
-            if not usr.is_in_guild:
-                continue
+        for usr in self.bot.users.members():
             if self.bot.config.ROLE_BIRTHDAY in usr.roles and not self.has_birthday(usr, date_now):
                 member = await self.bot.server.fetch_member(usr.id)
                 await member.remove_roles(birthday_role)
@@ -16,6 +16,7 @@ from dataclasses import field, dataclass
 from src.objects import User
 import src.functions as functions
 from src.basemodule import BaseModule
+from src.leaderboard import Leaderboard
 import os
 import discord
 import datetime
@@ -144,6 +145,8 @@ class Plugin(BaseModule):
             self.init_balances()
         else:
             self.load_balances()
+        self.bot.leaderboards['balances'] = Leaderboard(self.get_user_balance)
+        self.bot.leaderboards['balances'].extend(self.bot.users)
 
         self.casino_hide = self.bot.client.get_channel(self.bot.config.CHANNEL_CASINO_HIDE_CHANNEL)
 
@@ -244,11 +247,11 @@ class Plugin(BaseModule):
                 robbed_message += ', '
             robbed_users.append(robbed_user)
             robbed_saldo = min(user_saldo, remaining_saldo)
-            self.balances[robbed_user.id]['points'] -= robbed_saldo
+            self.add_balance(robbed_user.id, -robbed_saldo)
             remaining_saldo -= robbed_saldo
             robbenings = '{:,}'.format(robbed_saldo)
             robbed_message += f'**{robbed_user.name}** ({robbenings} saldoa)'
-        self.balances[user.id]['points'] += saldo_to_give
+        self.add_balance(user.id, saldo_to_give)
         self.save_balances()
         await self.bot.commands.message(self.bot.localizations.CASINO_KELA.format(user.name, robbed_message), message, interaction)
 
@@ -260,9 +263,8 @@ class Plugin(BaseModule):
 
     async def low_balances(self, user: User, message: discord.Message | None = None,
                            interaction: discord.Interaction | None = None, **kwargs):
-        balance_list: list[tuple[str, int]] = [(x.name, self.get_user_balance(x)) for x in self.bot.users if
-                                               x.is_in_guild]
-        sorted_balance_list: list[tuple[str, int]] = sorted(balance_list, key=lambda tup: tup[1])[:10]
+        sorted_balance_list: list[tuple[str, int]] = [
+            (x.name, balance) for x, balance in self.bot.leaderboards['balances'].bottom(10, lambda x: x.is_in_guild)]
         msg: str = self.bot.localizations.LOW_BALANCES_TITLE
         for i in range(len(sorted_balance_list)):
             if sorted_balance_list[i][1] >= 0:
@@ -305,19 +307,19 @@ class Plugin(BaseModule):
         if sum < 10000:
             await self.bot.commands.error(self.bot.localizations.GIVE_MUST_BE_OVER_10000, message, interaction)
             return
-        self.balances[user.id]['points'] -= sum
+        self.add_balance(user.id, -sum)
         if target_user.id not in self.balances:
             self.balances[target_user.id] = {'points': self.user_points_to_balance(target_user.stats.points) + sum,
                                              'reduce_points': self.user_points_to_balance(target_user.stats.points)}
-        self.balances[target_user.id]['points'] += sum
+        self.add_balance(target_user.id, sum)
         self.save_balances()
         await self.bot.commands.message(self.bot.localizations.GIVE_SUCCESS
                                         .format(user.name, target_user.name, '{:,}'.format(sum)), message, interaction)
 
     async def top_balances(self, user: User, message: discord.Message | None = None,
                            interaction: discord.Interaction | None = None, **kwargs):
-        balance_list: list[tuple[str, int]] = [(x.name, self.get_user_balance(x)) for x in self.bot.users]
-        sorted_balance_list: list[tuple[str, int]] = sorted(balance_list, key=lambda tup: -tup[1])[:10]
+        sorted_balance_list: list[tuple[str, int]] = [
+            (x.name, balance) for x, balance in self.bot.leaderboards['balances'].top(10)]
         msg: str = self.bot.localizations.BALANCES_TITLE
         for i in range(len(sorted_balance_list)):
             msg += self.bot.localizations.BALANCES_ROW.format(i, sorted_balance_list[i][0],
@@ -332,6 +334,7 @@ class Plugin(BaseModule):
         if target_user.id not in self.balances:
             self.balances[target_user.id] = {'points': self.user_points_to_balance(target_user.stats.points),
                                              'reduce_points': self.user_points_to_balance(target_user.stats.points)}
+            self.add_balance(target_user.id, 0)
         await self.bot.commands.message(
             self.bot.localizations.BALANCE_RESPONSE.format(target_user.name,
                                                            '{:,}'.format(self.get_user_balance(target_user))),
@@ -403,7 +406,7 @@ class Plugin(BaseModule):
         wins: dict[str, Chip] = self.check_wins(chosen_reels)
         partial_wins = self.check_partial_wins(chosen_reels)
 
-        self.balances[user.id]['points'] -= play_amount
+        self.add_balance(user.id, -play_amount)
         self.roi_dict['saldo_played'] += play_amount
 
         anttu_bonus: int = 1
@@ -528,14 +531,14 @@ class Plugin(BaseModule):
                 d.text(((Constants.BG_SIZE[0] - w) / 2, 131), title_message, fill=(255, 255, 255), font=Images.font,
                        stroke_width=1, stroke_fill=(0, 0, 0))
                 if 623974457404293130 in self.balances:
-                    self.balances[623974457404293130]['points'] -= original_amount
+                    self.add_balance(623974457404293130, -original_amount)
 
             else:
                 anttu_final.paste(Images.anttu_lose, (0, 60), Images.anttu_lose)
                 anttu_final.paste(Images.lost_image, (0, 0), Images.lost_image)
 
                 if 623974457404293130 in self.balances:
-                    self.balances[623974457404293130]['points'] += original_amount
+                    self.add_balance(623974457404293130, original_amount)
             filename = get_data_filename(self.randomword(10))
             anttu_final.save(filename, **anttu_final.info)
             files.append(filename)
@@ -611,7 +614,7 @@ class Plugin(BaseModule):
                 # reset cooldown
                 self.casino_times[ch_id] = 0
                 if amount != 0:
-                    self.balances[user.id]['points'] += amount
+                    self.add_balance(user.id, amount)
                     self.roi_dict['saldo_winnings'] += amount
 
                 self.save_balances()
@@ -781,11 +784,19 @@ class Plugin(BaseModule):
     async def on_member_join(self, member: discord.Member):
         if member.id not in self.balances:
             self.balances[member.id] = {'points': 0, 'reduce_points': 0}
+            self.add_balance(member.id, 0)
 
     @staticmethod
     def user_points_to_balance(points: int) -> int:
         return points * Constants.POINTS_TO_BALANCE_MULTIPLIER
 
+    def add_balance(self, user_id: int, amount: int):
+        """Change the user's balance and move the user on the balances leaderboard."""
+        self.balances[user_id]['points'] += amount
+        user: User | None = self.bot.get_user_by_id(user_id)
+        if user and 'balances' in self.bot.leaderboards:
+            self.bot.leaderboards['balances'].update(user)
+
     def get_user_balance(self, user: User) -> int:
         try:
             return self.balances[user.id].get('points') \
@@ -184,27 +184,32 @@ class Plugin(BaseModule):
         cat_role: discord.Role = self.bot.server.get_role(self.bot.config.ROLE_CAT)
         if cat_role is None:
             return
-        for user in self.bot.users:
-            if self.bot.config.ROLE_CAT in user.roles and user not in top_cats:
-                discord_user = self.bot.server.get_member(user.id)
-                if discord_user is None:
-                    continue
-                try:
-                    await discord_user.remove_roles(cat_role)
-                except discord.Forbidden:
-                    continue
-                except discord.HTTPException:
-                    continue
-            elif self.bot.config.ROLE_CAT not in user.roles and user in top_cats:
-                discord_user = self.bot.server.get_member(user.id)
-                if discord_user is None:
-                    continue
-                try:
-                    await discord_user.add_roles(cat_role)
-                except discord.Forbidden:
-                    continue
-                except discord.HTTPException:
-                    continue
+        top_cat_ids: set[int] = {user.id for user in top_cats if user is not None}
+        # only the current cats and the top cats can need a change, not every user
+        for user in self.bot.users.with_role(self.bot.config.ROLE_CAT):
+            if user.id in top_cat_ids:
+                continue
+            discord_user = self.bot.server.get_member(user.id)
+            if discord_user is None:
+                continue
+            try:
+                await discord_user.remove_roles(cat_role)
+            except discord.Forbidden:
+                continue
+            except discord.HTTPException:
+                continue
+        for user in top_cats:
+            if user is None or self.bot.config.ROLE_CAT in user.roles:
+                continue
+            discord_user = self.bot.server.get_member(user.id)
+            if discord_user is None:
+                continue
+            try:
+                await discord_user.add_roles(cat_role)
+            except discord.Forbidden:
+                continue
+            except discord.HTTPException:
+                continue
 
     def refresh_cat_rankings(self, save: bool = True):
         # calculate sum of points per user in cat rankings
@@ -51,8 +51,8 @@ class Plugin(BaseModule):
 
         if lover not in self.loves.keys():
             users=[]
-            for x in self.bot.users:
-                if x.is_in_guild and x.level>10 and time.time() - x.stats.last_post_time < 24*60*60:
+            for x in self.bot.users.members():
+                if x.level>10 and time.time() - x.stats.last_post_time < 24*60*60:
                     users.append(x)
 
 
@@ -9,8 +9,7 @@ Commands:
 import discord
 import json
 from dataclasses import field, dataclass
-from datetime import datetime, timedelta
-from dateutil.tz import gettz
+from datetime import timedelta
 import src.functions as functions
 from src.objects import User
 import time
@@ -20,6 +19,7 @@ import re
 DEFAULT_BAN_LENGTH: int = 12
 DEFAULT_EMOJI_BAN_LENGTH: int = 3
 DEFAULT_MUTE_LENGTH: int = 5
+UNBAN_CHECK_INTERVAL: int = 30  # seconds between the checks for the expired bans and mutes
 
 
 @dataclass
@@ -40,6 +40,7 @@ class Plugin(BaseModule):
         except FileNotFoundError:
             pass
         await self.fetch_bans()
+        self.bot.scheduler.every('moderation.check_unbans', UNBAN_CHECK_INTERVAL, self.check_unbans)
 
         @self.bot.commands.register(command_name='ban', function=self.ban_user,
                                     description=self.bot.localizations.BAN_DESCRIPTION,
@@ -221,7 +222,6 @@ class Plugin(BaseModule):
             await self.bot.commands.error(self.bot.localizations.ON_ERROR, message, None)
 
     async def on_message(self, message: discord.Message):
-        await self.check_unbans()
         if message.channel.id not in [self.bot.config.CHANNEL_GENERAL, self.bot.config.CHANNEL_GENERAL2]:
             return
         if message.author.id == 270904126974590976:
@@ -280,11 +280,11 @@ class Plugin(BaseModule):
                 self.bot.localizations.MEMBER_UNMUTED.format(after.name), delete_after=30.0)
         if after.timed_out_until and not before.timed_out_until:
             delta_seconds: float = min(
-                (after.timed_out_until - datetime.now(tz=gettz(self.bot.config.TIMEZONE))).total_seconds(),
+                (after.timed_out_until - self.bot.clock.now()).total_seconds(),
                 DEFAULT_MUTE_LENGTH * 60)
-            if after.timed_out_until > datetime.now(tz=gettz(self.bot.config.TIMEZONE)) \
+            if after.timed_out_until > self.bot.clock.now() \
                     + timedelta(seconds=delta_seconds):
-                await after.edit(timed_out_until=datetime.now(tz=gettz(self.bot.config.TIMEZONE)) + \
+                await after.edit(timed_out_until=self.bot.clock.now() + \
                                                  timedelta(seconds=delta_seconds))
             self.timeout_list[member._user] = time.time() + delta_seconds
             await self.bot.server.get_channel(self.bot.config.CHANNEL_GENERAL).send(
@@ -14,7 +14,8 @@ from . import (
     anttubott,
     user_channels,
     fun,
-    empty_channels
+    empty_channels,
+    perf
 )
 from src.basemodule import BaseModule
 
@@ -29,5 +30,6 @@ module_list: list[Type[BaseModule]] = [
     anttubott.Plugin,
     user_channels.Plugin,
     fun.Plugin,
-    empty_channels.Plugin
+    empty_channels.Plugin,
+    perf.Plugin
 ]
@@ -0,0 +1,60 @@
+"""
+Performance plugin. Shows how long the modules' event handlers and the commands take, and dumps the numbers to
+data/perf.json every PERF_DUMP_INTERVAL_MINUTES.
+
+Commands:
+    !perf (admin only)
+"""
+
+import discord
+import time
+from dataclasses import dataclass
+from src.objects import User
+from src.basemodule import BaseModule
+
+PERF_DUMP_FILENAME: str = 'data/perf.json'
+
+
+@dataclass
+class Plugin(BaseModule):
+    async def on_ready(self):
+        @self.bot.commands.register(command_name='perf', function=self.perf,
+                                    description=self.bot.localizations.PERF_DESCRIPTION,
+                                    commands_per_day=50, timeout=5, requires_fulladmin=True)
+        async def perf(interaction: discord.Interaction):
+            await self.bot.commands.commands['perf'].execute(
+                user=self.bot.get_user_by_id(interaction.user.id),
+                interaction=interaction
+            )
+
+        if self.bot.config.PERF_DUMP_INTERVAL_MINUTES > 0:
+            self.bot.scheduler.every('perf.dump', self.bot.config.PERF_DUMP_INTERVAL_MINUTES * 60, self.dump)
+
+    async def perf(self, user: User, message: discord.Message | None = None,
+                   interaction: discord.Interaction | None = None, **kwargs):
+        msg: str = self.bot.localizations.PERF_TITLE.format(round((time.time() - self.bot.perf.started) / 3600, 1))
+        for (module_name, event_name), stats in self.bot.perf.slowest_events(10):
+            msg += self.bot.localizations.PERF_ROW.format(f'{module_name.split(".")[-1]}.{event_name}', stats.count,
+                                                          *stats.percentiles(50, 95, 99), stats.max_ns / 1e6)
+        msg += self.bot.localizations.PERF_COMMANDS_TITLE
+        for command_name, stats in self.bot.perf.slowest_commands(10):
+            msg += self.bot.localizations.PERF_ROW.format(command_name, stats.count,
+                                                          *stats.percentiles(50, 95, 99), stats.max_ns / 1e6)
+        inbox_stats: dict[str, dict[str, int | float]] = self.bot.events.inbox_stats()
+        if inbox_stats:
+            msg += self.bot.localizations.PERF_INBOX_TITLE
+        for module_name, stats in inbox_stats.items():
+            msg += self.bot.localizations.PERF_INBOX_ROW.format(module_name.split('.')[-1], stats['depth'],
+                                                                stats['dropped'], stats['coalesced'],
+                                                                stats['lag'] * 1000, stats['max_lag'] * 1000)
+        buffer_stats: dict[str, int | float] = self.bot.database.buffer.stats()
+        msg += self.bot.localizations.PERF_DATABASE.format(buffer_stats['pending'], buffer_stats['age'],
+                                                           buffer_stats['coalesced'], buffer_stats['flushed'],
+                                                           buffer_stats['flushes'])
+        await self.bot.commands.message(msg, message, interaction, delete_after=60)
+
+    async def dump(self):
+        try:
+            self.bot.perf.dump(PERF_DUMP_FILENAME)
+        except OSError as e:
+            print(f"Error! Could not dump the perf stats to {PERF_DUMP_FILENAME}: {e}")
@@ -16,30 +16,47 @@ import os.path
 
 import discord
 import asyncio
+import heapq
 from io import BytesIO
 from datetime import datetime
+from collections.abc import AsyncIterator
 from dataclasses import dataclass, field
-from src.objects import User, Stats, Message, Reaction, VoiceDate
+from src.objects import User, Message, Reaction, VoiceDate
 import time
 from . import rank_card
 import src.functions as functions
 from src.basemodule import BaseModule
+from src.inbox import OverflowPolicy
+from src.clock import SECONDS_PER_DAY, snowflake_timestamp
+from src.leaderboard import Leaderboard
 
 MAXIMUM_POINTS_PER_INTERVAL: int = 256  # how many points at maximum per POINTS_INTERVAL minutes
+DELETED_USER_ID: int = 456226577798135808  # the "Deleted User" of the removed accounts, not listed on the leaderboard
 POINTS_INTERVAL: int = 5  # minutes for the message buffer
+COUNTED_BOTS: frozenset[int] = frozenset({623974457404293130, 732616359367802891})  # anttubot, etyty
+BACKFILL_PROGRESS: int = 10000  # print the backfill progress every this many messages of a channel
+BACKFILL_QUEUE_SIZE: int = 1000  # how many fetched messages of a channel wait for the merge at most
+BACKFILL_YIELD_ROWS: int = 500  # let the event loop run (e.g. the gateway heartbeat) every this many messages
+BACKFILL_FLUSH_ROWS: int = 100000  # save a backfill this long in parts, so a fresh database isn't one transaction
+
+# a message fetched by the backfill: the message, its author and the (emoji id, count) of its taa reactions
+BackfillRow = tuple[Message, discord.abc.User, list[tuple[int, int]]]
 
 
 @dataclass
 class Plugin(BaseModule):
+    # queue the events so a raid doesn't hold up the other modules; blocking, as every message is worth points
+    inbox_size: int = 5000
+    overflow_policy: str = OverflowPolicy.BLOCK
+    # the points per interval and the voice sessions depend on the order of the events
+    ordered_events: tuple[str, ...] = ('on_message', 'on_voice_state_update')
     active_threshold: int = 10000000
-    old_mins: int = -1
     current_mins: int = -1
-    old_cache: list[Message.content] = field(default_factory=list)
     current_cache: list[Message.content] = field(default_factory=list)
     last_day: datetime = datetime.today()
     starting_day: datetime = datetime.today()
+    next_day_timestamp: int = 0  # the UTC midnight after last_day
     user_points_new: dict[str, int] = field(default_factory=dict)
-    user_points_old: dict[str, int] = field(default_factory=dict)
     users_in_voice: list[User] = field(default_factory=list)
 
     async def on_ready(self):
@@ -103,7 +120,7 @@ class Plugin(BaseModule):
                 interaction=interaction
             )
 
-        await self.sync_messages(self.bot.database.get_last_post_id())
+        await self.sync_messages(await self.bot.database.get_last_post_id())
         await self.update_actives()
         for user in self.bot.users:
             await self.refresh_level_roles(user)
@@ -120,20 +137,14 @@ class Plugin(BaseModule):
         if not target_user or not self.bot.get_user_by_id(target_user.id) or target_user.bot:
             await self.bot.commands.error(self.bot.localizations.USER_NOT_FOUND, message, interaction)
             return
-        point_list: list[tuple[User.id, Stats.points]] = []
-        for usr in self.bot.users:
-            if usr.id == 456226577798135808 or usr.bot:  # the id is deleted user...
-                continue
-            point_list.append((usr.id, usr.stats.points))
-        sorted_list: list[tuple[User.id, Stats.points]] = sorted(point_list, key=lambda x: -int(x[1]))
-        i: int = 1
-        for k in sorted_list:
-            if k[0] == target_user.id:
-                break
-            i += 1
+        leaderboard: Leaderboard = self.bot.leaderboards['points']
+        leaderboard.update(target_user)
+        rank: int = leaderboard.rank(target_user)
+        deleted_user: User | None = self.bot.get_user_by_id(DELETED_USER_ID)
+        if deleted_user and deleted_user in leaderboard and leaderboard.rank(deleted_user) < rank:
+            rank -= 1
 
         xp_now, xp_next = functions.get_xp_over(target_user.stats.points)
-        rank: int = i
         level: int = target_user.level
         identifier: User.identifier = target_user.identifier
         profile_filepath: User.profile_filename = target_user.profile_filename
@@ -159,7 +170,7 @@ class Plugin(BaseModule):
         if not target_user or not self.bot.get_user_by_id(target_user.id):
             await self.bot.commands.error(self.bot.localizations.USER_NOT_FOUND, message, interaction)
             return
-        streak: int = functions.get_user_streak(target_user, self.bot.daylist)
+        streak: int = self.bot.streaks.streak(target_user)
         await self.bot.commands.message(self.bot.localizations.STREAK_SCORE.format(target_user.name, streak),
                                         message, interaction, delete_after=10)
         
@@ -171,33 +182,12 @@ class Plugin(BaseModule):
             await self.bot.commands.error(self.bot.localizations.USER_NOT_FOUND, message, interaction)
             return
         
-        users={}  #USERID:STREAK
-
-        for usr in self.bot.users:  # Loop through the guild's users.
-            if usr.bot:             # Skip over bots.
-                continue
-
-                # Assign the key as the user's ID and the value as the user's streak.
-            users[usr.id]=functions.get_user_streak(usr,self.bot.daylist)
-
-
-            # Sort the dict into a list of tuples where the ones with a higher value (streak) are first.
-                # [(184820432,18), (572017482,5)] -> (KEY (ID),VALUE (STREAK))
-        sort=sorted(users.items(),key=lambda x: -x[1])
-
-        i:int = 0   # Create integer which will be used to loop only 15 times.
-
             # Create the string of the bot's response with the STREAK_TOP string.
-        sendable_message:str = self.bot.localizations.STREAK_TOP
-        for us in sort:
-            i+=1
-            if i > 15:  # Break for loop if the loop has looped over 15 times.
-                break
-            usr = self.bot.get_user_by_id(int(us[0]))
-
+        sendable_message: str = self.bot.localizations.STREAK_TOP
+        for i, (usr, streak) in enumerate(self.bot.leaderboards['streaks'].top(15), start=1):
                 # Append the row of the user into the bot's response.
-            sendable_message+=self.bot.localizations.STREAK_ROW.format(i,usr.name,us[1])
-        
+            sendable_message += self.bot.localizations.STREAK_ROW.format(i, usr.name, streak)
+
             # Send response and delete it after 25 seconds.
         await self.bot.commands.message(sendable_message,message,interaction,delete_after=25)
 
@@ -205,19 +195,9 @@ class Plugin(BaseModule):
 
     async def top(self, user: User, message: discord.Message | None = None,
                   interaction: discord.Interaction | None = None, **kwargs):
-        point_list: list[list[User.id, Stats.points]] = []
-        for usr in self.bot.users:
-            if usr.id == 456226577798135808 or usr.bot:
-                continue
-            point_list.append([usr.id, usr.stats.points])
-        sorted_list = sorted(point_list, key=lambda x: -x[1])
-        i: int = 0
+        top_users: list[User] = [usr for usr, _ in self.bot.leaderboards['points'].top(16) if usr.id != DELETED_USER_ID]
         sendable_message: str = self.bot.localizations.ACTIVITY_TOP
-        for k in sorted_list:
-            i += 1
-            if i > 15:
-                break
-            usr = self.bot.get_user_by_id(int(k[0]))
+        for i, usr in enumerate(top_users[:15], start=1):
             sendable_message += self.bot.localizations.ACTIVITY_ROW.format(i, usr.name, usr.level)
         await self.bot.commands.message(sendable_message, message, interaction, delete_after=25)
 
@@ -228,8 +208,8 @@ class Plugin(BaseModule):
         if not target_user or not self.bot.get_user_by_id(target_user.id):
             await self.bot.commands.error(self.bot.localizations.USER_NOT_FOUND, message, interaction)
             return
-        next_threshold: int = functions.get_next_activity_threshold(self.bot.users, self.bot.daylist)
-        user_points: int = functions.get_last_14_day_points(target_user, self.bot.daylist)
+        next_threshold: int = self.bot.activity.next_activity_threshold()
+        user_points: int = self.bot.activity.last_14_day_points(target_user)
         msg = self.bot.localizations.ACTIVE_YES.format(target_user.name, user_points, next_threshold) if \
             user_points >= next_threshold else \
             self.bot.localizations.ACTIVE_NO.format(target_user.name, user_points, next_threshold)
@@ -237,7 +217,7 @@ class Plugin(BaseModule):
 
     async def activity_top(self, user: User, message: discord.Message | None = None,
                            interaction: discord.Interaction | None = None, **kwargs):
-        actives = functions.get_actives(self.bot.users, self.bot.daylist, day_count=14, active_count=20)
+        actives = self.bot.activity.actives(20)
         days = self.bot.daylist[::-1][1:14 + 1]
         if not days:
             await self.bot.commands.error(self.bot.localizations.ON_ERROR, message, interaction)
@@ -259,19 +239,18 @@ class Plugin(BaseModule):
 
     async def update_actives(self):
         active_role: discord.Role = self.bot.server.get_role(self.bot.config.ROLE_ACTIVE)
-        self.active_threshold = functions.get_active_threshold(self.bot.users, self.bot.daylist)
-        active_users: list[User] = [x[0] for x in
-                                    functions.get_actives(self.bot.users, self.bot.daylist, 14, 15, False)]
+        self.active_threshold = self.bot.activity.active_threshold()
+        active_users: set[User.id] = {x[0].id for x in self.bot.activity.actives()}
 
-        for user in self.bot.users:
-            if not user.is_in_guild or user.id in self.bot.config.IGNORE_LEVEL_USERS:
+        for user in self.bot.users.members():
+            if user.id in self.bot.config.IGNORE_LEVEL_USERS:
                 continue
             member: discord.Member = self.bot.server.get_member(user.id)
             try:
-                if self.bot.config.ROLE_ACTIVE not in user.roles and user in active_users:
+                if self.bot.config.ROLE_ACTIVE not in user.roles and user.id in active_users:
                     await member.add_roles(active_role)
 
-                elif self.bot.config.ROLE_ACTIVE in user.roles and user not in active_users:
+                elif self.bot.config.ROLE_ACTIVE in user.roles and user.id not in active_users:
                     await member.remove_roles(active_role)
 
                 if self.bot.config.ROLE_ACTIVE_SQUAD in user.roles and \
@@ -285,20 +264,18 @@ class Plugin(BaseModule):
     async def on_member_join(self, member: discord.Member):
         user = self.bot.get_user_by_id(member.id)
         await asyncio.sleep(15)
-        active_users: list[User] = [x[0] for x in
-                                    functions.get_actives(self.bot.users, self.bot.daylist, 14, 15, False)]
+        active_users: set[User.id] = {x[0].id for x in self.bot.activity.actives()}
         active_role: discord.Role = self.bot.server.get_role(self.bot.config.ROLE_ACTIVE)
         member: discord.Member = await self.bot.server.fetch_member(user.id)
         await self.refresh_level_roles(user)
-        if user in active_users:
+        if user.id in active_users:
             await member.add_roles(active_role)
 
-    async def new_message(self, elem: discord.Message, old: bool = False):
-        await self.bot.add_if_user_not_exist(elem.author, is_message=True)
+    @staticmethod
+    def to_message(elem: discord.Message) -> Message:
         ref_id: discord.Message.id = elem.reference.message_id if elem.reference else None
         mentioned_user: discord.User.id = elem.mentions[0].id if len(elem.mentions) > 0 else None
-
-        message = Message(
+        return Message(
             id=elem.id,
             content=elem.content,
             attachments=len(elem.attachments),
@@ -310,95 +287,90 @@ class Plugin(BaseModule):
             mentioned_user_id=mentioned_user
         )
 
-        dt = functions.ts2dt(message.created_at.timestamp())
-        mins: int = (dt.hour * 60 + dt.minute) // 5
-        sending_streak: bool = False
-        if not old:
-            cache = self.current_cache
-            the_user = self.bot.get_user_by_id(elem.author.id)
-            if the_user.stats.activity_points_today == 0 and \
-                    (message.attachments > 0 or message.content not in cache):
-                the_user.stats.activity_points_today += 1
-                sending_streak = True
-            if self.bot.config.ROLE_SQUAD in the_user.roles and self.bot.config.ROLE_ACTIVE_SQUAD not in the_user.roles:
-                await elem.author.add_roles(self.bot.server.get_role(self.bot.config.ROLE_ACTIVE_SQUAD))
-
-        if (old and mins != self.old_mins) or (not old and mins != self.current_mins):
-            if old:
-                self.old_cache[:] = []
-                self.old_mins = mins
-                self.user_points_old.clear()
+    @staticmethod
+    def count_message(user: User, message: Message):
+        """Add the message to the user's message stats, not the points."""
+        user.stats.files_sent += message.attachments
+        user.stats.total_post_length += message.length
+        user.stats.bot_command_count += message.is_bot_command
+        user.stats.gif_count += message.is_gif
+        user.stats.emoji_count += message.has_emoji
+        user.stats.last_post_time = functions.dt2ts(message.created_at)
+
+    @staticmethod
+    def taa_reactions(elem: discord.Message) -> list[tuple[int, int]]:
+        """The emoji ids and the counts of the message's taa reactions."""
+        return [(reaction.emoji.id, reaction.count) for reaction in elem.reactions
+                if getattr(reaction.emoji, 'name', None) == 'taa']
+
+    def add_taa_reactions(self, message_id: int, taa_reactions: list[tuple[int, int]],
+                          reactions: dict[tuple[int, int], Reaction] | None = None, journal: bool = True):
+        """Queue the taa reactions of a message, the already known ones as they are. reactions indexes
+        bot.reactions by (message id, emoji id), to look up many messages' reactions."""
+        for emoji_id, count in taa_reactions:
+            if reactions is not None:
+                react: Reaction | None = reactions.get((message_id, emoji_id))
             else:
-                self.current_cache[:] = []
-                self.current_mins = mins
-                self.user_points_new.clear()
+                react = next((react for react in self.bot.reactions
+                              if react.message_id == message_id and react.emoji_id == emoji_id), None)
+            if react is None:
+                react = Reaction(message_id=message_id, emoji_id=emoji_id, count=count, is_in_database=False)
+            self.bot.database.add_reaction(react, journal)
 
-            self.bot.database.db_save()
+    async def new_message(self, elem: discord.Message):
+        await self.bot.add_if_user_not_exist(elem.author, is_message=True)
+        message: Message = self.to_message(elem)
 
-        cache = self.old_cache if old else self.current_cache
+        mins: int = snowflake_timestamp(elem.id) % SECONDS_PER_DAY // (POINTS_INTERVAL * 60)
+        sending_streak: bool = False
+        cache = self.current_cache
+        the_user = self.bot.get_user_by_id(elem.author.id)
+        if the_user.stats.activity_points_today == 0 and \
+                (message.attachments > 0 or message.content not in cache):
+            the_user.stats.activity_points_today += 1
+            self.bot.activity.touch(the_user)
+            self.bot.streaks.touch(the_user)
+            sending_streak = True
+        if self.bot.config.ROLE_SQUAD in the_user.roles and self.bot.config.ROLE_ACTIVE_SQUAD not in the_user.roles:
+            await elem.author.add_roles(self.bot.server.get_role(self.bot.config.ROLE_ACTIVE_SQUAD))
+
+        if mins != self.current_mins:
+            self.current_cache[:] = []
+            self.current_mins = mins
+            self.user_points_new.clear()
+
+        cache = self.current_cache
 
         if not elem.author.bot and (message.content not in cache or message.attachments > 0):
             user_id: str = str(message.user_id)
             user: User = self.bot.get_user_by_id(message.user_id)
-            if old:
-                if user_id not in self.user_points_old:
-                    self.user_points_old[user_id] = 0
-                points: int = message.length // 2 + 3
-                old_points: int = self.user_points_old[user_id]
-                self.user_points_old[user_id] = min(MAXIMUM_POINTS_PER_INTERVAL, self.user_points_old[user_id] + points)
-                message_points: int = self.user_points_old[user_id] - old_points
-            else:
-                if user_id not in self.user_points_new:
-                    self.user_points_new[user_id] = 0
-                points: int = message.length // 2 + 3
-                old_points: int = self.user_points_new[user_id]
-                self.user_points_new[user_id] = min(MAXIMUM_POINTS_PER_INTERVAL, self.user_points_new[user_id] + points)
-                message_points: int = self.user_points_new[user_id] - old_points
+            if user_id not in self.user_points_new:
+                self.user_points_new[user_id] = 0
+            points: int = message.length // 2 + 3
+            old_points: int = self.user_points_new[user_id]
+            self.user_points_new[user_id] = min(MAXIMUM_POINTS_PER_INTERVAL, self.user_points_new[user_id] + points)
+            message_points: int = self.user_points_new[user_id] - old_points
 
             message.activity_points = message_points
-            user.stats.files_sent += message.attachments
-            user.stats.total_post_length += message.length
-            user.stats.bot_command_count += message.is_bot_command
-            user.stats.gif_count += message.is_gif
-            user.stats.emoji_count += message.has_emoji
-            user.stats.last_post_time = functions.dt2ts(message.created_at)
-            user.stats.should_update = True
-
-            if message_points and not user.add_points(message_points) and user.level > 1 and not old:
+            self.count_message(user, message)
+            user.stats.mark_dirty()
+
+            new_level: bool = bool(message_points) and not user.add_points(message_points)
+            self.bot.points_changed(user)
+            if new_level and user.level > 1:
                 await self.refresh_level_roles(user)
                 await self.bot.commands.message(
                     msg=self.bot.localizations.NEW_LEVEL.format(elem.author.mention, str(user.level)),
                     message=elem, channel_send=True)
 
-        if old:
-            self.old_cache.append(message.content)
-        else:
-            self.current_cache.append(message.content)
+        self.current_cache.append(message.content)
         self.bot.database.add_message(message)
-
-        if len(elem.reactions) > 0:
-            for reaction in elem.reactions:
-                try:
-                    if reaction.emoji.name != 'taa':
-                        continue
-                except Exception as e:
-                    continue
-                found: bool = False
-                for react in self.bot.reactions:
-                    if react.message_id == reaction.message.id and react.emoji_id == reaction.emoji.id:
-                        found = True
-                        reaction.count += 1
-                        self.bot.database.add_reaction(react)
-                        break
-                if not found:
-                    react = Reaction(message_id=elem.id, emoji_id=reaction.emoji.id, count=reaction.count,
-                                     is_in_database=False)
-                    self.bot.database.add_reaction(react)
+        self.add_taa_reactions(elem.id, self.taa_reactions(elem))
 
         if sending_streak:
             try:
                 the_user = self.bot.get_user_by_id(elem.author.id)
-                streak = functions.get_user_streak(the_user, self.bot.daylist)
+                streak = self.bot.streaks.streak(the_user)
                 member = await self.bot.server.fetch_member(the_user.id)
                 if self.starting_day.day != self.last_day.day:
                     await elem.channel.send(
@@ -408,32 +380,141 @@ class Plugin(BaseModule):
             except Exception as e:
                 pass
 
-    async def sync_messages(self, last_post_id: int):
-        print(f'Last post id: {str(last_post_id)}')
-        print('Fetching until last post found')
-        count: int = 0
-        for CHANNEL in self.bot.config.LEVEL_CHANNELS:
-            async for elem in self.bot.client.get_channel(CHANNEL).history(limit=20000000):
-                if elem.id <= last_post_id:
-                    break
-                self.last_day = elem.created_at
-                count += 1
-                if elem.author.bot and elem.author.id not in [623974457404293130,
-                                                              732616359367802891]:  # anttubot, etyty
+    async def fetch_history(self, channel_id: int, last_post_id: int, rows: asyncio.Queue):
+        """Fetch the messages of a level channel sent after last_post_id to rows, oldest first, and None after the
+        last one. The other bots' messages are left out. An error is put to rows for merge_histories to raise."""
+        channel: discord.TextChannel = self.bot.client.get_channel(channel_id)
+        fetched: int = 0
+        start: float = time.perf_counter()
+        try:
+            async for elem in channel.history(limit=None, after=discord.Object(id=last_post_id), oldest_first=True):
+                fetched += 1
+                if fetched % BACKFILL_PROGRESS == 0:
+                    print(f'Backfill: #{channel.name}: {fetched} messages fetched, '
+                          f'{fetched / (time.perf_counter() - start):.0f}/s')
+                if elem.author.bot and elem.author.id not in COUNTED_BOTS:
                     continue
+                await rows.put((self.to_message(elem), elem.author, self.taa_reactions(elem)))
+        except Exception as e:
+            await rows.put(e)
+            return
+        print(f'Backfill: #{channel.name}: {fetched} messages fetched in {time.perf_counter() - start:.1f} s')
+        await rows.put(None)
+
+    @staticmethod
+    async def next_row(rows: asyncio.Queue) -> BackfillRow | None:
+        row: BackfillRow | Exception | None = await rows.get()
+        if isinstance(row, Exception):
+            raise row
+        return row
+
+    async def merge_histories(self, channels: list[asyncio.Queue]) -> AsyncIterator[BackfillRow]:
+        """The rows of the channels in the order the messages were sent, by the snowflake ids. Only the next row of
+        each channel is held here, the fetching waits while the channel's queue is full."""
+        heads: list[tuple[int, int, BackfillRow]] = []
+        for i, rows in enumerate(channels):
+            row: BackfillRow | None = await self.next_row(rows)
+            if row is not None:
+                heapq.heappush(heads, (row[0].id, i, row))
+        while heads:
+            _, i, row = heapq.heappop(heads)
+            yield row
+            row = await self.next_row(channels[i])
+            if row is not None:
+                heapq.heappush(heads, (row[0].id, i, row))
+
+    def add_backfilled_points(self, points: dict[int, int]):
+        """Give the users the points of the backfilled messages, once per user, and empty points."""
+        for user_id, user_points_total in points.items():
+            user: User = self.bot.get_user_by_id(user_id)
+            user.stats.mark_dirty()
+            if user_points_total:
+                user.add_points(user_points_total)
+            self.bot.points_changed(user)
+        points.clear()
 
-                await self.new_message(elem, old=True)
-
-        print('Found! Stopping...')
+    async def sync_messages(self, last_post_id: int):
+        """Backfill the messages sent in the level channels while the bot was down.
+
+        The channels are fetched concurrently into bounded queues and merged into the order the messages were sent,
+        so the points per POINTS_INTERVAL are capped like for the live messages, across the channels. The
+        per-message side effects of new_message (the level-up messages, the roles, the streak messages) are skipped:
+        the stats are counted in bulk and the leaderboards are updated once per user.
+
+        The flushes by size and age are held off during the backfill and the messages are saved with db_save at the
+        end, in one transaction, or every BACKFILL_FLUSH_ROWS messages if there are more. The backfilled messages
+        aren't journaled: after a crash they're fetched again, as last_post_id hasn't moved past them.
+        """
+        print(f'Last post id: {last_post_id}, backfilling')
+        start: float = time.perf_counter()
+        channels: list[asyncio.Queue] = [asyncio.Queue(BACKFILL_QUEUE_SIZE) for _ in self.bot.config.LEVEL_CHANNELS]
+        fetches: list[asyncio.Task] = [asyncio.create_task(self.fetch_history(channel_id, last_post_id, rows))
+                                       for channel_id, rows in zip(self.bot.config.LEVEL_CHANNELS, channels)]
+        reactions: dict[tuple[int, int], Reaction] = {(react.message_id, react.emoji_id): react
+                                                      for react in self.bot.reactions}
+        points: dict[int, int] = {}  # the backfilled points by user id, not yet given to the users
+        users: set[int] = set()
+        interval: int = -1
+        cache: set[Message.content] = set()
+        user_points: dict[int, int] = {}
+        count: int = 0
+        message: Message | None = None
+        try:
+            with self.bot.database.hold_flushes():
+                async for message, author, taa_reactions in self.merge_histories(channels):
+                    if self.bot.get_user_by_id(author.id) is None:
+                        await self.bot.add_if_user_not_exist(author, is_message=True)
+                    message_interval: int = snowflake_timestamp(message.id) // (POINTS_INTERVAL * 60)
+                    if message_interval != interval:
+                        interval = message_interval
+                        cache.clear()
+                        user_points.clear()
+
+                    if not author.bot and (message.content not in cache or message.attachments > 0):
+                        user: User = self.bot.get_user_by_id(message.user_id)
+                        old_points: int = user_points.get(user.id, 0)
+                        user_points[user.id] = min(MAXIMUM_POINTS_PER_INTERVAL,
+                                                   old_points + message.length // 2 + 3)
+                        message.activity_points = user_points[user.id] - old_points
+                        self.count_message(user, message)
+                        points[user.id] = points.get(user.id, 0) + message.activity_points
+                        users.add(user.id)
+
+                    cache.add(message.content)
+                    self.bot.database.add_message(message, journal=False)
+                    self.add_taa_reactions(message.id, taa_reactions, reactions, journal=False)
+                    count += 1
+                    if count % BACKFILL_FLUSH_ROWS == 0:
+                        self.add_backfilled_points(points)
+                        await self.bot.database.db_save()
+                    elif count % BACKFILL_YIELD_ROWS == 0:
+                        await asyncio.sleep(0)
+                self.add_backfilled_points(points)
+                if message is not None:
+                    self.last_day = message.created_at
+                await self.bot.database.db_save()
+        except Exception:
+            # a fetch failed: save the messages merged so far with their points, then the next start continues
+            self.add_backfilled_points(points)
+            await self.bot.database.db_save()
+            raise
+        finally:
+            for fetch in fetches:
+                fetch.cancel()
+        total_time: float = time.perf_counter() - start
+        print(f'Backfill: {count} messages of {len(users)} users in {total_time:.1f} s, '
+              f'{count / max(total_time, 1e-9):.0f} messages/s')
 
     async def on_message(self, message: discord.Message):
-        if (message.author.bot and message.author.id not in [623974457404293130, 732616359367802891]) or \
+        if (message.author.bot and message.author.id not in COUNTED_BOTS) or \
                 message.channel.id not in self.bot.config.LEVEL_CHANNELS or \
                 message.channel.guild.id != self.bot.config.SERVER_ID:
             return
 
-        if message.created_at.date() != self.last_day.date() and not self.bot.launching:
+        timestamp: int = snowflake_timestamp(message.id)
+        if timestamp >= self.next_day_timestamp and not self.bot.launching:
             self.last_day = message.created_at
+            self.next_day_timestamp = timestamp // SECONDS_PER_DAY * SECONDS_PER_DAY + SECONDS_PER_DAY
 
         await self.new_message(message)
 
@@ -501,16 +582,19 @@ class Plugin(BaseModule):
                     usr.voicedate.mark_inactive(timestamp)
             activity_points: int = functions.seconds_to_points(user.voicedate.seconds)
             user.voicedate.activity_points = activity_points
-            user.stats.should_update = True
+            user.stats.mark_dirty()
             if activity_points > 0 and user.stats.activity_points_today == 0:
-                streak = functions.get_user_streak(user, self.bot.daylist)
+                streak = self.bot.streaks.streak(user)
+                self.bot.streaks.touch(user)
                 if self.starting_day != self.last_day.day:
                     await self.bot.client.get_channel(self.bot.config.CHANNEL_GENERAL).send(
                         self.bot.localizations.NEW_STREAK.format(member.mention, str(streak)),
                         delete_after=10.0
                     )
             user.stats.activity_points_today += activity_points
-            if not user.add_points(activity_points):
+            new_level: bool = not user.add_points(activity_points)
+            self.bot.points_changed(user)
+            if new_level:
                 await self.refresh_level_roles(user)
                 await self.bot.client.get_channel(self.bot.config.CHANNEL_GENERAL).send(
                     self.bot.localizations.NEW_LEVEL.format(member.mention, str(user.level)))
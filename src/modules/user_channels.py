@@ -10,8 +10,7 @@ Commands:
 '''
 
 from __future__ import annotations
-from datetime import datetime, timedelta
-from dateutil.tz import gettz
+from datetime import timedelta
 import discord
 import json
 from dataclasses import dataclass, field
@@ -57,10 +56,6 @@ class TextChannel:
 class Plugin(BaseModule):
     category: discord.CategoryChannel = None
     text_channels: list[TextChannel] = field(default_factory=list)
-    last_check_hour: datetime = None
-
-    def __post_init__(self):
-        self.last_check_hour = datetime.now(tz=gettz(self.bot.config.TIMEZONE)) - timedelta(days=1)
 
     async def on_ready(self):
         self.load_channels()
@@ -71,6 +66,8 @@ class Plugin(BaseModule):
                 .send(self.bot.localizations.NO_USER_CATEGORY_EXISTS)
             return
 
+        self.bot.scheduler.cron('user_channels.purge_channels', self.purge_channels, minute=0, jitter=60)
+
         @self.bot.commands.register('kanava', function=self.create_text_channel,
                                     description=self.bot.localizations.CREATE_CHANNEL_DESCRIPTION, commands_per_day=10,
                                     timeout=10)
@@ -226,10 +223,7 @@ class Plugin(BaseModule):
         if text_channel:
             text_channel.last_message_timestamp = message.created_at.timestamp()
 
-        if self.last_check_hour.hour == message.created_at.hour:
-            return
-        self.last_check_hour = message.created_at
-
+    async def purge_channels(self):
         for channel in self.text_channels:
             delete_messages: bool = False
             for permission in channel.discord_channel.permissions_for(self.bot.server.get_role(self.bot.config.ROLE_EVERYONE)):
@@ -254,7 +248,7 @@ class Plugin(BaseModule):
         if not channel or message.id == channel.pin_message:
             return False
 
-        return True if datetime.now(tz=gettz(self.bot.config.TIMEZONE)) - \
+        return True if self.bot.clock.now() - \
                        timedelta(hours=channel.owner.level) > \
                        message.created_at else False
 
@@ -1,8 +1,15 @@
 from __future__ import annotations
+from array import array
 from dataclasses import dataclass, field
+from collections.abc import Collection, Iterator
 import re
 import discord
+from src.clock import day_ordinal
 import src.functions as functions
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from src.users import UserRegistry
 
 
 @dataclass
@@ -42,10 +49,10 @@ class User:
             return False
         self.stats.points += points
         self.stats.activity_points_today += points
-        self.stats.should_update = True
+        self.stats.mark_dirty()
         return self.level == self.refresh_level()
 
-    def is_ban_protected(self, ban_immune_roles: list[int]) -> bool:
+    def is_ban_protected(self, ban_immune_roles: Collection[int]) -> bool:
         if self.bot:
             return True
         for role in self.roles:
@@ -70,28 +77,101 @@ class Stats:
     bot_command_count: int = 0
     activity_points_today: int = 0
     is_in_database: bool = False
-    # {'2018': {'1': {'30': ActivityDate}}}
-    activity_dates: dict[str, dict[str, dict[str, Points]]] = field(default_factory=dict)
+    activity: ActivityLog = field(default_factory=lambda: ActivityLog())
     should_update: bool = False
+    owner: UserRegistry | None = field(default=None, repr=False, compare=False)  # set by UserRegistry.add
+
+    def mark_dirty(self):
+        """Call after changing the stats, so they're written on the next flush. The stats of a user not yet in a
+        UserRegistry are put in its dirty_stats when the user is added."""
+        self.should_update = True
+        if self.owner is not None:
+            self.owner.dirty_stats[self.user_id] = self
 
     def get_activity_by_date(self, date: dict[str, int]) -> Points:
-        try:
-            year, month, day = str(date.get('year')), str(date.get('month')), str(date.get('day'))
-            if not self.activity_dates.get(year).get(month).get(day):
-                return Points(0, 0)
-            return self.activity_dates.get(year).get(month).get(day)
-        except (KeyError, AttributeError):
-            return Points(0, 0)
+        return self.activity.get(day_ordinal(date['year'], date['month'], date['day']))
 
     def add_activitydate(self, activity_date: ActivityDate):
         self.activity_points_today = 0
-        year, month, day = str(activity_date.year), str(activity_date.month), str(activity_date.day)
-        if year not in self.activity_dates:
-            self.activity_dates[year] = {}
-        if month not in self.activity_dates.get(year):
-            self.activity_dates[year][month] = {}
-        if day not in self.activity_dates.get(year).get(month):
-            self.activity_dates[year][month][day] = activity_date
+        self.activity.add(day_ordinal(activity_date.year, activity_date.month, activity_date.day),
+                          activity_date.message_points, activity_date.voice_points)
+
+
+@dataclass
+class ActivityLog:
+    """A user's daily message and voice points as two int columns indexed by the day ordinal, from the user's first
+    active day to the last one. Replaces the {'2018': {'1': {'30': ActivityDate}}} dicts: a day is one index
+    operation and a range of days is summed in C.
+
+    The days without points aren't stored, a missing day is Points(0, 0). Like Stats.add_activitydate before, the
+    first points of a day stay.
+
+    Attributes:
+        first_day (int): the day ordinal of index 0.
+        message_points (array): message points per day, array('i').
+        voice_points (array): voice points per day, array('i').
+
+    Examples:
+        activity.add(day_ordinal(2023, 6, 30), 120, 30)
+        activity.get(day_ordinal(2023, 6, 30)).points
+        activity.sum(day_ordinal(2023, 6, 17), day_ordinal(2023, 6, 30))
+    """
+    first_day: int = 0
+    message_points: array = field(default_factory=lambda: array('i'))
+    voice_points: array = field(default_factory=lambda: array('i'))
+
+    def __len__(self) -> int:
+        return len(self.message_points)
+
+    def add(self, day: int, message_points: int | None, voice_points: int | None) -> bool:
+        """Set the points of the day, unless it already has points. Returns whether the points were set."""
+        message_points, voice_points = message_points or 0, voice_points or 0
+        if not message_points and not voice_points:
+            return False
+        if not self.message_points:
+            self.first_day = day
+        elif day < self.first_day:
+            padding: bytes = bytes((self.first_day - day) * self.message_points.itemsize)
+            self.message_points[:0] = array('i', padding)
+            self.voice_points[:0] = array('i', padding)
+            self.first_day = day
+        index: int = day - self.first_day
+        if index >= len(self.message_points):
+            padding: bytes = bytes((index + 1 - len(self.message_points)) * self.message_points.itemsize)
+            self.message_points.frombytes(padding)
+            self.voice_points.frombytes(padding)
+        elif self.message_points[index] or self.voice_points[index]:
+            return False
+        self.message_points[index] = message_points
+        self.voice_points[index] = voice_points
+        return True
+
+    def get(self, day: int) -> Points:
+        index: int = day - self.first_day
+        if 0 <= index < len(self.message_points):
+            return Points(self.message_points[index], self.voice_points[index])
+        return Points(0, 0)
+
+    def points(self, day: int) -> int:
+        """The message and voice points of the day."""
+        index: int = day - self.first_day
+        if 0 <= index < len(self.message_points):
+            return self.message_points[index] + self.voice_points[index]
+        return 0
+
+    def sum(self, first_day: int, last_day: int) -> int:
+        """The message and voice points from the first day to the last day, both included."""
+        start: int = max(first_day - self.first_day, 0)
+        end: int = last_day - self.first_day + 1
+        if end <= start:
+            return 0
+        return sum(self.message_points[start:end]) + sum(self.voice_points[start:end])
+
+    def days(self) -> Iterator[tuple[int, int, int]]:
+        """The (day ordinal, message points, voice points) of the days that have points."""
+        for index, (message_points, voice_points) in enumerate(zip(self.message_points, self.voice_points)):
+            if message_points or voice_points:
+                yield self.first_day + index, message_points, voice_points
 
 
 @dataclass
@@ -0,0 +1,100 @@
+"""
+Low overhead latency recorder for the event handlers and the commands. Cheap enough to be always on: recording a
+sample is a dict lookup and a write into a fixed size ring buffer, the percentiles are only calculated when read.
+
+Usage in EventDispatcher and Command.execute, shown by the /perf command (src/modules/perf.py).
+"""
+
+from __future__ import annotations
+from array import array
+from dataclasses import dataclass, field
+import json
+import time
+
+SAMPLE_COUNT: int = 1024  # how many of the latest samples are kept per key for the percentiles
+
+
+@dataclass
+class LatencyStats:
+    """Latency of one (module, event) or command.
+
+    Attributes:
+        count (int): how many times it has been called.
+        total_ns (int): the total time in nanoseconds.
+        max_ns (int): the slowest call in nanoseconds.
+        samples (array): ring buffer of the latest SAMPLE_COUNT latencies in nanoseconds.
+    """
+    count: int = 0
+    total_ns: int = 0
+    max_ns: int = 0
+    samples: array = field(default_factory=lambda: array('q', bytes(8 * SAMPLE_COUNT)))
+
+    def add(self, ns: int):
+        self.samples[self.count % SAMPLE_COUNT] = ns
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def percentiles(self, *percents: int) -> list[float]:
+        """The percentiles of the latest samples in milliseconds."""
+        samples: list[int] = sorted(self.samples[:min(self.count, SAMPLE_COUNT)])
+        if not samples:
+            return [0.0 for _ in percents]
+        return [samples[min(len(samples) - 1, len(samples) * percent // 100)] / 1e6 for percent in percents]
+
+    def asdict(self) -> dict[str, int | float]:
+        p50, p95, p99 = self.percentiles(50, 95, 99)
+        return {
+            'count': self.count,
+            'total_ms': self.total_ns / 1e6,
+            'p50_ms': p50,
+            'p95_ms': p95,
+            'p99_ms': p99,
+            'max_ms': self.max_ns / 1e6
+        }
+
+
+@dataclass
+class PerfRecorder:
+    """Keeps the LatencyStats of the event handlers by (module, event) and of the commands by the command name.
+
+    Examples:
+        start: int = time.perf_counter_ns()
+        await handler(*args)
+        bot.perf.record_event(module.__class__.__module__, 'on_message', time.perf_counter_ns() - start)
+    """
+    events: dict[tuple[str, str], LatencyStats] = field(default_factory=dict)
+    commands: dict[str, LatencyStats] = field(default_factory=dict)
+    started: float = field(default_factory=time.time)
+
+    def record_event(self, module_name: str, event_name: str, ns: int):
+        stats: LatencyStats | None = self.events.get((module_name, event_name))
+        if stats is None:
+            stats = self.events[(module_name, event_name)] = LatencyStats()
+        stats.add(ns)
+
+    def record_command(self, command_name: str, ns: int):
+        stats: LatencyStats | None = self.commands.get(command_name)
+        if stats is None:
+            stats = self.commands[command_name] = LatencyStats()
+        stats.add(ns)
+
+    def slowest_events(self, count: int = 10) -> list[tuple[tuple[str, str], LatencyStats]]:
+        """The (module, event)s that have taken the most time in total."""
+        return sorted(self.events.items(), key=lambda x: -x[1].total_ns)[:count]
+
+    def slowest_commands(self, count: int = 10) -> list[tuple[str, LatencyStats]]:
+        return sorted(self.commands.items(), key=lambda x: -x[1].total_ns)[:count]
+
+    def asdict(self) -> dict:
+        return {
+            'started': self.started,
+            'timestamp': time.time(),
+            'events': {f'{module} {event}': stats.asdict() for (module, event), stats in self.events.items()},
+            'commands': {command: stats.asdict() for command, stats in self.commands.items()}
+        }
+
+    def dump(self, filepath: str):
+        with open(filepath, 'w') as f:
+            json.dump(self.asdict(), f, indent=2)
@@ -0,0 +1,216 @@
+"""
+Time-driven job scheduler. Runs the periodic jobs (day changes, database saves, unbans, channel purges, ...) on time
+instead of piggybacking on the next message, so they're neither late on a quiet night nor checked on every message on
+a busy day.
+
+The jobs are kept in a min-heap by their next run time, so the scheduler only ever sleeps until the earliest job.
+The last run times are saved to data/scheduler.json when a job with catch_up=True runs, so the runs of those jobs
+that were missed while the bot was down are run once when the scheduler is started.
+
+Usage: Bot.scheduler, started in EventDispatcher.on_ready.
+"""
+
+from __future__ import annotations
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import random
+import time
+from src.clock import get_tz
+
+MAX_SLEEP_SECONDS: float = 60.0  # wake up at least this often, so a jump of the wall clock is noticed
+
+
+@dataclass
+class Cron:
+    """Cron-like schedule: the job runs when the wall clock in the timezone hits the minute (of the hour).
+
+    Args:
+        minute (int): the minute of the hour.
+        hour (int | None): the hour of the day, None runs every hour.
+        timezone (str): e.g. 'Europe/Helsinki' or 'UTC'.
+    """
+    minute: int = 0
+    hour: int | None = None
+    timezone: str = 'UTC'
+
+    def next_after(self, timestamp: float) -> float:
+        """The timestamp of the first run strictly after the timestamp."""
+        now: datetime = datetime.fromtimestamp(timestamp, get_tz(self.timezone))
+        if self.hour is None:
+            candidate: datetime = now.replace(minute=self.minute, second=0, microsecond=0)
+            step: timedelta = timedelta(hours=1)
+        else:
+            candidate = now.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+            step = timedelta(days=1)
+        while candidate.timestamp() <= timestamp:
+            candidate += step
+        return candidate.timestamp()
+
+
+@dataclass
+class Job:
+    """A scheduled coroutine function.
+
+    Attributes:
+        name (str): unique name of the job. Adding a job with the same name replaces the old one, e.g. when a module
+            is reloaded.
+        function (Callable[[], Awaitable]): called without arguments. The exceptions are printed and the job stays
+            scheduled.
+        interval (float | None): seconds between the runs, for the interval jobs.
+        cron (Cron | None): the schedule, for the cron-like jobs.
+        jitter (float): at most this many seconds are randomly added to each run, so the jobs scheduled at the same
+            time don't all hit Discord and the database at once.
+        catch_up (bool): whether to run the job once on start if a run was missed while the bot was down.
+        due (float): the timestamp the next run is scheduled for, without the jitter.
+        next_run (float): due + jitter.
+        last_run (float | None): the timestamp of the last run.
+        task (asyncio.Task | None): the running task. A run is skipped if the previous one is still running.
+        cancelled (bool): set when the job is removed or replaced. The heap entry is dropped when it comes up.
+    """
+    name: str
+    function: Callable[[], Awaitable]
+    interval: float | None = None
+    cron: Cron | None = None
+    jitter: float = 0.0
+    catch_up: bool = False
+    due: float = 0.0
+    next_run: float = 0.0
+    last_run: float | None = None
+    task: asyncio.Task | None = None
+    cancelled: bool = False
+
+    def next_due_after(self, timestamp: float) -> float:
+        if self.cron:
+            return self.cron.next_after(timestamp)
+        return timestamp + self.interval
+
+    def schedule(self, due: float):
+        self.due = due
+        self.next_run = due + (random.uniform(0, self.jitter) if self.jitter else 0)
+
+
+@dataclass
+class Scheduler:
+    """Runs the Jobs at their time. Jobs can be added before the scheduler is started.
+
+    Args:
+        state_filepath (str): where the last run times are saved for the catch-up.
+
+    Attributes:
+        jobs (dict[str, Job]): the scheduled jobs by name.
+        heap (list[tuple[float, int, Job]]): min-heap of (next_run, insertion counter, Job).
+        last_runs (dict[str, float]): the last run timestamps by the job name, loaded from the state file.
+        wakeup (asyncio.Event): set when a job is added, so the scheduler re-checks the earliest job.
+        task (asyncio.Task | None): the scheduler loop, None until started.
+
+    Examples:
+        bot.scheduler.every('moderation.check_unbans', 30, self.check_unbans)
+        bot.scheduler.cron('bot.new_utc_day', self.new_utc_day, hour=0, minute=0, timezone='UTC', catch_up=True)
+    """
+    state_filepath: str = 'data/scheduler.json'
+    jobs: dict[str, Job] = field(default_factory=dict)
+    heap: list[tuple[float, int, Job]] = field(default_factory=list)
+    last_runs: dict[str, float] = field(default_factory=dict)
+    wakeup: asyncio.Event = field(default_factory=asyncio.Event)
+    task: asyncio.Task | None = None
+    counter: itertools.count = field(default_factory=itertools.count)
+
+    def __post_init__(self):
+        if os.path.exists(self.state_filepath):
+            try:
+                with open(self.state_filepath) as f:
+                    self.last_runs = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Error! Could not read {self.state_filepath}, no jobs are caught up: {e}")
+
+    def every(self, name: str, seconds: float, function: Callable[[], Awaitable], jitter: float = 0.0,
+              catch_up: bool = False) -> Job:
+        """Run the function every given seconds. The first run is after the interval."""
+        return self.add(Job(name, function, interval=seconds, jitter=jitter, catch_up=catch_up))
+
+    def cron(self, name: str, function: Callable[[], Awaitable], minute: int = 0, hour: int | None = None,
+             timezone: str = 'UTC', jitter: float = 0.0, catch_up: bool = False) -> Job:
+        """Run the function at the minute of every hour, or at hour:minute every day if the hour is given."""
+        return self.add(Job(name, function, cron=Cron(minute, hour, timezone), jitter=jitter, catch_up=catch_up))
+
+    def add(self, job: Job) -> Job:
+        now: float = time.time()
+        old: Job | None = self.jobs.get(job.name)
+        if old:
+            old.cancelled = True
+            job.last_run = old.last_run
+        job.last_run = job.last_run or self.last_runs.get(job.name)
+        if job.catch_up and job.last_run is not None and job.next_due_after(job.last_run) <= now:
+            job.schedule(now)
+        else:
+            job.schedule(job.next_due_after(now))
+        self.jobs[job.name] = job
+        heapq.heappush(self.heap, (job.next_run, next(self.counter), job))
+        self.wakeup.set()
+        return job
+
+    def cancel(self, name: str):
+        job: Job | None = self.jobs.pop(name, None)
+        if job:
+            job.cancelled = True
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while True:
+            while self.heap and self.heap[0][2].cancelled:
+                heapq.heappop(self.heap)
+            delay: float = self.heap[0][0] - time.time() if self.heap else MAX_SLEEP_SECONDS
+            if delay > 0:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), min(delay, MAX_SLEEP_SECONDS))
+                except TimeoutError:
+                    pass
+                continue
+            _, _, job = heapq.heappop(self.heap)
+            now: float = time.time()
+            if job.task is None or job.task.done():
+                job.last_run = self.last_runs[job.name] = now
+                job.task = asyncio.create_task(self.run_job(job))
+                if job.catch_up:
+                    # only the catch_up jobs read their last run back, the frequent jobs don't need to be saved
+                    self.save_state()
+            else:
+                print(f"Scheduler: {job.name} is still running, skipping a run")
+            due: float = job.next_due_after(job.due)
+            if due <= now:
+                # skip the runs that were missed while e.g. the machine was suspended instead of running them in a burst
+                due = job.next_due_after(now)
+            job.schedule(due)
+            heapq.heappush(self.heap, (job.next_run, next(self.counter), job))
+
+    @staticmethod
+    async def run_job(job: Job):
+        try:
+            await job.function()
+        except Exception as e:
+            print(f"Scheduler: {job.name} failed: {e}")
+            traceback = e.__traceback__
+            while traceback:
+                print("{}: {}".format(traceback.tb_frame.f_code.co_filename, traceback.tb_lineno))
+                traceback = traceback.tb_next
+
+    def save_state(self):
+        """Save the last run times. The file is replaced atomically, so a crash while writing leaves the previous
+        state."""
+        tmp_path: str = f'{self.state_filepath}.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self.last_runs, f)
+            os.replace(tmp_path, self.state_filepath)
+        except OSError as e:
+            print(f"Error! Could not save {self.state_filepath}: {e}")
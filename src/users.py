@@ -0,0 +1,121 @@
+from __future__ import annotations
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+import discord
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from src.objects import Stats, User
+
+
+@dataclass
+class UserRegistry:
+    """Indexed container for all the Users the bot knows about.
+
+    Drop-in replacement for the old list[User] in Bot.users: supports iteration, len(), `in` and append(), but the
+    lookups by id are O(1) and the commonly filtered subsets are kept up to date as secondary views.
+
+    The views are only maintained if the membership and role changes go through set_in_guild and set_roles, so use
+    those instead of setting User.is_in_guild or calling User.set_roles directly.
+
+    Attributes:
+        by_id (dict[User.id, User]): all Users, including the ones that are no longer in the server.
+        in_guild (dict[User.id, User]): Users that are currently in the server.
+        humans (dict[User.id, User]): Users that are not bots.
+        by_role (dict[discord.Role.id, dict[User.id, User]]): Users that have the role, by the role id.
+        dirty_stats (dict[User.id, Stats]): the Stats changed since the last flush, see Stats.mark_dirty. Taken by
+            Database.update_userstats.
+
+    Examples:
+        users = UserRegistry.from_users(database.get_users())
+        user = users.get(212594150124552192)
+        for member in users.members():
+            ...
+    """
+    by_id: dict[int, User] = field(default_factory=dict)
+    in_guild: dict[int, User] = field(default_factory=dict)
+    humans: dict[int, User] = field(default_factory=dict)
+    by_role: dict[int, dict[int, User]] = field(default_factory=dict)
+    dirty_stats: dict[int, Stats] = field(default_factory=dict)
+
+    @classmethod
+    def from_users(cls, users: Iterable[User]) -> UserRegistry:
+        registry = cls()
+        registry.extend(users)
+        return registry
+
+    def __iter__(self) -> Iterator[User]:
+        # iterate over a snapshot so awaiting inside the loop doesn't break if users are added meanwhile
+        return iter(list(self.by_id.values()))
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def __contains__(self, item: User | int) -> bool:
+        return (item if isinstance(item, int) else item.id) in self.by_id
+
+    def get(self, id: int) -> User | None:
+        return self.by_id.get(id)
+
+    def add(self, user: User):
+        """Add a User or replace the User with the same id."""
+        if user.id in self.by_id:
+            self.remove(self.by_id[user.id])
+        self.by_id[user.id] = user
+        if not user.bot:
+            self.humans[user.id] = user
+        self._index(user)
+        user.stats.owner = self
+        if user.stats.should_update:
+            self.dirty_stats[user.id] = user.stats
+
+    append = add
+
+    def extend(self, users: Iterable[User]):
+        for user in users:
+            self.add(user)
+
+    def remove(self, user: User):
+        self._unindex(user)
+        self.by_id.pop(user.id, None)
+        self.humans.pop(user.id, None)
+
+    def set_in_guild(self, user: User, is_in_guild: bool):
+        self._unindex(user)
+        user.is_in_guild = is_in_guild
+        self._index(user)
+
+    def set_roles(self, user: User, roles: list[discord.Role] | None = None):
+        self._unindex(user)
+        user.set_roles(roles)
+        self._index(user)
+
+    def members(self) -> list[User]:
+        """Users that are in the server."""
+        return list(self.in_guild.values())
+
+    def non_bots(self) -> list[User]:
+        """Users that are not bots, including the ones that have left the server."""
+        return list(self.humans.values())
+
+    def with_role(self, role_id: int) -> list[User]:
+        """Users that have the role."""
+        return list(self.by_role.get(role_id, {}).values())
+
+    def _index(self, user: User):
+        if user.id not in self.by_id:
+            return
+        if user.is_in_guild:
+            self.in_guild[user.id] = user
+        for role in user.roles:
+            self.by_role.setdefault(role, {})[user.id] = user
+
+    def _unindex(self, user: User):
+        self.in_guild.pop(user.id, None)
+        for role in user.roles:
+            role_users: dict[int, User] | None = self.by_role.get(role)
+            if role_users is None:
+                continue
+            role_users.pop(user.id, None)
+            if not role_users:
+                del self.by_role[role]
@@ -0,0 +1,113 @@
+"""
+A failed flush must not lose the changes it took from the write buffer: they're put back in the buffer for the next
+flush, and the failed flush's journal segment is kept for the replay until then.
+
+Run: python -m unittest discover tests
+"""
+
+from __future__ import annotations
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import asyncio
+import os
+import tempfile
+import unittest
+from src.database.database import Database
+from src.objects import Message, Reaction, Stats, User
+from src.users import UserRegistry
+
+
+def make_config() -> SimpleNamespace:
+    return SimpleNamespace(DATABASE_JOURNAL_MODE='WAL', DATABASE_SYNCHRONOUS='NORMAL', DATABASE_CACHE_SIZE_KB=2048,
+                           DATABASE_MMAP_SIZE_MB=0, DATABASE_TEMP_STORE='MEMORY', DATABASE_READERS=1,
+                           DATABASE_FLUSH_ROWS=5000, DATABASE_FLUSH_SECONDS=300)
+
+
+def make_message(message_id: int) -> Message:
+    return Message(id=message_id, content='moi', attachments=0, user_id=1, jump_url='', reference=None,
+                   created_at=datetime.now(timezone.utc), mentions_everyone=False, mentioned_user_id=None)
+
+
+class FailedFlushTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd: str = os.getcwd()
+        self.directory = tempfile.TemporaryDirectory()
+        os.chdir(self.directory.name)
+        os.makedirs('data')
+        self.database: Database = self.open_database()
+
+    def tearDown(self):
+        self.database.io.close()
+        self.database.journal.close()
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    @staticmethod
+    def open_database() -> Database:
+        database: Database = Database(SimpleNamespace(config=make_config(), users=UserRegistry(), daylist=[]))
+        database.setup_database()
+        return database
+
+    def fail_next_write(self):
+        execute_writes = self.database.execute_writes
+
+        def failing(*args):
+            self.database.execute_writes = execute_writes
+            raise RuntimeError('disk full')
+        self.database.execute_writes = failing
+
+    def message_ids(self, database: Database) -> list[int]:
+        return [row[0] for row in database.db.cursor.execute('SELECT id FROM Messages ORDER BY id')]
+
+    def test_changes_are_written_by_the_next_flush(self):
+        async def run():
+            self.database.add_message(make_message(1))
+            await self.database.sync_journal()
+            self.fail_next_write()
+            with self.assertRaises(RuntimeError):
+                await self.database.save_database()
+            self.database.add_message(make_message(2))
+            await self.database.save_database()
+        asyncio.run(run())
+        self.assertEqual(self.message_ids(self.database), [1, 2])
+
+    def test_failed_inserts_are_not_left_marked_in_the_database(self):
+        user: User = User(id=1, stats=Stats(1), name='a', bot=0, profile_filename='', identifier='0')
+        reaction: Reaction = Reaction(message_id=1, emoji_id=2, count=1, is_in_database=False)
+
+        async def run():
+            self.database.bot.users.add(user)
+            self.database.add_user(user)
+            self.database.add_reaction(reaction)
+            self.fail_next_write()
+            with self.assertRaises(RuntimeError):
+                await self.database.save_database()
+            self.assertFalse(user.is_in_database or user.stats.is_in_database or reaction.is_in_database)
+            user.name = 'b'
+            reaction.count = 3
+            self.database.add_user(user)
+            self.database.add_reaction(reaction)
+            await self.database.save_database()
+        asyncio.run(run())
+        cursor = self.database.db.cursor
+        self.assertEqual(cursor.execute('SELECT name FROM User').fetchall()[0][0], 'b')
+        self.assertEqual(cursor.execute('SELECT count(*) FROM UserStats').fetchone()[0], 1)
+        self.assertEqual(cursor.execute('SELECT count FROM Reactions').fetchall()[0][0], 3)
+
+    def test_failed_segment_is_replayed_after_a_crash(self):
+        async def run():
+            self.database.add_message(make_message(1))
+            await self.database.sync_journal()
+            self.fail_next_write()
+            with self.assertRaises(RuntimeError):
+                await self.database.save_database()
+        asyncio.run(run())
+        # crash: the buffer is lost, only the journal is left
+        self.database.io.close()
+        self.database.journal.close()
+        self.database = self.open_database()
+        self.assertEqual(self.message_ids(self.database), [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+functions.get_level and functions.get_xp_over look the levels up from LEVEL_THRESHOLDS. They must give the same
+results as the loops they replaced, which subtracted the level costs one level at a time.
+
+Run: python -m unittest discover tests
+"""
+
+from __future__ import annotations
+import random
+import unittest
+import src.functions as functions
+from src.functions import get_points_till_next_level
+
+EXHAUSTIVE_POINTS: int = 300000  # every points value from -1000 up to this is checked
+BOUNDARY_LEVELS: int = 1000  # the points around every level threshold up to this level are checked
+RANDOM_POINTS: int = 200  # random points values below 1e9
+
+
+def loop_get_level(points: int) -> int:
+    """get_level before the threshold table."""
+    level: int = 0
+    while True:
+        points -= get_points_till_next_level(level)
+        if points >= 0:
+            level += 1
+        else:
+            break
+    return level
+
+
+def loop_get_xp_over(points: int) -> tuple[int, int]:
+    """get_xp_over before the threshold table."""
+    current_xp: int = 0
+    level: int = 0
+    while True:
+        points -= get_points_till_next_level(level)
+        needed_xp = get_points_till_next_level(level)
+        if points >= 0:
+            current_xp = points
+            level += 1
+        else:
+            break
+    return current_xp, needed_xp
+
+
+class LevelThresholdsTest(unittest.TestCase):
+    def assert_same(self, points: int):
+        self.assertEqual(functions.get_level(points), loop_get_level(points), points)
+        self.assertEqual(functions.get_xp_over(points), loop_get_xp_over(points), points)
+
+    def test_exhaustive(self):
+        for points in range(-1000, EXHAUSTIVE_POINTS + 1):
+            self.assert_same(points)
+
+    def test_level_boundaries(self):
+        threshold: int = 0
+        for level in range(BOUNDARY_LEVELS):
+            next_threshold: int = threshold + get_points_till_next_level(level)
+            for points in (threshold - 1, threshold, threshold + 1, next_threshold - 1):
+                self.assert_same(points)
+            threshold = next_threshold
+
+    def test_random(self):
+        rng: random.Random = random.Random(19)
+        for _ in range(RANDOM_POINTS):
+            self.assert_same(rng.randrange(10 ** 9))
+
+
+if __name__ == '__main__':
+    unittest.main()